@@ -0,0 +1,297 @@
+"""
+Analytic queueing pre-screen for warehouse configurations.
+
+Gives closed-form estimates of dock utilization and waits, forklift workload and
+order throughput bounds without running simpy. Every function works on NumPy
+arrays, so thousands of candidate configurations are screened in one call:
+
+    result = prescreen({"forklifts": np.arange(10, 45), "num_unloading_docks": 4})
+    candidates = np.flatnonzero(result["feasible"])
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from config import config
+from layout import (
+    unloading_dock_locations,
+    assembly_area_locations,
+    loading_dock_locations,
+)
+from storage import AdvancedStorage
+
+# Handling times used by main.py (minutes)
+T_UNLOAD_PALLET = 0.1
+T_ORDER_ASSEMBLY = 0.15
+
+# Assembly area i and loading dock i share an x coordinate, so the transfer is a straight move in y
+ASSEMBLY_TO_LOADING_DOCK = abs(assembly_area_locations(1)[0][1] - loading_dock_locations(1)[0][1])
+
+
+def erlang_c(servers, offered_load):
+    """
+    Probability that an arrival has to wait in an M/M/c queue (vectorized).
+
+    Parameters:
+    - servers: Array of server counts c.
+    - offered_load: Array of offered loads a = lambda / mu (same shape).
+
+    Returns:
+    - Array of waiting probabilities, 1.0 wherever the queue is unstable.
+    """
+    servers, offered_load = np.broadcast_arrays(np.asarray(servers, dtype=np.int64), np.asarray(offered_load, dtype=float))
+    # Erlang B by recurrence, only advancing entries that still have servers left
+    blocking = np.ones(servers.shape)
+    for k in range(1, int(servers.max(initial=0)) + 1):
+        active = k <= servers
+        step = offered_load * blocking
+        blocking = np.where(active, step / (k + step), blocking)
+    rho = np.divide(offered_load, servers, out=np.full(servers.shape, np.inf), where=servers > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        waiting = blocking / (1 - rho * (1 - blocking))
+    return np.where(rho < 1, waiting, 1.0)
+
+
+def queue_wait(arrival_rate, service_time, servers, model="MDc", arrival_scv=1.0):
+    """
+    Mean waiting time in a c-server queue (vectorized).
+
+    Uses the exact M/M/c result and the Allen-Cunneen correction for other
+    service distributions: Wq ~ Wq(M/M/c) * (ca^2 + cs^2) / 2, which gives the
+    usual M/D/c approximation (half the M/M/c wait) for deterministic service.
+
+    Parameters:
+    - arrival_rate: Arrivals per minute.
+    - service_time: Mean service time in minutes.
+    - servers: Number of servers.
+    - model: "MDc" (deterministic service) or "MMc" (exponential service).
+    - arrival_scv: Squared coefficient of variation of interarrival times.
+
+    Returns:
+    - (utilization, mean wait in minutes) arrays; the wait is inf when utilization >= 1.
+    """
+    if model not in ("MDc", "MMc"):
+        raise ValueError(f"Unsupported queue model: {model}. Use 'MDc' or 'MMc'.")
+    arrival_rate = np.asarray(arrival_rate, dtype=float)
+    service_time = np.asarray(service_time, dtype=float)
+    servers = np.asarray(servers)
+    offered_load = arrival_rate * service_time
+    utilization = np.divide(offered_load, servers, out=np.full(np.broadcast(offered_load, servers).shape, np.inf), where=servers > 0)
+    service_scv = 0.0 if model == "MDc" else 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mmc_wait = erlang_c(servers, offered_load) * service_time / (servers - offered_load)
+    wait = mmc_wait * (arrival_scv + service_scv) / 2
+    return utilization, np.where(utilization < 1, wait, np.inf)
+
+
+@lru_cache(maxsize=32)
+def _storage_travel(slots_per_aisle, levels_per_slot, pallet_types, speed_xy, speed_z, max_docks, max_areas, occupancy):
+    """
+    Mean one-way travel times between storage and each dock / assembly area.
+
+    AdvancedStorage stores and picks first-fit, scanning each aisle slot by slot,
+    so traffic concentrates on the front of every aisle. The busy region is
+    approximated by the first `occupancy` fraction of positions of each aisle
+    assigned to a pallet type.
+
+    Returns:
+    - (put-away times [pallet type, unloading dock], pick times [pallet type, assembly area]) arrays.
+    """
+    storage = AdvancedStorage(
+        num_aisles=config["storage_aisles"],
+        slots_per_aisle=slots_per_aisle,
+        levels_per_slot=levels_per_slot,
+        pallet_types=list(pallet_types),
+    )
+    positions_per_aisle = max(1, int(np.ceil(occupancy * slots_per_aisle * levels_per_slot)))
+    type_positions = []
+    for pallet_type in pallet_types:
+        coords = [storage.coordinates[(aisle, slot, level)]
+                  for aisle in storage.aisle_assignment.get(pallet_type, [])
+                  for slot in range(slots_per_aisle)
+                  for level in range(levels_per_slot)
+                  if slot * levels_per_slot + level < positions_per_aisle]
+        type_positions.append(np.array(coords, dtype=float).reshape(-1, 3))
+
+    def mean_travel(locations):
+        times = np.zeros((len(pallet_types), len(locations)))
+        for t, positions in enumerate(type_positions):
+            if not len(positions):
+                continue
+            for i, (x, y, _) in enumerate(locations):
+                xy = np.abs(positions[:, 0] - x) + np.abs(positions[:, 1] - y)
+                times[t, i] = np.mean(xy / speed_xy + positions[:, 2] / speed_z)
+        return times
+
+    return mean_travel(unloading_dock_locations(max_docks)), mean_travel(assembly_area_locations(max_areas))
+
+
+def travel_times(cfg=None, occupancy=None):
+    """
+    Mean one-way forklift travel time per pallet type for a single configuration.
+
+    Parameters:
+    - cfg: Configuration dict, defaults to config.
+    - occupancy: Fraction of each aisle in active use, defaults to initial_storage.
+
+    Returns:
+    - (put-away times [pallet type, unloading dock], pick times [pallet type, assembly area]) arrays in minutes.
+    """
+    cfg = config if cfg is None else cfg
+    return _storage_travel(
+        int(cfg["storage_slots_per_aisle"]), int(cfg["storage_levels_per_slot"]), tuple(cfg["pallet_types"]),
+        float(cfg["forklift_speed_xy"]), float(cfg["lever_speed_z"]),
+        int(cfg["num_unloading_docks"]), int(cfg["num_assembly_area"]),
+        float(cfg["initial_storage"] if occupancy is None else occupancy),
+    )
+
+
+def expected_max_travel(travel, probs, pallets):
+    """
+    Expected longest travel among a truck's pallets.
+
+    A truck keeps its dock until the last of its pallets is stored, and pallets
+    are put away in parallel, so the dock time depends on the farthest pallet
+    type present on the truck.
+
+    Parameters:
+    - travel: Travel times [pallet type, location].
+    - probs: Pallet type probabilities.
+    - pallets: Number of pallets on the truck.
+
+    Returns:
+    - Array of expected maximum travel times per location.
+    """
+    travel = np.asarray(travel, dtype=float)
+    probs = np.asarray(probs, dtype=float)
+    expected = np.zeros(travel.shape[1])
+    for location in range(travel.shape[1]):
+        order = np.argsort(-travel[:, location])
+        # P(no type at least as far as type j) for j in descending travel order
+        none_farther = (1 - np.concatenate(([0.0], np.cumsum(probs[order])))).clip(0) ** pallets
+        expected[location] = np.dot(travel[order, location], none_farther[:-1] - none_farther[1:])
+    return expected
+
+
+def _mean_over_first(values, counts):
+    """Mean of values[:n] for every n in counts (vectorized via cumulative sums)."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    counts = np.clip(counts, 1, len(values))
+    return cumulative[counts] / counts
+
+
+def prescreen(candidates=None, base=None, model="MDc", arrival_scv=1.0, max_utilization=1.0, occupancy=None):
+    """
+    Screen configurations analytically.
+
+    Parameters:
+    - candidates: Dict of config key -> scalar or array. Arrays are broadcast
+      against each other, every element is one candidate configuration.
+    - base: Base configuration for keys not in candidates, defaults to config.
+    - model: Dock queue model, "MDc" or "MMc" (see queue_wait).
+    - arrival_scv: Squared coefficient of variation of truck interarrival times.
+    - max_utilization: Utilization above which a resource counts as infeasible.
+    - occupancy: Fraction of each aisle in active use, defaults to the
+      configured initial_storage fill.
+
+    Returns:
+    - Dict of arrays, one entry per candidate:
+      unloading_dock_utilization, unloading_dock_wait, unloading_dock_service_time,
+      loading_dock_utilization, loading_dock_wait,
+      forklift_workload (busy forklift-minutes per hour), forklift_utilization,
+      inbound_order_bound, forklift_order_bound, loading_order_bound,
+      order_throughput (orders per hour) and feasible (bool).
+    """
+    base = config if base is None else base
+    candidates = candidates or {}
+    for key in candidates:
+        if key not in base:
+            raise ValueError(f"Unknown config key: {key}.")
+    cfg = dict(base)
+    cfg.update(candidates)
+    shape = np.broadcast_shapes(*[np.shape(value) for value in candidates.values()])
+
+    def param(key, dtype=float):
+        return np.broadcast_to(np.asarray(cfg[key], dtype=dtype), shape)
+
+    unloading_docks = param("num_unloading_docks", np.int64)
+    loading_docks = param("num_loading_docks", np.int64)
+    assembly_areas = param("num_assembly_area", np.int64)
+    forklifts = param("forklifts")
+    trucks_per_hour = param("unloading_trucks_per_hour")
+    loading_trucks_per_hour = param("loading_trucks_per_hour")
+    orders_per_hour = param("orders_per_hour")
+    speed_xy = float(cfg["forklift_speed_xy"])
+    speed_z = float(cfg["lever_speed_z"])
+    truck_size = (param("truck_capacity_min") + param("truck_capacity_max")) / 2
+    order_size = (param("minimum_order_size") + param("maximum_order_size")) / 2
+
+    # Travel times only depend on the rack dimensions and truck size, evaluate each distinct combination once
+    slots = param("storage_slots_per_aisle", np.int64)
+    levels = param("storage_levels_per_slot", np.int64)
+    putaway_travel = np.zeros(shape)
+    putaway_span = np.zeros(shape)
+    pick_travel = np.zeros(shape)
+    layouts = np.stack([slots, levels, truck_size], axis=-1).reshape(-1, 3)
+    probs = np.asarray(cfg["pallet_probs"], dtype=float)
+    for slot_count, level_count, pallets in np.unique(layouts, axis=0):
+        dock_travel, area_travel = _storage_travel(
+            int(slot_count), int(level_count), tuple(cfg["pallet_types"]),
+            speed_xy, speed_z, int(unloading_docks.max(initial=1)), int(assembly_areas.max(initial=1)),
+            float(cfg["initial_storage"] if occupancy is None else occupancy),
+        )
+        mask = (slots == slot_count) & (levels == level_count) & (truck_size == pallets)
+        putaway_span = np.where(mask, _mean_over_first(expected_max_travel(dock_travel, probs, pallets), unloading_docks), putaway_span)
+        # Weight pallet types by how often they arrive
+        dock_travel = probs @ dock_travel
+        area_travel = probs @ area_travel
+        putaway_travel = np.where(mask, _mean_over_first(dock_travel, unloading_docks), putaway_travel)
+        pick_travel = np.where(mask, _mean_over_first(area_travel, assembly_areas), pick_travel)
+
+    # Unloading docks: a truck holds its dock while pallets are unloaded and put away in parallel
+    unloading_service = truck_size * T_UNLOAD_PALLET + 2 * putaway_span
+    unloading_utilization, unloading_wait = queue_wait(trucks_per_hour / 60, unloading_service, unloading_docks, model, arrival_scv)
+
+    # Loading docks: move an assembled order from its area to the facing dock and load it
+    transfer_travel = ASSEMBLY_TO_LOADING_DOCK / speed_xy
+    loading_service = order_size * (2 * transfer_travel + T_UNLOAD_PALLET)
+    loading_utilization, loading_wait = queue_wait(loading_trucks_per_hour / 60, loading_service, loading_docks, model, arrival_scv)
+
+    # Forklift workload in busy forklift-minutes per hour
+    per_pallet_work = T_UNLOAD_PALLET + 2 * putaway_travel
+    per_order_work = order_size * 2 * pick_travel + loading_service
+    forklift_workload = trucks_per_hour * truck_size * per_pallet_work + orders_per_hour * per_order_work
+    forklift_utilization = forklift_workload / (60 * forklifts)
+
+    # Order throughput bounds (orders per hour). Loading and assembly requests have
+    # priority over put-away, so inbound only gets the forklift time orders leave over.
+    putaway_capacity = np.maximum(60 * forklifts - orders_per_hour * per_order_work, 0) / per_pallet_work
+    inbound_order_bound = np.minimum(trucks_per_hour * truck_size, putaway_capacity) / order_size
+    forklift_order_bound = 60 * forklifts / per_order_work
+    assembly_order_bound = assembly_areas * 60 / (order_size * T_ORDER_ASSEMBLY)
+    loading_order_bound = np.minimum(loading_trucks_per_hour, loading_docks * 60 / loading_service)
+    order_throughput = np.minimum.reduce([
+        orders_per_hour, inbound_order_bound, forklift_order_bound, assembly_order_bound, loading_order_bound,
+    ])
+
+    feasible = (
+        (unloading_utilization < max_utilization)
+        & (loading_utilization < max_utilization)
+        & (forklift_utilization < max_utilization)
+        & (order_throughput >= orders_per_hour)
+    )
+    return {
+        "unloading_dock_utilization": unloading_utilization,
+        "unloading_dock_wait": unloading_wait,
+        "unloading_dock_service_time": unloading_service,
+        "loading_dock_utilization": loading_utilization,
+        "loading_dock_wait": loading_wait,
+        "forklift_workload": forklift_workload,
+        "forklift_utilization": forklift_utilization,
+        "inbound_order_bound": inbound_order_bound,
+        "forklift_order_bound": forklift_order_bound,
+        "loading_order_bound": loading_order_bound,
+        "order_throughput": order_throughput,
+        "feasible": feasible,
+    }
+
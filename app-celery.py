@@ -1,30 +1,36 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Optional
 from database import SessionLocal, Base, engine, ConfigurationModel  # Assume SQLAlchemy setup
 from celery import Celery
+from celery.signals import task_success
 import simpy
 import random
 import numpy as np
 from config import config  # Ensure config file includes necessary settings like dock capacities
-from dock import Dock
-from assembly_area import AssemblyArea
+from layout import build_layout
 from resource_handler import ResourceHandler
 from main import (
     generate_truck_arrivals,
     generate_orders,
     generate_loading_trucks,
     track_forklift_usage,
-    calculate_average_utilization,
-    truck_unloading_times,
-    truck_loading_times,
-    order_assembling_waiting_times,
-    order_assembling_times,
-    order_loading_mean_waiting_times,
-    mean_pallet_put_times,
-    mean_pallet_pickup_times
+    end_warmup,
+    reset_statistics,
+    collect_api_results,
 )
+from surrogate import Surrogate, is_confident
+from profiling import Profiler
+from memory import MemoryReport
+from service_metrics import ServiceMetrics, CONTENT_TYPE
+from jobs import run_in_slices
+from result_cache import ResultCache, cache_key
+import asyncio
+import json
 import logging
+import os
+import time
 
 
 app = FastAPI()
@@ -35,6 +41,15 @@ celery_app = Celery(
     broker="redis://redis:6379/0",  # Celery broker
     backend="redis://redis:6379/0"  # Celery results backend
 )
+# Report STARTED while a task runs, so /metrics can tell queued from running jobs
+celery_app.conf.task_track_started = True
+
+# Directory receiving a folded profile of every simulation task, profiling is off when unset
+PROFILE_DIR = os.environ.get("SIMULATION_PROFILE_DIR")
+# Attach a memory report to every task's results when set
+MEMORY_REPORT = bool(os.environ.get("SIMULATION_MEMORY_REPORT"))
+# Results backend key asking a running task to stop early
+STOP_KEY = "simulation-stop-{}"
 
 # Database initialization
 Base.metadata.create_all(bind=engine)
@@ -86,7 +101,8 @@ def convert_config_types(config: dict) -> dict:
         "storage_slots_per_aisle": int,
         "storage_levels_per_slot": int,
         "forklift_speed_xy": float,
-        "lever_speed_z": float
+        "lever_speed_z": float,
+        "random_seed": int
     }
     
     converted_config = {}
@@ -137,6 +153,120 @@ def list_configurations():
 # Result storage for metrics
 simulation_results = {}
 
+# Jobs, run times and cache hits served on /metrics, the pool size comes from the workers
+service_metrics = ServiceMetrics(workers=None)
+# Task ID -> [last seen state, simulated minutes] of the tasks submitted by this server and not finished
+submitted_tasks = {}
+
+
+# Results of earlier runs by config, seed and model version, in results_cache.db
+result_cache = ResultCache()
+# Cache key -> ID of the task computing it, and back, while the task is not finished
+inflight_tasks = {}
+task_keys = {}
+
+
+def simulation_key(converted_config):
+    """Cache key of a simulation, None for an unseeded one (a new sample every time, never cached or shared)."""
+    seed = converted_config.get("random_seed")
+    return None if seed is None else cache_key(converted_config, seed=seed)
+
+
+def record_task_result(task_id, state, result, key=None):
+    """
+    End the in-flight entry of a finished task and cache its results unless it was stopped early.
+
+    Parameters:
+    - task_id, state, result: Celery task ID, state and return value.
+    - key: Cache key of the task, by default the one this server submitted it with.
+    """
+    key = task_keys.pop(task_id, key)
+    if key is None:
+        return
+    if inflight_tasks.get(key) == task_id:
+        del inflight_tasks[key]
+    if state == "SUCCESS" and isinstance(result, dict) and not result.get("Stopped Early"):
+        result_cache.put(key, result)
+
+
+def submit_simulation(converted_config):
+    """
+    Start a simulation task and count it as a queued job.
+
+    A seeded configuration simulated before is answered from the result cache, and one
+    whose task is still queued or running shares that task. Unseeded configurations
+    always start a task.
+
+    Returns:
+    - (task ID, cached results or None). The ID of a cached answer is its cache key,
+      which /simulation-results/ also accepts.
+    """
+    key = simulation_key(converted_config)
+    if key is None:
+        return start_task(converted_config, None), None
+    task_id = inflight_tasks.get(key)
+    if task_id is not None:
+        task_result = celery_app.AsyncResult(task_id)
+        if task_result.state in ("SUCCESS", "FAILURE", "REVOKED"):
+            record_task_result(task_id, task_result.state, task_result.result)
+            task_id = None
+    cached = None if task_id is not None else result_cache.get(key)
+    service_metrics.cache_lookup(task_id is not None or cached is not None)
+    if task_id is not None:
+        return task_id, None
+    if cached is not None:
+        return key, cached
+    return start_task(converted_config, key), None
+
+
+def start_task(converted_config, key):
+    """Send one simulation task, tracked as in flight under `key` unless it is None, and return its ID."""
+    task = run_simulation.delay(converted_config)
+    submitted_tasks[task.id] = ["PENDING", converted_config["simulation_duration_minutes"]]
+    if key is not None:
+        inflight_tasks[key] = task.id
+        task_keys[task.id] = key
+    service_metrics.job_queued()
+    return task.id
+
+
+def refresh_job_states():
+    """Move the submitted tasks between queued, running and finished from their Celery states."""
+    for task_id, entry in list(submitted_tasks.items()):
+        task_result = celery_app.AsyncResult(task_id)
+        state = "STARTED" if task_result.state == "PROGRESS" else task_result.state
+        if state == entry[0] or state not in ("STARTED", "SUCCESS", "FAILURE"):
+            continue
+        if entry[0] == "PENDING":
+            service_metrics.job_started()
+        entry[0] = state
+        if state in ("SUCCESS", "FAILURE"):
+            record_task_result(task_id, state, task_result.result)
+        if state == "SUCCESS":
+            results = task_result.result or {}
+            service_metrics.job_finished(results.get("Simulated Minutes", entry[1]), results.get("Simulation Wall Time (s)"))
+        elif state == "FAILURE":
+            service_metrics.job_finished(outcome="failed")
+        if state != "STARTED":
+            del submitted_tasks[task_id]
+
+
+def worker_pool_usage(timeout=0.5):
+    """
+    Ask the Celery workers for their pool size and running tasks.
+
+    Returns:
+    - (workers, busy), (None, None) when no worker replied within `timeout` seconds.
+    """
+    inspector = celery_app.control.inspect(timeout=timeout)
+    stats = inspector.stats()
+    if not stats:
+        return None, None
+    active = inspector.active() or {}
+    workers = sum(worker.get("pool", {}).get("max-concurrency", 0) for worker in stats.values())
+    busy = sum(len(tasks) for tasks in active.values())
+    return workers, busy
+
 @app.post("/start-simulation/")
 async def start_simulation(config_id: int, background_tasks: BackgroundTasks):
     """
@@ -152,8 +282,10 @@ async def start_simulation(config_id: int, background_tasks: BackgroundTasks):
         
         # Convert config values to proper types before starting simulation
         converted_config = convert_config_types(config_entry.config)
-        task = run_simulation.delay(converted_config)
-        return {"message": "Simulation started.", "task_id": task.id}
+        task_id, cached = submit_simulation(converted_config)
+        if cached is not None:
+            return {"message": "Simulation results cached.", "task_id": task_id, "results": cached}
+        return {"message": "Simulation started.", "task_id": task_id}
     
     except HTTPException:
         raise
@@ -164,24 +296,144 @@ async def start_simulation(config_id: int, background_tasks: BackgroundTasks):
         db.close()
 
 
+# Surrogate model trained on the sweep database, loaded on first use
+surrogate_model = None
+
+@app.post("/predict/")
+def predict(config_id: int, tolerance: float = 0.05, absolute: float = 0.5):
+    """
+    Predict the KPIs of a stored configuration from the surrogate model.
+    A simulation task is only started when the prediction is too uncertain.
+    """
+    global surrogate_model
+    db = SessionLocal()
+    try:
+        config_entry = db.query(ConfigurationModel).filter(ConfigurationModel.id == config_id).first()
+        if not config_entry:
+            raise HTTPException(status_code=404, detail="Configuration not found.")
+        converted_config = convert_config_types(config_entry.config)
+    finally:
+        db.close()
+
+    if surrogate_model is None:
+        try:
+            surrogate_model = Surrogate.from_sweeps()
+        except ValueError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    params = {key: value for key, value in converted_config.items() if key in surrogate_model.keys}
+    prediction = surrogate_model.predict(params)
+    if prediction and is_confident(prediction, tolerance, absolute):
+        return {"status": "Prediction ready.", "source": "surrogate", "prediction": prediction}
+    task_id, cached = submit_simulation(converted_config)
+    if cached is not None:
+        return {"status": "Prediction uncertain, simulation results cached.", "source": "cache",
+                "prediction": prediction, "task_id": task_id, "results": cached}
+    return {"status": "Prediction uncertain, simulation started.", "source": "simulation",
+            "prediction": prediction, "task_id": task_id}
+
 @app.get("/simulation-results/")
 async def get_simulation_results(task_id: str):
     """
-    Retrieve the results of the simulation using the Celery task ID.
+    Retrieve the results of the simulation using the Celery task ID (or the cache key of a cached answer).
     """
+    cached = result_cache.get(task_id)
+    if cached is not None:
+        return {"status": "Simulation completed.", "results": cached}
     task_result = celery_app.AsyncResult(task_id)
 
-    if task_result.state == "PENDING":
+    if task_result.state in ("PENDING", "STARTED"):
         return {"status": "Simulation in progress. Please try again later."}
+    elif task_result.state == "PROGRESS":
+        return {"status": "Simulation in progress. Please try again later.", "progress": task_result.info}
     elif task_result.state == "SUCCESS":
+        record_task_result(task_id, task_result.state, task_result.result)
         return {"status": "Simulation completed.", "results": task_result.result}
     elif task_result.state == "FAILURE":
         return {"status": "Simulation failed.", "error": str(task_result.info)}
 
     return {"status": "Unknown task state."}
 
-@celery_app.task
-def run_simulation(config):
+@app.post("/stop-simulation/")
+def stop_simulation(task_id: str):
+    """
+    Stop a running simulation early; the task completes with the results of the simulated time so far.
+    """
+    task_result = celery_app.AsyncResult(task_id)
+    if task_result.state in ("SUCCESS", "FAILURE", "REVOKED"):
+        raise HTTPException(status_code=409, detail="Simulation has already finished.")
+    celery_app.backend.set(STOP_KEY.format(task_id), "1")
+    return {"status": "Stop requested.", "task_id": task_id}
+
+def server_sent_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/simulation-events/")
+async def simulation_events(task_id: str, interval: float = 1.0):
+    """
+    Stream the progress of a simulation task as Server-Sent Events.
+
+    A "progress" event carries the simulated minutes, the fraction done and the
+    running KPI estimates after every time slice; a final "done" event carries
+    the task's status with its results or error.
+    """
+    def read_state():
+        cached = result_cache.get(task_id)
+        if cached is not None:
+            return "SUCCESS", cached
+        task_result = celery_app.AsyncResult(task_id)
+        return task_result.state, task_result.info
+
+    async def events():
+        last = None
+        while True:
+            # Backend reads are blocking, keep them off the event loop
+            state, info = await asyncio.to_thread(read_state)
+            if state == "SUCCESS":
+                yield server_sent_event("done", {"task_id": task_id, "status": "completed", "results": info})
+                return
+            if state in ("FAILURE", "REVOKED"):
+                yield server_sent_event("done", {"task_id": task_id, "status": state.lower(), "error": str(info)})
+                return
+            if state == "PROGRESS" and info != last:
+                last = info
+                yield server_sent_event("progress", {"task_id": task_id, **last})
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Serve the job, run time, worker pool and cache metrics in the Prometheus text format.
+    """
+    refresh_job_states()
+    workers, busy = worker_pool_usage()
+    return Response(service_metrics.render(workers, busy), media_type=CONTENT_TYPE)
+
+class TaskProgress:
+    def __init__(self, task):
+        """
+        Stand-in for jobs.JobControl inside a Celery task: progress reports become the
+        task's PROGRESS state and a stop request is a key in the results backend.
+        Cancellation goes through Celery's own revoke.
+        """
+        self.task = task
+
+    def check(self):
+        pass
+
+    def stopping(self):
+        return self.task.backend.get(STOP_KEY.format(self.task.request.id)) is not None
+
+    def report(self, now, until, kpis=None):
+        self.task.update_state(state="PROGRESS", meta={
+            "simulated_minutes": now, "progress": now / until if until else 1.0, "kpis": kpis,
+        })
+
+
+@celery_app.task(bind=True)
+def run_simulation(self, config):
     """
     Perform the logistics simulation asynchronously.
     """
@@ -193,31 +445,20 @@ def run_simulation(config):
         global simulation_results
                 # Convert config values to proper types before using
         config = convert_config_types(config)
+        report = MemoryReport() if MEMORY_REPORT else None
+        if report is not None:
+            report.phase("setup")
         
         # Rest of your simulation code
-        random.seed(config.get("random_seed", None))
+        seed = config.get("random_seed")
+        random.seed(seed)
+        np.random.seed(seed)
         env = simpy.Environment()
+        reset_statistics()
             
 
         # Define resources as in the original start_simulation function
-        dock_list = [
-            Dock(dock_id, (2, y, 0))
-            for dock_id, y in enumerate(
-                np.arange(5, 5 + (config["num_unloading_docks"] * 5), 5), start=1
-            )
-        ]
-        assembly_area_list = [
-            AssemblyArea(area_id, (x, -5, 0), config["assembly_area_capacity"])
-            for area_id, x in enumerate(
-                np.arange(32, 32 + (config["num_assembly_area"] * 6), 6), start=1
-            )
-        ]
-        loading_dock_list = [
-            Dock(dock_id, (x, -11, 0))
-            for dock_id, x in enumerate(
-                np.arange(32, 32 + (config["num_loading_docks"] * 6), 6), start=1
-            )
-        ]
+        dock_list, assembly_area_list, loading_dock_list = build_layout(config)
 
         resource_handler = ResourceHandler(
             env,
@@ -232,32 +473,56 @@ def run_simulation(config):
         env.process(generate_orders(env, resource_handler, assembly_area_list))
         env.process(generate_loading_trucks(env, resource_handler, assembly_area_list, loading_dock_list))
         env.process(track_forklift_usage(env, resource_handler))
+        env.process(end_warmup(env))
 
-        # Run the simulation
-        env.run(until=config["simulation_duration_minutes"])
+        if report is not None:
+            report.phase("simulation")
+        # Run the simulation in slices publishing running estimates, profiled when PROFILE_DIR is set
+        control = TaskProgress(self)
+        kpis = lambda: collect_api_results(resource_handler, env.now)
+        run_start = time.perf_counter()
+        if PROFILE_DIR:
+            profiler = Profiler()
+            with profiler.attach(env):
+                completed = run_in_slices(env, config["simulation_duration_minutes"], control, kpis=kpis)
+            path = os.path.join(PROFILE_DIR, f"simulation-{time.time_ns()}.folded")
+            profiler.write_folded(path)
+            summary = profiler.summary()
+            logging.info(f"Profiled simulation: {summary['events']} events, {summary['events_per_second']:.0f} events/s, "
+                         f"peak queue {summary['peak_queue']}, folded stacks in {path}")
+        else:
+            completed = run_in_slices(env, config["simulation_duration_minutes"], control, kpis=kpis)
+        wall_time = time.perf_counter() - run_start
 
         # Collect metrics
-        total_time = config["simulation_duration_minutes"]
-        simulation_results = {
-            "Unloading Dock Utilization (%)": resource_handler.get_unloading_dock_utilization(total_time),
-            "Storage Utilization (%)": resource_handler.get_storage_utilization(),
-            "Loading Dock Utilization (%)": resource_handler.get_loading_dock_utilization(total_time),
-            "Average Forklift Utilization (%)": calculate_average_utilization(
-                total_time, resource_handler.forklifts.capacity
-            ),
-            "Truck Unloading Mean Time (mins)": np.mean(truck_unloading_times) if truck_unloading_times else None,
-            "Truck Loading Mean Time (mins)": np.mean(truck_loading_times) if truck_loading_times else None,
-            "Order Loading Wait Time (mins)": np.mean(order_loading_mean_waiting_times) if order_loading_mean_waiting_times else None,
-            "Order Assembly Mean Wait Time (mins)": np.mean(order_assembling_waiting_times) if order_assembling_waiting_times else None,
-            "Order Assembly Mean Time (mins)": np.mean(order_assembling_times) if order_assembling_times else None,
-            "Pallet Put Mean Time (mins)": np.mean(mean_pallet_put_times) if mean_pallet_put_times else None,
-            "Pallet Pickup Mean Time (mins)": np.mean(mean_pallet_pickup_times) if mean_pallet_pickup_times else None
-        }
+        if report is not None:
+            report.phase("reporting")
+        total_time = env.now
+        simulation_results = collect_api_results(resource_handler, total_time)
+        simulation_results["Simulation Wall Time (s)"] = wall_time
+        simulation_results["Simulated Minutes"] = total_time
+        simulation_results["Stopped Early"] = not completed
+        if report is not None:
+            simulation_results["Memory Report"] = report.finish()
         
+        self.backend.delete(STOP_KEY.format(self.request.id))
         return simulation_results
     except Exception as e:
         logging.error(f"Simulation error: {str(e)}")
         raise
+
+
+@task_success.connect
+def cache_task_result(sender=None, result=None, **kwargs):
+    """
+    Cache the results of a finished simulation from the worker that ran it, even if no client polls.
+
+    The worker writes the same RESULT_CACHE_DB file the server reads, so both must share it.
+    """
+    if sender is None or sender.name != run_simulation.name:
+        return
+    converted_config = sender.request.args[0]
+    record_task_result(sender.request.id, "SUCCESS", result, key=simulation_key(converted_config))
     
 
 
@@ -1,40 +1,42 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 import simpy
 import numpy as np
 import random
+import time
+import asyncio
+import json
+import threading
 from config import config  # Ensure config file includes necessary settings like dock capacities
-from dock import Dock
-from assembly_area import AssemblyArea
+from layout import build_layout
 from resource_handler import ResourceHandler
+from surrogate import Surrogate, is_confident
+from service_metrics import ServiceMetrics, CONTENT_TYPE
+from jobs import JobManager, run_in_slices, FINISHED_STATES
+from result_cache import ResultCache, cache_key
 from main import (
     generate_truck_arrivals,
     generate_orders,
     generate_loading_trucks,
     track_forklift_usage,
-    calculate_average_utilization,
-    truck_unloading_times,
-    truck_loading_times,
-    order_assembling_waiting_times,
-    order_assembling_times,
-    order_loading_mean_waiting_times,
-    mean_pallet_put_times,
-    mean_pallet_pickup_times
+    end_warmup,
+    reset_statistics,
+    collect_api_results,
 )
 
 # FastAPI application instance
 app = FastAPI()
 
-# Global variables to store the simulation environment and results
-env = None
-dock_list = []
-assembly_area_list = []
-loading_dock_list = []
-resource_handler = None
+# Surrogate model trained on the sweep database, loaded on first use
+surrogate_model = None
+surrogate_lock = threading.Lock()
+# Fallback simulations of /predict/ still to be added to the surrogate, job ID -> overrides
+prediction_jobs = {}
 
-# Result storage for metrics
-simulation_results = {}
+# Jobs, run times and cache hits served on /metrics
+service_metrics = ServiceMetrics()
 
 app = FastAPI()
 
@@ -76,47 +78,35 @@ def update_config(update: ConfigUpdate):
     return {"message": f"Config '{key}' updated successfully.", "new_value": value}
 
 
-@app.post("/start-simulation/")
-async def start_simulation():
+def simulate(run_config, control):
     """
-    Start the logistics simulation with settings from the config file.
+    Run one simulation in a worker process of the job pool.
+
+    Parameters:
+    - run_config: Full configuration of the run, a snapshot taken at submission.
+    - control: JobControl of the job (see jobs.py), checked for cancellation and
+      receiving the progress and running KPIs between time slices.
+
+    Returns:
+    - Dict with the labelled "results", "simulated_minutes" (less than the duration
+      when "stopped_early"), the "seed" of the run and "wall_time" seconds.
     """
-    global env, dock_list, assembly_area_list, loading_dock_list, resource_handler, simulation_results
+    # The worker's own copy of the config, overwritten by every job it runs
+    config.update(run_config)
+    control.start()
+    start = time.perf_counter()
 
-    # Initialize random seed
-    random.seed(config.get("random_seed", None))
+    # Initialize random seeds, a run submitted without a seed is a new sample from OS entropy
+    seed = run_config.get("random_seed")
+    random.seed(seed)
+    np.random.seed(seed)
 
     # Initialize simulation environment
     env = simpy.Environment()
-
-    # Generate dock and assembly area coordinates based on config
-    unloading_dock_start_y = 5
-    width_unloading_dock = 5
-    unloading_dock_end_y = unloading_dock_start_y + width_unloading_dock * config["num_unloading_docks"] + config["num_unloading_docks"] - 1
-    unloading_dock_x = 2
-
-    assembly_area_start_x = 32
-    width_assembly_area = 6
-    assembly_area_end_x = assembly_area_start_x + width_assembly_area * config["num_assembly_area"]
-    assembly_area_y = -5
-
-    loading_dock_start_x = 32
-    width_loading_dock = 6
-    loading_dock_end_x = loading_dock_start_x + width_loading_dock * config["num_loading_docks"]
-    loading_dock_y = -11
+    reset_statistics()
 
     # Create resources: docks, assembly areas, and loading docks
-    dock_list = [Dock(dock_id, (unloading_dock_x, round(y, 2), 0))
-                 for dock_id, y in zip(range(1, config["num_unloading_docks"] + 1),
-                                       np.arange(unloading_dock_start_y, unloading_dock_end_y, width_unloading_dock))]
-
-    assembly_area_list = [AssemblyArea(area_id, (round(x, 2), assembly_area_y, 0), config["assembly_area_capacity"])
-                          for area_id, x in zip(range(1, config["num_assembly_area"] + 1),
-                                                np.arange(assembly_area_start_x, assembly_area_end_x, width_assembly_area))]
-
-    loading_dock_list = [Dock(dock_id, (round(x, 2), loading_dock_y, 0))
-                         for dock_id, x in zip(range(1, config["num_loading_docks"] + 1),
-                                               np.arange(loading_dock_start_x, loading_dock_end_x, width_loading_dock))]
+    dock_list, assembly_area_list, loading_dock_list = build_layout()
 
     # Initialize resource handler
     resource_handler = ResourceHandler(
@@ -132,37 +122,214 @@ async def start_simulation():
     env.process(generate_orders(env, resource_handler, assembly_area_list))
     env.process(generate_loading_trucks(env, resource_handler, assembly_area_list, loading_dock_list))
     env.process(track_forklift_usage(env, resource_handler))
+    env.process(end_warmup(env))
+
+    # Run the simulation in slices, publishing running estimates and stopping early on request
+    completed = run_in_slices(env, config["simulation_duration_minutes"], control,
+                              kpis=lambda: collect_api_results(resource_handler, env.now))
+
+    # Calculate results, over the simulated time reached when the run was stopped early
+    total_time = env.now
+    simulation_results = collect_api_results(resource_handler, total_time)
+
+    return {"results": simulation_results, "simulated_minutes": total_time, "stopped_early": not completed,
+            "seed": seed, "wall_time": time.perf_counter() - start}
+
+
+# Results of earlier runs by config, seed and model version, in results_cache.db
+result_cache = ResultCache()
+
+# Simulations run in a process pool (SIMULATION_WORKERS processes, one per core by default)
+job_manager = JobManager(simulate, service_metrics=service_metrics, cache=result_cache)
+service_metrics.workers = job_manager.workers
+
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    job_manager.shutdown()
+
+
+@app.post("/start-simulation/", status_code=202)
+def start_simulation(response: Response, seed: Optional[int] = None):
+    """
+    Queue a logistics simulation with the current configuration and return its job ID right away.
+
+    With a seed the run is reproducible: a configuration and seed simulated before are
+    answered from the result cache with their results, and a run already queued or
+    running shares that job. Runs without a seed always simulate a new sample.
+    """
+    run_config = dict(config, random_seed=seed)
+    job_id = job_manager.submit(run_config, key=None if seed is None else cache_key(run_config, seed=seed))
+    status = job_manager.status(job_id)
+    if status["cached"]:
+        response.status_code = 200
+        return {"message": "Simulation results cached.", "job_id": job_id, "status_url": f"/jobs/{job_id}",
+                "results": status["result"]["results"]}
+    return {"message": "Simulation queued.", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Status of a simulation job: queued, running, completed (with its results), failed or cancelled.
+    """
+    status = job_manager.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return status
+
+
+@app.delete("/jobs/{job_id}", status_code=202)
+def cancel_job(job_id: str):
+    """
+    Cancel a queued or running simulation job.
+    """
+    if job_manager.status(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    if not job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' has already finished.")
+    return {"message": "Cancellation requested.", "job_id": job_id}
 
-    # Run the simulation
-    env.run(until=config["simulation_duration_minutes"])
 
-    # Calculate results
-    total_time = config["simulation_duration_minutes"]
-    simulation_results = {
-        "Unloading Dock Utilization (%)": resource_handler.get_unloading_dock_utilization(total_time),
-        "Storage Utilization (%)": resource_handler.get_storage_utilization(),
-        "Loading Dock Utilization (%)": resource_handler.get_loading_dock_utilization(total_time),
-        "Average Forklift Utilization (%)": calculate_average_utilization(
-            total_time, resource_handler.forklifts.capacity
-        ),
-        "Truck Unloading Mean Time (mins)": np.mean(truck_unloading_times) if truck_unloading_times else None,
-        "Truck Loading Mean Time (mins)": np.mean(truck_loading_times) if truck_loading_times else None,
-        "Order Loading Wait Time (mins)": np.mean(order_loading_mean_waiting_times) if order_loading_mean_waiting_times else None,
-        "Order Assembly Mean Wait Time (mins)": np.mean(order_assembling_waiting_times) if order_assembling_waiting_times else None,
-        "Order Assembly Mean Time (mins)": np.mean(order_assembling_times) if order_assembling_times else None,
-        "Pallet Put Mean Time (mins)": np.mean(mean_pallet_put_times) if mean_pallet_put_times else None,
-        "Pallet Pickup Mean Time (mins)": np.mean(mean_pallet_pickup_times) if mean_pallet_pickup_times else None
-    }
+@app.post("/jobs/{job_id}/stop", status_code=202)
+def stop_job(job_id: str):
+    """
+    Stop a running simulation job early; it completes with the results of the simulated time so far.
+    """
+    if job_manager.status(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    if not job_manager.stop(job_id):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' has already finished.")
+    return {"message": "Stop requested.", "job_id": job_id}
+
+
+def server_sent_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, interval: float = 1.0):
+    """
+    Stream the progress of a simulation job as Server-Sent Events.
 
-    return {"message": "Simulation completed", "results": simulation_results}
+    A "progress" event carries the simulated minutes, the fraction done and the
+    running KPI estimates after every time slice; a final "done" event carries
+    the job's status with its results.
+    """
+    if job_manager.status(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+
+    async def events():
+        last = None
+        while True:
+            # Status reads talk to the manager process, keep them off the event loop
+            status = await asyncio.to_thread(job_manager.status, job_id)
+            if status is None or status["status"] in FINISHED_STATES:
+                yield server_sent_event("done", status or {"job_id": job_id, "status": "unknown"})
+                return
+            if status["progress"] is not None and status["progress"] != last:
+                last = status["progress"]
+                yield server_sent_event("progress", {"job_id": job_id, "status": status["status"], **last})
+            await asyncio.sleep(interval)
 
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @app.get("/simulation-results/")
-async def get_simulation_results():
+def get_simulation_results(job_id: Optional[str] = None):
     """
-    Retrieve results of the most recent simulation.
+    Retrieve results of a simulation job, the most recently submitted completed one by default.
     """
-    if not simulation_results:
+    status = job_manager.latest(function=simulate) if job_id is None else job_manager.status(job_id)
+    if status is None or status["status"] != "completed" or "results" not in status["result"]:
         return {"error": "No simulation results available. Please start a simulation first."}
-    return {"results": simulation_results}
+    return {"job_id": status["job_id"], "results": status["result"]["results"]}
+
+
+def simulate_prediction(run_config, overrides, seed, control):
+    """
+    Run the fallback simulation of a prediction in a worker process of the job pool.
+
+    Parameters:
+    - run_config: Full configuration of the run, a snapshot taken at submission.
+    - overrides: Config keys of the prediction that differ from the configuration.
+    - seed: Seed for random and numpy.random, None for an unseeded run.
+    - control: JobControl of the job (see jobs.py).
+
+    Returns:
+    - Dict with the "kpis" of the run (see main.collect_results), "overrides",
+      "simulated_minutes" and "wall_time" seconds.
+    """
+    from main import run_simulation
+    control.start()
+    start = time.perf_counter()
+    kpis = run_simulation(overrides=run_config, seed=seed, quiet=True)
+    control.check()
+    return {"kpis": kpis, "overrides": overrides, "simulated_minutes": run_config["simulation_duration_minutes"],
+            "wall_time": time.perf_counter() - start}
+
+
+def learn_predictions():
+    """Add the fallback simulations finished since the last call to the surrogate. Called with surrogate_lock held."""
+    for job_id, overrides in list(prediction_jobs.items()):
+        status = job_manager.status(job_id)
+        if status is None or status["status"] in FINISHED_STATES:
+            del prediction_jobs[job_id]
+            if status is not None and status["status"] == "completed":
+                surrogate_model.add(overrides, status["result"]["kpis"])
+
+
+class PredictionRequest(BaseModel):
+    overrides: Dict[str, float] = {}  # Config keys that differ from the current configuration
+    tolerance: float = 0.05  # Relative uncertainty accepted before falling back to a simulation
+    absolute: float = 0.5  # Uncertainty always accepted, in the KPI's unit
+    seed: Optional[int] = None  # Seed of the fallback simulation, unseeded by default
+
+
+@app.post("/predict/")
+def predict(request: PredictionRequest, response: Response):
+    """
+    Predict KPIs from the surrogate model.
+
+    When the prediction is too uncertain a simulation is queued instead and its job ID is
+    returned (status 202); its KPIs are at /jobs/{job_id} once completed and are added to
+    the surrogate with the next prediction.
+    """
+    global surrogate_model
+    overrides = {}
+    for key, value in request.overrides.items():
+        if key not in config:
+            raise HTTPException(status_code=404, detail=f"Config key '{key}' not found.")
+        overrides[key] = int(value) if isinstance(config[key], int) else value
+    start = time.perf_counter()
+    with surrogate_lock:
+        if surrogate_model is None:
+            try:
+                surrogate_model = Surrogate.from_sweeps()
+            except ValueError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+        learn_predictions()
+        prediction = surrogate_model.predict(overrides)
+        if prediction and is_confident(prediction, request.tolerance, request.absolute):
+            return {
+                "source": "surrogate",
+                "kpis": {key: stats["mean"] for key, stats in prediction.items()},
+                "prediction": prediction,
+                "elapsed": time.perf_counter() - start,
+            }
+        # The fallback runs in the job pool like any simulation, never on the server's own config
+        job_id = job_manager.submit({**config, **overrides}, overrides, request.seed, function=simulate_prediction)
+        prediction_jobs[job_id] = overrides
+    response.status_code = 202
+    return {"source": "simulation", "job_id": job_id, "status_url": f"/jobs/{job_id}", "prediction": prediction,
+            "elapsed": time.perf_counter() - start}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Serve the job, run time, worker and cache metrics in the Prometheus text format.
+    """
+    job_manager.refresh()
+    return Response(service_metrics.render(), media_type=CONTENT_TYPE)
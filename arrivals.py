@@ -0,0 +1,207 @@
+import abc
+import csv
+from datetime import datetime
+
+import numpy as np
+
+
+class Arrival:
+    __slots__ = ("time", "entity_id", "size", "items", "pallet_types")
+
+    def __init__(self, time, entity_id=None, size=None, items=None, pallet_types=None):
+        """
+        A single arrival handed to a generator process.
+
+        Parameters:
+        - time: Arrival time in simulation minutes.
+        - entity_id: Identifier from the trace, or None to let the generator number arrivals.
+        - size: Number of pallets (truck capacity or order size), or None to sample it.
+        - items: Optional dict of pallet type -> quantity for orders.
+        - pallet_types: Optional list of pallet types carried by an unloading truck, in unloading order.
+        """
+        self.time = time
+        self.entity_id = entity_id
+        self.size = size
+        self.items = items
+        self.pallet_types = pallet_types
+
+    def __repr__(self):
+        return f"Arrival(time={self.time}, entity_id={self.entity_id}, size={self.size})"
+
+
+def _order_items(items):
+    """Per-type quantities of an order, None when none is positive so the order size is used instead."""
+    return items if items and any(quantity > 0 for quantity in items.values()) else None
+
+
+class ArrivalSource(abc.ABC):
+    """
+    Base class for arrival sources.
+
+    A source is an iterable of Arrival objects sorted by time. Generator processes
+    in main.py pull from it lazily, so a source never has to hold more than the
+    next arrival in memory.
+    """
+
+    @abc.abstractmethod
+    def arrivals(self):
+        """Generator of the Arrival objects in time order."""
+
+    def __iter__(self):
+        return self.arrivals()
+
+
+class FixedIntervalSource(ArrivalSource):
+    def __init__(self, interval, until=None):
+        """
+        Synthetic arrivals at a fixed interval, the model's default behaviour.
+
+        Parameters:
+        - interval: Minutes between consecutive arrivals.
+        - until: Optional time after which no more arrivals are produced.
+        """
+        if interval <= 0:
+            raise ValueError("Arrival interval must be positive.")
+        self.interval = interval
+        self.until = until
+
+    def arrivals(self):
+        time = 0
+        while True:
+            time += self.interval
+            if self.until is not None and time > self.until:
+                return
+            yield Arrival(time)
+
+
+class CsvTraceSource(ArrivalSource):
+    def __init__(self, path, time_column="time", id_column="id", size_column="size",
+                 item_columns=None, time_scale=1.0, origin=None):
+        """
+        Stream arrivals from a CSV trace, one row at a time.
+
+        Parameters:
+        - path: CSV file with a header row.
+        - time_column: Column holding the arrival time. Numeric values are minutes,
+          anything else is parsed as an ISO timestamp.
+        - id_column: Optional column with the entity identifier.
+        - size_column: Optional column with the number of pallets.
+        - item_columns: Optional list of pallet type columns holding order quantities.
+        - time_scale: Factor converting numeric times to minutes (e.g. 1/60 for seconds).
+        - origin: Time that maps to simulation time 0. Defaults to the first row.
+        """
+        self.path = path
+        self.time_column = time_column
+        self.id_column = id_column
+        self.size_column = size_column
+        self.item_columns = item_columns
+        self.time_scale = time_scale
+        self.origin = origin
+
+    def _to_minutes(self, value):
+        try:
+            return float(value) * self.time_scale
+        except ValueError:
+            return datetime.fromisoformat(value).timestamp() / 60
+
+    def arrivals(self):
+        with open(self.path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            time_idx = header.index(self.time_column)
+            id_idx = header.index(self.id_column) if self.id_column in header else None
+            size_idx = header.index(self.size_column) if self.size_column in header else None
+            item_idx = [(column, header.index(column)) for column in (self.item_columns or []) if column in header]
+            origin = None if self.origin is None else self._to_minutes(self.origin)
+            for row in reader:
+                if not row:
+                    continue
+                time = self._to_minutes(row[time_idx])
+                if origin is None:
+                    origin = time
+                entity_id = int(row[id_idx]) if id_idx is not None and row[id_idx] else None
+                size = int(row[size_idx]) if size_idx is not None and row[size_idx] else None
+                items = _order_items({column: int(row[idx] or 0) for column, idx in item_idx})
+                yield Arrival(time - origin, entity_id, size, items)
+
+
+def trace_dtype(pallet_types=None):
+    """
+    Record layout of binary traces.
+
+    Parameters:
+    - pallet_types: Optional pallet types to add as per-type quantity fields (order traces).
+
+    Returns:
+    - numpy structured dtype with time (minutes), id and size fields.
+    """
+    fields = [("time", "<f8"), ("id", "<i8"), ("size", "<i4")]
+    fields.extend((pallet_type, "<i4") for pallet_type in pallet_types or [])
+    return np.dtype(fields)
+
+
+class BinaryTraceSource(ArrivalSource):
+    def __init__(self, path, dtype=None, chunk_size=65536):
+        """
+        Stream arrivals from a memory-mapped binary trace of fixed-size records.
+
+        Parameters:
+        - path: File written with write_binary_trace (or any raw array of dtype).
+        - dtype: Record dtype, see trace_dtype. Defaults to the truck layout.
+        - chunk_size: Number of records converted to Python objects at a time.
+
+        An id of -1 or a size of 0 means "not given" and lets the model sample it.
+        """
+        self.path = path
+        self.dtype = trace_dtype() if dtype is None else np.dtype(dtype)
+        self.chunk_size = chunk_size
+
+    def arrivals(self):
+        records = np.memmap(self.path, dtype=self.dtype, mode="r")
+        item_columns = [name for name in self.dtype.names if name not in ("time", "id", "size")]
+        for start in range(0, len(records), self.chunk_size):
+            chunk = records[start:start + self.chunk_size]
+            times = chunk["time"].tolist()
+            ids = chunk["id"].tolist()
+            sizes = chunk["size"].tolist()
+            items = [chunk[column].tolist() for column in item_columns]
+            for i, time in enumerate(times):
+                order_items = _order_items({column: values[i] for column, values in zip(item_columns, items)})
+                yield Arrival(time, ids[i] if ids[i] >= 0 else None, sizes[i] or None, order_items)
+        del records
+
+
+def write_binary_trace(path, arrivals, dtype=None, chunk_size=65536):
+    """
+    Convert an iterable of arrivals (e.g. a CsvTraceSource) into a binary trace.
+
+    Parameters:
+    - path: Output file.
+    - arrivals: Iterable of Arrival objects.
+    - dtype: Record dtype, see trace_dtype.
+    - chunk_size: Number of records buffered before each write.
+
+    Returns:
+    - Number of records written.
+    """
+    dtype = trace_dtype() if dtype is None else np.dtype(dtype)
+    item_columns = [name for name in dtype.names if name not in ("time", "id", "size")]
+    buffer = np.zeros(chunk_size, dtype=dtype)
+    written = 0
+    filled = 0
+    with open(path, "wb") as f:
+        for arrival in arrivals:
+            record = buffer[filled]
+            record["time"] = arrival.time
+            record["id"] = -1 if arrival.entity_id is None else arrival.entity_id
+            record["size"] = arrival.size or 0
+            for column in item_columns:
+                record[column] = (arrival.items or {}).get(column, 0)
+            filled += 1
+            if filled == chunk_size:
+                buffer.tofile(f)
+                written += filled
+                filled = 0
+        buffer[:filled].tofile(f)
+        written += filled
+    return written
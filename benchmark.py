@@ -0,0 +1,309 @@
+"""
+Benchmark suite of simulation speed with regression baselines.
+
+Scenario tiers, all with a fixed seed:
+- small: the current config.
+- large: 10x the truck and order arrivals and 4x the rack depth (slots per aisle).
+- long: the current config over a 7-day horizon.
+
+Microbenchmarks time AdvancedStorage.assign_storage_location, get_item and
+get_available_quantity and the layout construction. Every scenario runs in
+a fresh worker process, so its peak memory (maximum RSS) is its own:
+
+    python benchmark.py --save-baseline                  # record benchmark_baseline.json
+    python benchmark.py                                  # compare, exit code 1 on regressions
+    python benchmark.py --scenarios small --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import config
+
+BENCHMARK_BASELINE = "benchmark_baseline.json"
+BENCHMARK_SEED = 1
+DEFAULT_THRESHOLD = 0.10  # Relative slowdown (or memory growth) reported as a regression
+
+# Scenario name -> function of the base config returning its overrides
+SCENARIOS = {
+    "small": lambda cfg: {},
+    "large": lambda cfg: {
+        "unloading_trucks_per_hour": cfg["unloading_trucks_per_hour"] * 10,
+        "loading_trucks_per_hour": cfg["loading_trucks_per_hour"] * 10,
+        "orders_per_hour": cfg["orders_per_hour"] * 10,
+        "storage_slots_per_aisle": cfg["storage_slots_per_aisle"] * 4,
+    },
+    "long": lambda cfg: {"simulation_duration_minutes": 7 * 24 * 60},
+}
+
+# Result key -> True if larger is better, compared against the baseline
+SCENARIO_MEASURES = {"wall_time": False, "events_per_second": True, "peak_rss_mb": False}
+
+
+class _EventCounter:
+    def __init__(self):
+        """Minimal stand-in for profiling.Profiler that only counts processed events."""
+        self.events = 0
+        self._env = None
+
+    def attach(self, env):
+        self._env = env
+        return self
+
+    def __enter__(self):
+        step = self._env.step
+
+        def counted_step():
+            self.events += 1
+            step()
+
+        self._env.step = counted_step
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        del self._env.step
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_scenario(overrides, seed):
+    """Worker entry point: one quiet, counted run of a scenario."""
+    from main import run_simulation
+    counter = _EventCounter()
+    start = time.perf_counter()
+    results = run_simulation(overrides=overrides, seed=seed, quiet=True, profiler=counter)
+    wall_time = time.perf_counter() - start
+    return {
+        "wall_time": wall_time,
+        "events": counter.events,
+        "events_per_second": counter.events / wall_time,
+        "peak_rss_mb": _peak_rss_mb(),
+        "kpis": results,
+    }
+
+
+def run_scenario(name, overrides=None, seed=BENCHMARK_SEED):
+    """
+    Run one scenario tier in a fresh process.
+
+    Parameters:
+    - name: Key of SCENARIOS.
+    - overrides: Config keys applied on top of the scenario's own.
+    - seed: Seed of the run.
+
+    Returns:
+    - Dict with "wall_time" seconds, "events", "events_per_second", "peak_rss_mb" and the run's "kpis".
+    """
+    run_config = {**config, **SCENARIOS[name](config), **(overrides or {})}
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_run_scenario, run_config, seed).result()
+
+
+def _time_calls(function, calls, repeats=5):
+    """Best time per call in microseconds over `repeats` rounds of `calls` calls."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e6
+
+
+def run_microbenchmarks(repeats=5, seed=BENCHMARK_SEED):
+    """
+    Time the storage methods and the layout construction.
+
+    Returns:
+    - Dict of benchmark name -> {"us_per_call", "calls"}.
+    """
+    from layout import build_layout
+    from pallet import Pallet
+    from storage import AdvancedStorage
+
+    def new_storage():
+        storage = AdvancedStorage(
+            num_aisles=config["storage_aisles"],
+            slots_per_aisle=config["storage_slots_per_aisle"],
+            levels_per_slot=config["storage_levels_per_slot"],
+            pallet_types=config["pallet_types"],
+        )
+        storage.initial_storage(config["initial_storage"])
+        return storage
+
+    rng = random.Random(seed)
+    pallet_types = config["pallet_types"]
+    calls = 500
+    report = {}
+
+    # Storing and picking change the storage, every round gets a fresh one
+    best_store = best_pick = float("inf")
+    for _ in range(repeats):
+        storage = new_storage()
+        pallets = [Pallet(i, rng.choice(pallet_types), 0) for i in range(calls)]
+        start = time.perf_counter()
+        for pallet in pallets:
+            storage.assign_storage_location(pallet)
+        best_store = min(best_store, time.perf_counter() - start)
+        picks = [pallet.pallet_type for pallet in pallets]
+        start = time.perf_counter()
+        for pallet_type in picks:
+            storage.get_item(pallet_type)
+        best_pick = min(best_pick, time.perf_counter() - start)
+    report["assign_storage_location"] = {"us_per_call": best_store / calls * 1e6, "calls": calls}
+    report["get_item"] = {"us_per_call": best_pick / calls * 1e6, "calls": calls}
+
+    storage = new_storage()
+    types = iter(pallet_types * calls)
+    report["get_available_quantity"] = {
+        "us_per_call": _time_calls(lambda: storage.get_available_quantity(next(types)), 100, repeats),
+        "calls": 100,
+    }
+    report["build_layout"] = {"us_per_call": _time_calls(build_layout, 20, repeats), "calls": 20}
+    report["storage_construction"] = {"us_per_call": _time_calls(new_storage, 5, repeats), "calls": 5}
+    return report
+
+
+def run_benchmarks(scenarios=None, micro=True, overrides=None, seed=BENCHMARK_SEED, progress=True):
+    """
+    Run the scenario tiers and the microbenchmarks.
+
+    Parameters:
+    - scenarios: Names of the scenarios to run, all by default.
+    - micro: Also run the microbenchmarks.
+    - overrides: Config keys applied to every scenario (e.g. a shorter horizon for a quick check).
+    - seed: Seed of the scenario runs.
+    - progress: Print one line per scenario.
+
+    Returns:
+    - Dict with "scenarios", "micro", "seed" and a description of the "machine".
+    """
+    results = {
+        "seed": seed,
+        "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                    "platform": platform.platform(), "processor": platform.machine()},
+        "scenarios": {},
+        "micro": {},
+    }
+    for name in scenarios or SCENARIOS:
+        if name not in SCENARIOS:
+            raise KeyError(f"Unknown scenario: {name}")
+        results["scenarios"][name] = run_scenario(name, overrides, seed)
+        if progress:
+            stats = results["scenarios"][name]
+            print(f"{name}: {stats['wall_time']:.2f}s, {stats['events']} events, "
+                  f"{stats['events_per_second']:.0f} events/s, peak RSS {stats['peak_rss_mb']:.1f} MB")
+    if micro:
+        results["micro"] = run_microbenchmarks(seed=seed)
+        if progress:
+            for name, stats in results["micro"].items():
+                print(f"{name}: {stats['us_per_call']:.1f} us/call")
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare benchmark results with a baseline.
+
+    Parameters:
+    - results, baseline: Dicts returned by run_benchmarks.
+    - threshold: Relative change in the worse direction reported as a regression.
+
+    Returns:
+    - List of dicts {"benchmark", "measure", "baseline", "current", "change"}, one per regression.
+      A scenario whose event count differs from the baseline is also reported, since
+      the fixed seed should reproduce the same run.
+    """
+    regressions = []
+
+    def check(benchmark, measure, old, new, higher_is_better):
+        if old is None or new is None or old == 0:
+            return
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append({"benchmark": benchmark, "measure": measure,
+                                "baseline": old, "current": new, "change": change})
+
+    for name, stats in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        for measure, higher_is_better in SCENARIO_MEASURES.items():
+            check(name, measure, old.get(measure), stats.get(measure), higher_is_better)
+        if old.get("events") != stats["events"]:
+            regressions.append({"benchmark": name, "measure": "events", "baseline": old.get("events"),
+                                "current": stats["events"], "change": None})
+    for name, stats in results["micro"].items():
+        old = baseline.get("micro", {}).get(name)
+        if old is not None:
+            check(name, "us_per_call", old["us_per_call"], stats["us_per_call"], False)
+    return regressions
+
+
+def print_regressions(regressions, threshold=DEFAULT_THRESHOLD):
+    if not regressions:
+        print(f"\nNo regressions beyond {threshold:.0%}.")
+        return
+    print(f"\n=== {len(regressions)} Regressions (threshold {threshold:.0%}) ===")
+    for regression in regressions:
+        if regression["change"] is None:
+            print(f"{regression['benchmark']}: {regression['measure']} changed from "
+                  f"{regression['baseline']} to {regression['current']} (the seeded run is no longer the same)")
+        else:
+            print(f"{regression['benchmark']}: {regression['measure']} {regression['baseline']:.3g} -> "
+                  f"{regression['current']:.3g} ({regression['change']:+.1%})")
+
+
+def cli(argv=None):
+    """Command-line entry point, see python benchmark.py --help."""
+    from main import parse_overrides
+    parser = argparse.ArgumentParser(description="Benchmark the warehouse simulation.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="Scenarios to run (default: all)")
+    parser.add_argument("--no-micro", action="store_true", help="Skip the microbenchmarks")
+    parser.add_argument("--set", metavar="KEY=VALUE", action="append", default=[], dest="assignments",
+                        help="Override one config key in every scenario, may be repeated")
+    parser.add_argument("--baseline", metavar="PATH", default=BENCHMARK_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change reported as a regression (default: 0.10)")
+    args = parser.parse_args(argv)
+    try:
+        overrides = parse_overrides(None, args.assignments)
+    except KeyError as e:
+        parser.error(e.args[0])
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = run_benchmarks(args.scenarios, not args.no_micro, overrides)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}.")
+        return 0
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline first.")
+        return 0
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    print_regressions(regressions, args.threshold)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,328 @@
+"""
+Scenario comparisons with variance reduction.
+
+Comparing two configurations (say 38 against 40 forklifts) with independent runs
+needs many replications, because the noise of both runs adds up. Here both
+scenarios of a replication see exactly the same trucks and orders (common random
+numbers): every truck and order draws its size and pallet types from its own
+random stream, keyed by the replication seed and the entity's sequence number,
+so the inputs stay aligned even when the scenarios consume them differently.
+
+On top of that a comparison can use antithetic replications (each seed is also
+run with mirrored uniforms 1 - u) and control variates, which correct each
+replication by how far its realized inputs (pallet mix, truck and order sizes)
+landed from their known means:
+
+    result = compare_scenarios({"forklifts": 38}, {"forklifts": 40}, replications=20, antithetic=True)
+    print_comparison(result)
+"""
+import abc
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import config
+from arrivals import Arrival, ArrivalSource, FixedIntervalSource
+from runner import replication_seeds, t_quantile
+
+# Stream keys, one per entity kind, so trucks and orders never share draws
+TRUCK_STREAM = 1
+ORDER_STREAM = 2
+# Residual degrees of freedom n - q - 1 needed before control variates are fitted
+MIN_CONTROL_DF = 10
+
+
+class EntityStreamSource(ArrivalSource):
+    def __init__(self, interval, seed, stream, antithetic=False, until=None, cfg=None):
+        """
+        Fixed-interval arrivals whose attributes come from per-entity random streams.
+
+        Entity k of a source draws from numpy's default_rng([seed, stream, k]), always
+        the same number of uniforms, so its attributes do not depend on how many
+        draws other entities or other parts of the model made.
+
+        Parameters:
+        - interval: Minutes between consecutive arrivals.
+        - seed: Replication seed.
+        - stream: Stream key of the entity kind (TRUCK_STREAM, ORDER_STREAM).
+        - antithetic: Use 1 - u for every uniform u.
+        - until: Optional time after which no more arrivals are produced.
+        - cfg: Configuration dict, defaults to config.
+        """
+        self.interval = interval
+        self.seed = seed
+        self.stream = stream
+        self.antithetic = antithetic
+        self.until = until
+        self.cfg = config if cfg is None else cfg
+        self.count = 0
+
+    def uniforms(self, index, count):
+        """The `count` uniforms of entity `index`."""
+        u = np.random.default_rng([self.seed, self.stream, index]).random(count)
+        return 1 - u if self.antithetic else u
+
+    def pick_types(self, u):
+        """Map uniforms to pallet types by inverting the pallet_probs distribution."""
+        cumulative = np.cumsum(self.cfg["pallet_probs"])
+        index = np.minimum(np.searchsorted(cumulative / cumulative[-1], u, side="right"), len(cumulative) - 1)
+        return [self.cfg["pallet_types"][i] for i in index]
+
+    def pick_size(self, u, low, high):
+        """Map a uniform to an integer in [low, high]."""
+        return min(low + int(u * (high - low + 1)), high)
+
+    @abc.abstractmethod
+    def entity(self, index, time):
+        """The Arrival of entity `index` at `time`, drawn from its uniforms."""
+
+    def arrivals(self):
+        for index, arrival in enumerate(FixedIntervalSource(self.interval, self.until)):
+            self.count += 1
+            yield self.entity(index, arrival.time)
+
+
+class TruckStreamSource(EntityStreamSource):
+    def __init__(self, interval, seed, antithetic=False, until=None, cfg=None):
+        """Unloading trucks with per-truck capacity and pallet types, see EntityStreamSource."""
+        super().__init__(interval, seed, TRUCK_STREAM, antithetic, until, cfg)
+        self.pallets = 0
+        self.type_counts = dict.fromkeys(self.cfg["pallet_types"], 0)
+
+    def entity(self, index, time):
+        low, high = self.cfg["truck_capacity_min"], self.cfg["truck_capacity_max"]
+        u = self.uniforms(index, 1 + high)
+        capacity = self.pick_size(u[0], low, high)
+        pallet_types = self.pick_types(u[1:1 + capacity])
+        self.pallets += capacity
+        for pallet_type in pallet_types:
+            self.type_counts[pallet_type] += 1
+        return Arrival(time, size=capacity, pallet_types=pallet_types)
+
+
+class OrderStreamSource(EntityStreamSource):
+    def __init__(self, interval, seed, antithetic=False, until=None, cfg=None):
+        """Orders with per-order size and composition, see EntityStreamSource."""
+        super().__init__(interval, seed, ORDER_STREAM, antithetic, until, cfg)
+        self.pallets = 0
+        self.type_counts = dict.fromkeys(self.cfg["pallet_types"], 0)
+
+    def entity(self, index, time):
+        low, high = self.cfg["minimum_order_size"], self.cfg["maximum_order_size"]
+        u = self.uniforms(index, 1 + high)
+        size = self.pick_size(u[0], low, high)
+        items = dict.fromkeys(self.cfg["pallet_types"], 0)
+        for pallet_type in self.pick_types(u[1:1 + size]):
+            items[pallet_type] += 1
+            self.type_counts[pallet_type] += 1
+        self.pallets += size
+        return Arrival(time, size=size, items=items)
+
+
+def input_controls(trucks, orders, cfg=None):
+    """
+    Realized input statistics of a run and their known expectations.
+
+    Parameters:
+    - trucks: TruckStreamSource used by the run.
+    - orders: OrderStreamSource used by the run.
+    - cfg: Configuration dict, defaults to config.
+
+    Returns:
+    - Dict of control name -> (realized value, expected value). Names are
+      truck_capacity, order_size, inbound_share:<type> and order_share:<type>.
+    """
+    cfg = config if cfg is None else cfg
+    probs = np.asarray(cfg["pallet_probs"], dtype=float)
+    probs = probs / probs.sum()
+    controls = {
+        "truck_capacity": (trucks.pallets / trucks.count if trucks.count else math.nan,
+                           (cfg["truck_capacity_min"] + cfg["truck_capacity_max"]) / 2),
+        "order_size": (orders.pallets / orders.count if orders.count else math.nan,
+                       (cfg["minimum_order_size"] + cfg["maximum_order_size"]) / 2),
+    }
+    for source, prefix in ((trucks, "inbound_share"), (orders, "order_share")):
+        for pallet_type, p in zip(cfg["pallet_types"], probs):
+            share = source.type_counts[pallet_type] / source.pallets if source.pallets else math.nan
+            controls[f"{prefix}:{pallet_type}"] = (share, p)
+    return controls
+
+
+def default_controls(cfg=None):
+    """Truck and order sizes plus the inbound and order share of the most common pallet type."""
+    cfg = config if cfg is None else cfg
+    common = cfg["pallet_types"][int(np.argmax(cfg["pallet_probs"]))]
+    return ["truck_capacity", "order_size", f"inbound_share:{common}", f"order_share:{common}"]
+
+
+def run_stream_replication(run_config, seed, antithetic=False):
+    """
+    Worker entry point: one quiet replication driven by per-entity streams.
+
+    Returns:
+    - (dict of KPI key -> value, dict of control name -> (realized, expected)).
+    """
+    from main import run_simulation
+    duration = run_config["simulation_duration_minutes"]
+    trucks = TruckStreamSource(60 / run_config["unloading_trucks_per_hour"], seed, antithetic, duration, run_config)
+    orders = OrderStreamSource(60 / run_config["orders_per_hour"], seed, antithetic, duration, run_config)
+    results = run_simulation(overrides=run_config, seed=seed, quiet=True, truck_source=trucks, order_source=orders)
+    return results, input_controls(trucks, orders, run_config)
+
+
+def estimate_mean(values, controls=None, expected=None, confidence=0.95, min_df=MIN_CONTROL_DF):
+    """
+    Mean and confidence interval of i.i.d. observations, optionally with control variates.
+
+    With controls the estimate is mean(y) - beta . (mean(c) - expected), where beta is
+    the least-squares fit of y on the controls. Controls without variation are
+    dropped. Every fitted control costs a degree of freedom, so the controls are
+    only used when at least min_df residual degrees of freedom remain; the choice
+    depends on n and q alone, never on which interval comes out narrower, so the
+    reported interval keeps its nominal coverage.
+
+    Parameters:
+    - values: float array [n].
+    - controls: Optional float array [n, q] of realized control values.
+    - expected: Known expectations of the controls, shape [q].
+    - confidence: Confidence level of the interval.
+    - min_df: Residual degrees of freedom n - q - 1 required to use the controls.
+
+    Returns:
+    - Dict with n, mean, std, half_width, ci_low, ci_high and controls (number used).
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = float(values.mean()) if n else math.nan
+    std = float(values.std(ddof=1)) if n > 1 else math.nan
+    half_width = t_quantile(0.5 + confidence / 2, n - 1) * std / math.sqrt(n) if n > 1 else math.inf
+    used = 0
+    if controls is not None and n > 1:
+        controls = np.asarray(controls, dtype=float).reshape(n, -1)
+        expected = np.asarray(expected, dtype=float)
+        varying = controls.std(axis=0) > 1e-12
+        controls, expected = controls[:, varying], expected[varying]
+        q = controls.shape[1]
+        if q and n - q - 1 >= max(min_df, 1):
+            centered = controls - controls.mean(axis=0)
+            gram = centered.T @ centered
+            beta = np.linalg.lstsq(gram, centered.T @ (values - mean), rcond=None)[0]
+            residuals = values - mean - centered @ beta
+            df = n - q - 1
+            offset = controls.mean(axis=0) - expected
+            variance = residuals @ residuals / df * (1 / n + offset @ np.linalg.pinv(gram) @ offset)
+            mean = float(mean - beta @ offset)
+            std = float(math.sqrt(residuals @ residuals / df))
+            half_width = t_quantile(0.5 + confidence / 2, df) * math.sqrt(variance)
+            used = q
+    return {
+        "n": n,
+        "mean": mean,
+        "std": std,
+        "half_width": half_width,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "controls": used,
+    }
+
+
+def compare_scenarios(baseline, alternative, replications=20, workers=None, base_seed=0, confidence=0.95,
+                      antithetic=False, controls=None):
+    """
+    Compare two configurations with common random numbers.
+
+    Replication r runs both scenarios with the same seed, so each pair sees the
+    same trucks and orders and the paired differences alternative - baseline
+    carry only the noise the configurations do not share.
+
+    Parameters:
+    - baseline: Dict of config overrides of the baseline scenario.
+    - alternative: Dict of config overrides of the alternative scenario.
+    - replications: Number of seeds (paired replications).
+    - workers: Number of worker processes, defaults to all cores.
+    - base_seed: Seed the per-replication seeds are derived from.
+    - confidence: Confidence level of the intervals.
+    - antithetic: Also run every seed with antithetic streams and use the average
+      of the two runs as the observation of that replication.
+    - controls: Control variate names (see input_controls), [] to disable,
+      None for default_controls().
+
+    Returns:
+    - Dict with the scenarios, seeds and per-KPI "baseline", "alternative" and
+      "difference" estimates (see estimate_mean). Each difference also reports
+      "variance_ratio": the variance two independent runs would have over the
+      variance of the paired estimate, i.e. the factor fewer replications needed.
+    """
+    from main import KPIS
+    configs = [{**config, **(baseline or {})}, {**config, **(alternative or {})}]
+    controls = default_controls(configs[0]) if controls is None else list(controls)
+    seeds = replication_seeds(base_seed, replications)
+    mirrors = (False, True) if antithetic else (False,)
+    runs = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(run_stream_replication, configs[scenario], seed, mirror): (scenario, r, mirror)
+                   for scenario in (0, 1) for r, seed in enumerate(seeds) for mirror in mirrors}
+        for future in as_completed(futures):
+            runs[futures[future]] = future.result()
+
+    # One observation per replication: the average over its antithetic runs
+    observed = np.full((2, replications, len(KPIS)), np.nan)
+    realized = np.empty((replications, len(controls)))
+    expected = np.empty(len(controls))
+    for r in range(replications):
+        for scenario in (0, 1):
+            values = [[np.nan if runs[scenario, r, mirror][0].get(key) is None else runs[scenario, r, mirror][0][key]
+                       for key in KPIS] for mirror in mirrors]
+            observed[scenario, r] = np.mean(values, axis=0)
+        # Both scenarios consume the same inputs, take the controls of the baseline runs
+        for j, name in enumerate(controls):
+            realized[r, j] = np.mean([runs[0, r, mirror][1][name][0] for mirror in mirrors])
+            expected[j] = runs[0, r, mirrors[0]][1][name][1]
+
+    kpis = {}
+    for k, key in enumerate(KPIS):
+        a, b = observed[0, :, k], observed[1, :, k]
+        valid = ~(np.isnan(a) | np.isnan(b)) & ~np.isnan(realized).any(axis=1)
+        if valid.sum() < 2:
+            continue
+        c = realized[valid] if controls else None
+        difference = estimate_mean(b[valid] - a[valid], c, expected, confidence)
+        independent = (a[valid].var(ddof=1) + b[valid].var(ddof=1)) / valid.sum()
+        paired = (difference["half_width"] / t_quantile(0.5 + confidence / 2, max(valid.sum() - 1 - difference["controls"], 1))) ** 2
+        difference["variance_ratio"] = independent / paired if paired > 0 else math.inf
+        kpis[key] = {
+            "baseline": estimate_mean(a[valid], c, expected, confidence),
+            "alternative": estimate_mean(b[valid], c, expected, confidence),
+            "difference": difference,
+        }
+    return {
+        "baseline": baseline or {},
+        "alternative": alternative or {},
+        "replications": replications,
+        "antithetic": antithetic,
+        "controls": controls,
+        "seeds": seeds,
+        "confidence": confidence,
+        "kpis": kpis,
+    }
+
+
+def print_comparison(result):
+    """Print the paired differences (alternative - baseline), one line per KPI."""
+    from main import KPIS
+    level = round(result["confidence"] * 100)
+    runs = result["replications"] * (2 if result["antithetic"] else 1)
+    print(f"\n=== {result['alternative']} vs {result['baseline']}: {runs} paired runs ({level}% CI) ===")
+    for key, (label, unit, missing) in KPIS.items():
+        stats = result["kpis"].get(key)
+        if stats is None:
+            print(missing or f"No {label.lower()} recorded.")
+            continue
+        difference = stats["difference"]
+        significant = "" if difference["ci_low"] <= 0 <= difference["ci_high"] else " *"
+        print(f"{label}: {stats['baseline']['mean']:.2f} -> {stats['alternative']['mean']:.2f}{unit}, "
+              f"difference {difference['mean']:+.2f} "
+              f"(CI [{difference['ci_low']:.2f}, {difference['ci_high']:.2f}], "
+              f"variance reduction x{difference['variance_ratio']:.1f}){significant}")
@@ -1,12 +1,18 @@
+from collections import deque
+
+
 class Dock:
+    __slots__ = ("dock_id", "pallet_storage", "is_occupied", "location")
+
     def __init__(self, dock_id, location):
         """Initialize an unloading/loading dock.
         
         Parameters:
         - dock_id: A unique identifier for the dock.
+        - location: (x, y, z) coordinates of the dock.
         """
         self.dock_id = dock_id
-        self.pallet_storage = []  # Temporary storage area for pallets in the dock
+        self.pallet_storage = deque()  # Temporary storage area for pallets in the dock
         self.is_occupied = False
         self.location = location
     
@@ -14,12 +20,19 @@ class Dock:
         """Store a pallet in the dock's storage area.
         
         Parameters:
-        - pallet: The pallet being 
-        .
+        - pallet: The pallet being unloaded.
         """
         self.pallet_storage.append(pallet)
         pallet.location = self.location
-        #print(f"Pallet {pallet.pallet_id} stored at Dock {self.dock_id}.")
+        #print(f"Pallet {pallet.name} stored at Dock {self.dock_id}.")
+
+    def take_pallet(self):
+        """Remove and return the oldest pallet in the dock's storage area."""
+        return self.pallet_storage.popleft()
+
+    def return_pallet(self, pallet):
+        """Put a pallet back at the front of the dock's storage area."""
+        self.pallet_storage.appendleft(pallet)
     
     def get_all_pallets(self):
         """Retrieve all pallets from the dock's storage area.
@@ -27,8 +40,8 @@ class Dock:
         Returns:
         - List[Pallet]: All pallets in the dock's storage.
         """
-        pallets = self.pallet_storage
-        self.pallet_storage = []  # Clear the storage after retrieval
+        pallets = list(self.pallet_storage)
+        self.pallet_storage.clear()  # Clear the storage after retrieval
         return pallets
     
     def has_pallets(self):
@@ -0,0 +1,231 @@
+"""
+Compact binary event trace of a simulation run, with replay.
+
+Every arrival, resource grant, pallet move and store is written as one
+fixed-size record (see RECORD_DTYPE) through a buffered writer:
+
+    with TraceWriter("run.trace") as writer:
+        run_simulation(seed=1, quiet=True, trace_writer=writer)
+
+or python main.py --trace run.trace. The trace answers questions about the
+run without simulating it again:
+
+    trace = Trace("run.trace")
+    trace.select(order=42)                       # everything that happened to order 42
+    trace.select(start=600, end=660, events=["PALLET_STORE"])
+    trace.state_at(630)                          # queues, docks, storage and orders at t=630
+
+Entity IDs are -1 where they do not apply. Pallet IDs are rows of the pallet
+lifecycle table (see lifecycle.py), so they are unique within a run.
+The same queries are available from the shell:
+
+    python eventtrace.py run.trace --order 42
+    python eventtrace.py run.trace --state-at 630
+"""
+import numpy as np
+
+TRACE_MAGIC = b"WHTRACE1"
+BUFFER_RECORDS = 8192
+
+EVENTS = (
+    "TRUCK_ARRIVAL",          # truck
+    "DOCK_GRANT",             # truck, resource = unloading dock, location = dock
+    "PALLET_UNLOAD",          # truck, pallet, resource = forklift, location = dock
+    "TRUCK_DEPARTURE",        # truck, resource = unloading dock
+    "PUTAWAY_START",          # pallet, resource = forklift, location = dock
+    "PALLET_STORE",           # pallet, resource = forklift, location = storage
+    "INITIAL_STORE",          # pallet, location = storage (pallets in storage at the start)
+    "ORDER_CREATED",          # order
+    "ASSEMBLY_START",         # order, resource = assembly area, location = assembly area
+    "PALLET_PICK",            # order, pallet, resource = forklift, location = storage
+    "ORDER_ASSEMBLED",        # order, resource = assembly area
+    "LOADING_TRUCK_ARRIVAL",  # truck
+    "LOADING_DOCK_GRANT",     # truck, resource = loading dock, location = dock
+    "ORDER_LOADED",           # truck, order, resource = loading dock (the truck leaves)
+)
+EVENT_CODES = {name: code for code, name in enumerate(EVENTS)}
+
+RECORD_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("event", "u1"),
+    ("truck", "<i4"),
+    ("order", "<i4"),
+    ("pallet", "<i8"),
+    ("resource", "<i4"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("z", "<f4"),
+])
+
+
+def _entity(value):
+    """Integer ID of an entity, -1 for None and for non-integer IDs (e.g. network transfer trucks)."""
+    return value if isinstance(value, (int, np.integer)) else -1
+
+
+class TraceWriter:
+    def __init__(self, path, buffer_records=BUFFER_RECORDS):
+        """
+        Buffered writer of trace records.
+
+        Parameters:
+        - path: Trace file, overwritten.
+        - buffer_records: Records kept in memory between two writes.
+        """
+        self.path = path
+        self.buffer = np.zeros(buffer_records, dtype=RECORD_DTYPE)
+        self.size = 0
+        self.written = 0
+        self.file = open(path, "wb")
+        self.file.write(TRACE_MAGIC)
+
+    def record(self, time, event, truck=None, order=None, pallet=None, resource=None, location=None):
+        """Append one record; `event` is a name from EVENTS, `location` an (x, y, z) tuple."""
+        x, y, z = location if location is not None else (np.nan, np.nan, np.nan)
+        self.buffer[self.size] = (time, EVENT_CODES[event], _entity(truck), _entity(order), _entity(pallet),
+                                  _entity(resource), x, y, z)
+        self.size += 1
+        if self.size == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer[:self.size].tobytes())
+        self.written += self.size
+        self.size = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class Trace:
+    def __init__(self, path):
+        """
+        Read-only view of a trace file, memory-mapped.
+
+        Attributes:
+        - records: Structured array of RECORD_DTYPE in time order.
+        """
+        with open(path, "rb") as f:
+            if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+                raise ValueError(f"{path} is not a simulation trace.")
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=len(TRACE_MAGIC))
+
+    def __len__(self):
+        return len(self.records)
+
+    def select(self, truck=None, order=None, pallet=None, resource=None, events=None, start=None, end=None):
+        """
+        Records matching every given filter.
+
+        Parameters:
+        - truck, order, pallet, resource: Entity IDs.
+        - events: Iterable of event names.
+        - start, end: Time window, both inclusive.
+
+        Returns:
+        - Structured array of the matching records.
+        """
+        records = self.records
+        if start is not None or end is not None:
+            times = records["time"]
+            low = 0 if start is None else np.searchsorted(times, start, side="left")
+            high = len(records) if end is None else np.searchsorted(times, end, side="right")
+            records = records[low:high]
+        mask = np.ones(len(records), dtype=bool)
+        for field, value in (("truck", truck), ("order", order), ("pallet", pallet), ("resource", resource)):
+            if value is not None:
+                mask &= records[field] == value
+        if events is not None:
+            mask &= np.isin(records["event"], [EVENT_CODES[name] for name in events])
+        return np.asarray(records[mask])
+
+    def _entered(self, records, enter, leave, field):
+        """IDs in `field` that had an `enter` event and no `leave` event yet."""
+        codes = records["event"]
+        entered = records[field][codes == EVENT_CODES[enter]]
+        left = records[field][codes == EVENT_CODES[leave]]
+        return np.setdiff1d(entered, left)
+
+    def state_at(self, time):
+        """
+        Rebuild the warehouse state at `time` from the records up to it.
+
+        Returns:
+        - Dict of sorted ID arrays:
+          "trucks_waiting" (arrived, no unloading dock yet), "trucks_unloading",
+          "pallets_at_docks" (unloaded, not picked up by a forklift), "pallets_moving"
+          (on a forklift to storage), "pallets_in_storage" (stored or initial, not picked),
+          "orders_waiting" (created, not assembling), "orders_assembling",
+          "orders_ready" (assembled, not loaded), "loading_trucks_waiting" (no loading
+          dock yet), "loading_trucks_docked"; and "storage_locations", a dict of
+          pallet ID -> (x, y, z) for the pallets in storage.
+        """
+        records = self.records[:np.searchsorted(self.records["time"], time, side="right")]
+        codes = records["event"]
+        stored = np.concatenate([records["pallet"][codes == EVENT_CODES["PALLET_STORE"]],
+                                 records["pallet"][codes == EVENT_CODES["INITIAL_STORE"]]])
+        picked = records["pallet"][codes == EVENT_CODES["PALLET_PICK"]]
+        in_storage = np.setdiff1d(stored, picked)
+        placed = records[np.isin(codes, [EVENT_CODES["PALLET_STORE"], EVENT_CODES["INITIAL_STORE"]])]
+        placed = placed[np.isin(placed["pallet"], in_storage)]
+        return {
+            "trucks_waiting": self._entered(records, "TRUCK_ARRIVAL", "DOCK_GRANT", "truck"),
+            "trucks_unloading": self._entered(records, "DOCK_GRANT", "TRUCK_DEPARTURE", "truck"),
+            "pallets_at_docks": self._entered(records, "PALLET_UNLOAD", "PUTAWAY_START", "pallet"),
+            "pallets_moving": self._entered(records, "PUTAWAY_START", "PALLET_STORE", "pallet"),
+            "pallets_in_storage": in_storage,
+            "orders_waiting": self._entered(records, "ORDER_CREATED", "ASSEMBLY_START", "order"),
+            "orders_assembling": self._entered(records, "ASSEMBLY_START", "ORDER_ASSEMBLED", "order"),
+            "orders_ready": self._entered(records, "ORDER_ASSEMBLED", "ORDER_LOADED", "order"),
+            "loading_trucks_waiting": self._entered(records, "LOADING_TRUCK_ARRIVAL", "LOADING_DOCK_GRANT", "truck"),
+            "loading_trucks_docked": self._entered(records, "LOADING_DOCK_GRANT", "ORDER_LOADED", "truck"),
+            "storage_locations": {int(row["pallet"]): (float(row["x"]), float(row["y"]), float(row["z"]))
+                                  for row in placed},
+        }
+
+
+def print_records(records):
+    """Print records one per line, in the style of the simulation's event log."""
+    for record in records:
+        fields = [f"{name} {record[name]}" for name in ("truck", "order", "pallet", "resource") if record[name] >= 0]
+        if not np.isnan(record["x"]):
+            fields.append(f"at ({record['x']:g}, {record['y']:g}, {record['z']:g})")
+        print(f"[{round(float(record['time']), 2)}] {EVENTS[record['event']]}: {', '.join(fields)}")
+
+
+def cli(argv=None):
+    """Query a trace file, see python eventtrace.py --help."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Query a simulation event trace without re-running the simulation.")
+    parser.add_argument("path", help="Trace file written with main.py --trace")
+    for field in ("truck", "order", "pallet", "resource"):
+        parser.add_argument(f"--{field}", type=int, help=f"Only records of this {field} ID")
+    parser.add_argument("--events", nargs="+", choices=EVENTS, help="Only these event types")
+    parser.add_argument("--start", type=float, help="Start of the time window")
+    parser.add_argument("--end", type=float, help="End of the time window")
+    parser.add_argument("--state-at", type=float, metavar="TIME", help="Print the rebuilt state at TIME instead")
+    args = parser.parse_args(argv)
+    trace = Trace(args.path)
+    if args.state_at is not None:
+        state = trace.state_at(args.state_at)
+        print(f"=== State at {args.state_at} ===")
+        for name, value in state.items():
+            if name == "storage_locations":
+                continue
+            shown = ", ".join(str(entity) for entity in value[:20]) + (" ..." if len(value) > 20 else "")
+            print(f"{name} ({len(value)}): {shown}")
+        return
+    print_records(trace.select(args.truck, args.order, args.pallet, args.resource, args.events, args.start, args.end))
+
+
+if __name__ == "__main__":
+    cli()
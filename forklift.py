@@ -1,3 +1,12 @@
+from collections import deque
+
+import numpy as np
+import simpy
+
+# Forklift tasks by request priority (1 = highest)
+TASKS = ("load", "assemble", "putaway", "unload")
+
+
 class Forklift:
     def __init__(self, env, forklift_id, speed_xy, speed_z):
         self.env = env
@@ -8,3 +17,126 @@ class Forklift:
 
     def __str__(self):
         return f"Forklift-{self.id} (Speed XY: {self.speed_xy}, Speed Z: {self.speed_z})"
+
+
+class ForkliftFleet(simpy.PriorityResource):
+    def __init__(self, env, capacity, speed_xy=1, speed_z=1):
+        """
+        Forklift resource that binds every granted request to a specific Forklift.
+
+        Requests queue exactly like a PriorityResource. On grant the forklift idle
+        the longest is assigned to the request (request.unit is its index) and
+        released with the request. Telemetry per forklift is accumulated in
+        preallocated arrays, nothing is allocated per grant:
+        - busy: minutes held per task (see TASKS, indexed by priority - 1),
+        - tasks: number of grants per task,
+        - loaded_distance / empty_distance: travel reported with travel(),
+        - idle_time, idle_gaps, longest_idle: gaps between two grants.
+
+        Parameters:
+        - env: The simulation environment.
+        - capacity: Number of forklifts.
+        - speed_xy, speed_z: Speeds of the Forklift units.
+        """
+        super().__init__(env, capacity=capacity)
+        self.units = [Forklift(env, i, speed_xy, speed_z) for i in range(capacity)]
+        self._free = deque(range(capacity))
+        self._since = np.zeros(capacity)  # Start of the current busy or idle period
+        self._task = np.zeros(capacity, dtype=np.int64)
+        self.reset(env.now)
+
+    def reset(self, now):
+        """Zero the telemetry, e.g. at the end of the warmup; periods in progress count from `now`."""
+        capacity = len(self.units)
+        self.start = now
+        self.busy = np.zeros((capacity, len(TASKS)))
+        self.tasks = np.zeros((capacity, len(TASKS)), dtype=np.int64)
+        self.loaded_distance = np.zeros(capacity)
+        self.empty_distance = np.zeros(capacity)
+        self.idle_time = np.zeros(capacity)
+        self.idle_gaps = np.zeros(capacity, dtype=np.int64)
+        self.longest_idle = np.zeros(capacity)
+        self._since[:] = now
+
+    def _do_put(self, event):
+        super()._do_put(event)
+        if event.triggered:
+            unit = self._free.popleft()
+            now = self._env.now
+            gap = now - self._since[unit]
+            self.idle_time[unit] += gap
+            self.idle_gaps[unit] += 1
+            if gap > self.longest_idle[unit]:
+                self.longest_idle[unit] = gap
+            self._since[unit] = now
+            self._task[unit] = min(event.priority, len(TASKS)) - 1
+            self.units[unit].available = False
+            event.unit = unit
+
+    def _do_get(self, event):
+        unit = getattr(event.request, "unit", None)
+        if unit is not None:
+            event.request.unit = None
+            now = self._env.now
+            task = self._task[unit]
+            self.busy[unit, task] += now - self._since[unit]
+            self.tasks[unit, task] += 1
+            self._since[unit] = now
+            self.units[unit].available = True
+            self._free.append(unit)
+        super()._do_get(event)
+
+    def travel(self, request, loaded, empty=0.0):
+        """Add the distance driven with and without a pallet by the forklift holding `request`."""
+        self.loaded_distance[request.unit] += loaded
+        self.empty_distance[request.unit] += empty
+
+    def summary(self, now=None):
+        """
+        Telemetry per forklift up to `now` (defaults to the current time).
+
+        Returns:
+        - Dict of arrays indexed by forklift ID: "busy" (minutes, [forklift, task]),
+          "tasks" ([forklift, task]), "utilization" (% of the time since the last reset),
+          "loaded_distance", "empty_distance", "idle_time", "idle_gaps", "longest_idle",
+          plus "task_names", "elapsed" and "imbalance" (highest / mean utilization).
+        """
+        now = self._env.now if now is None else now
+        elapsed = now - self.start
+        busy = self.busy.copy()
+        idle_time = self.idle_time.copy()
+        longest_idle = self.longest_idle.copy()
+        # Close the periods still in progress
+        open_period = now - self._since
+        for unit, forklift in enumerate(self.units):
+            if forklift.available:
+                idle_time[unit] += open_period[unit]
+                longest_idle[unit] = max(longest_idle[unit], open_period[unit])
+            else:
+                busy[unit, self._task[unit]] += open_period[unit]
+        utilization = busy.sum(axis=1) / elapsed * 100 if elapsed > 0 else np.full(len(self.units), np.nan)
+        mean_utilization = utilization.mean() if len(utilization) else np.nan
+        return {
+            "task_names": TASKS,
+            "elapsed": elapsed,
+            "busy": busy,
+            "tasks": self.tasks.copy(),
+            "utilization": utilization,
+            "loaded_distance": self.loaded_distance.copy(),
+            "empty_distance": self.empty_distance.copy(),
+            "idle_time": idle_time,
+            "idle_gaps": self.idle_gaps.copy(),
+            "longest_idle": longest_idle,
+            "imbalance": utilization.max() / mean_utilization if mean_utilization > 0 else np.nan,
+        }
+
+
+def print_fleet(summary):
+    """Print one line of telemetry per forklift."""
+    print(f"\n=== Forklift Telemetry ({round(summary['elapsed'], 2)} minutes, "
+          f"imbalance {summary['imbalance']:.2f}) ===")
+    for unit in range(len(summary["utilization"])):
+        busy = ", ".join(f"{task} {minutes:.1f}" for task, minutes in zip(summary["task_names"], summary["busy"][unit]))
+        print(f"Forklift-{unit}: {summary['utilization'][unit]:.1f}% busy ({busy} min), "
+              f"travel {summary['loaded_distance'][unit]:.0f} loaded / {summary['empty_distance'][unit]:.0f} empty, "
+              f"longest idle {summary['longest_idle'][unit]:.1f} min")
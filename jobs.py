@@ -0,0 +1,331 @@
+"""
+Simulation jobs run in a process pool, identified by job ID.
+
+A JobManager submits a picklable function to a ProcessPoolExecutor and
+keeps the state of every job (queued, running, completed, failed or
+cancelled) so a web server can answer right away and be polled later:
+
+    manager = JobManager(simulate, workers=4)
+    job_id = manager.submit(run_config)
+    manager.status(job_id)   # {"job_id", "status", "submitted", "started", "finished", ...}
+    manager.cancel(job_id)
+
+The function gets a JobControl as its last argument. It reports the start
+of the run with control.start() and lets a running job be cancelled by
+calling control.check() now and then, e.g. with run_in_slices between two
+slices of simulated time. run_in_slices also publishes the progress and
+running KPI estimates after every slice (manager.progress(job_id)) and ends
+the run early, keeping its results so far, once manager.stop(job_id) is
+called.
+
+With a ResultCache (see result_cache.py), runs submitted with a cache key
+complete at once when their result is cached, and share the job of an
+identical run still queued or running.
+"""
+import collections
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+SLICE_MINUTES = 60  # Simulated minutes between two cancellation checks
+MAX_FINISHED_JOBS = 1000  # Finished jobs kept for polling, the oldest are dropped first
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker by JobControl.check once the job was cancelled."""
+
+
+class JobControl:
+    def __init__(self, job_id, shared, progress):
+        """
+        Handle of one job inside the worker, picklable.
+
+        Parameters:
+        - job_id: ID of the job.
+        - shared: Manager dict of job ID -> state shared with the JobManager.
+        - progress: Manager dict of job ID -> latest progress report.
+        """
+        self.job_id = job_id
+        self._shared = shared
+        self._progress = progress
+
+    def start(self):
+        """Mark the job as running, raising JobCancelled if it was cancelled while queued."""
+        # One atomic call on the manager, a cancel can not slip in between the check and the set
+        if self._shared.setdefault(self.job_id, "running") == "cancelled":
+            raise JobCancelled(self.job_id)
+
+    def cancelled(self):
+        return self._shared.get(self.job_id) == "cancelled"
+
+    def stopping(self):
+        """True once the job was asked to stop early and return its results so far."""
+        return self._shared.get(self.job_id) == "stopping"
+
+    def check(self):
+        """Raise JobCancelled if the job was cancelled."""
+        if self.cancelled():
+            raise JobCancelled(self.job_id)
+
+    def report(self, now, until, kpis=None):
+        """Publish the simulated time reached out of `until` and optional running KPI estimates."""
+        self._progress[self.job_id] = {"simulated_minutes": now, "progress": now / until if until else 1.0,
+                                       "kpis": kpis}
+
+
+def run_in_slices(env, until, control, slice_minutes=SLICE_MINUTES, kpis=None):
+    """
+    Run `env` until `until` in slices of simulated time.
+
+    After every slice `control` is checked for cancellation and receives the
+    progress, with the running estimates returned by `kpis()` if given. The
+    slices only add stop events, so a full run is the same as env.run(until=until).
+
+    Returns:
+    - True if the run reached `until`, False if it was stopped early (see JobManager.stop).
+    """
+    while env.now < until:
+        env.run(until=min(env.now + slice_minutes, until))
+        control.check()
+        control.report(env.now, until, kpis() if kpis is not None else None)
+        if control.stopping():
+            return False
+    return True
+
+
+def default_workers():
+    """Worker count from the SIMULATION_WORKERS environment variable, the number of cores by default."""
+    return int(os.environ.get("SIMULATION_WORKERS") or os.cpu_count() or 1)
+
+
+class Job:
+    __slots__ = ("job_id", "future", "status", "submitted", "started", "finished", "result", "error", "progress",
+                 "key", "cached", "function", "subscribers")
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.future = None
+        self.status = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.progress = None
+        self.key = None
+        self.cached = False
+        self.function = None
+        self.subscribers = 1  # Submissions sharing the job through its cache key
+
+
+class JobManager:
+    def __init__(self, function, workers=None, service_metrics=None, cache=None):
+        """
+        Parameters:
+        - function: Top-level function run in the pool as function(*args, control).
+        - workers: Size of the process pool, see default_workers.
+        - service_metrics: Optional ServiceMetrics (see service_metrics.py) counting the jobs
+          and cache lookups; the function's result is timed when it is a dict with
+          "wall_time" and "simulated_minutes".
+        - cache: Optional ResultCache storing the results of completed jobs submitted with a
+          key, except results flagged "stopped_early".
+        """
+        self.function = function
+        self.workers = workers or default_workers()
+        self.service_metrics = service_metrics
+        self.cache = cache
+        self.jobs = collections.OrderedDict()  # Job ID -> Job, in submission order
+        self._inflight = {}  # Cache key -> ID of the queued or running job computing it
+        self._lock = threading.Lock()
+        self._pool = None
+        self._manager = None
+        self._shared = None
+        self._progress = None
+
+    def _start(self):
+        # Processes are only started by the first submission, not on import
+        if self._pool is None:
+            self._manager = multiprocessing.Manager()
+            self._shared = self._manager.dict()
+            self._progress = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, *args, key=None, function=None):
+        """
+        Queue one run of the function.
+
+        Parameters:
+        - args: Arguments of the function, the JobControl is added after them.
+        - key: Optional cache key of the run (see result_cache.cache_key), only for runs that
+          are reproducible (seeded). A cached result completes the job at once; while a job
+          with the same key is queued or running, its ID is returned instead of starting
+          another run.
+        - function: Top-level function run instead of the manager's for this job, same calling convention.
+
+        Returns:
+        - The job ID (str).
+        """
+        with self._lock:
+            if key is not None:
+                job_id = self._inflight.get(key)
+                cached = None if job_id is not None or self.cache is None else self.cache.get(key)
+                if self.service_metrics is not None:
+                    self.service_metrics.cache_lookup(job_id is not None or cached is not None)
+                if job_id is not None:
+                    self.jobs[job_id].subscribers += 1
+                    return job_id
+                if cached is not None:
+                    job = self._add(Job(uuid.uuid4().hex))
+                    job.status = "completed"
+                    job.function = function or self.function
+                    job.started = job.finished = job.submitted
+                    job.result = cached
+                    job.key = key
+                    job.cached = True
+                    return job.job_id
+            self._start()
+            job = self._add(Job(uuid.uuid4().hex))
+            job.function = function or self.function
+            if key is not None:
+                job.key = key
+                self._inflight[key] = job.job_id
+            if self.service_metrics is not None:
+                self.service_metrics.job_queued()
+            job.future = self._pool.submit(job.function, *args, JobControl(job.job_id, self._shared, self._progress))
+        job.future.add_done_callback(lambda future: self._finish(job))
+        return job.job_id
+
+    def _add(self, job):
+        self.jobs[job.job_id] = job
+        self._prune()
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job_id]
+
+    def _refresh(self, job):
+        # Called with the lock held
+        if job.status == "queued" and self._shared.get(job.job_id) in ("running", "stopping"):
+            job.status = "running"
+            job.started = time.time()
+            if self.service_metrics is not None:
+                self.service_metrics.job_started()
+        if job.status == "running":
+            job.progress = self._progress.get(job.job_id, job.progress)
+
+    def _finish(self, job):
+        with self._lock:
+            self._refresh(job)
+            was_running = job.status == "running"
+            job.finished = time.time()
+            try:
+                job.result = job.future.result()
+                job.status = "completed"
+            except (CancelledError, JobCancelled):
+                job.status = "cancelled"
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+            self._shared.pop(job.job_id, None)
+            self._progress.pop(job.job_id, None)
+            if job.key is not None and self._inflight.get(job.key) == job.job_id:
+                del self._inflight[job.key]
+                if (job.status == "completed" and self.cache is not None
+                        and not (isinstance(job.result, dict) and job.result.get("stopped_early"))):
+                    self.cache.put(job.key, job.result)
+            if self.service_metrics is not None:
+                timing = job.result if isinstance(job.result, dict) else {}
+                self.service_metrics.job_finished(timing.get("simulated_minutes"), timing.get("wall_time"),
+                                                  job.status, "running" if was_running else "queued")
+
+    def refresh(self):
+        """Move the jobs a worker has started from queued to running."""
+        with self._lock:
+            for job in self.jobs.values():
+                self._refresh(job)
+
+    def status(self, job_id):
+        """
+        Returns:
+        - Dict with "job_id", "status", "submitted", "started" and "finished" (epoch seconds),
+          "progress" (latest report of run_in_slices: "simulated_minutes", "progress" as a
+          fraction and "kpis"), "cached" (answered from the result cache), plus "result"
+          once completed or "error" once failed; None for unknown job IDs.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            self._refresh(job)
+            status = {"job_id": job.job_id, "status": job.status, "submitted": job.submitted,
+                      "started": job.started, "finished": job.finished, "progress": job.progress,
+                      "cached": job.cached}
+            if job.status == "completed":
+                status["result"] = job.result
+            elif job.status == "failed":
+                status["error"] = job.error
+            return status
+
+    def cancel(self, job_id):
+        """
+        Cancel a job; a queued job never starts, a running one stops at its next check.
+        A job shared by several submissions through its cache key keeps running until
+        each of them has cancelled it.
+
+        Returns:
+        - False for unknown or already finished jobs, True otherwise.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            if job.subscribers > 1:
+                job.subscribers -= 1
+                return True
+            self._refresh(job)
+            self._shared[job_id] = "cancelled"
+        job.future.cancel()
+        return True
+
+    def stop(self, job_id):
+        """
+        Ask a running job to end at its next slice and return its results so far; a queued job is cancelled.
+
+        Returns:
+        - False for unknown or already finished jobs, True otherwise.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            self._refresh(job)
+            if job.status == "running":
+                self._shared[job_id] = "stopping"
+                return True
+        return self.cancel(job_id)
+
+    def progress(self, job_id):
+        """Latest progress report of a job, None before its first slice or for unknown job IDs."""
+        status = self.status(job_id)
+        return None if status is None else status["progress"]
+
+    def latest(self, status="completed", function=None):
+        """Status of the most recently submitted job in `status` (run with `function` if given), None if there is none."""
+        with self._lock:
+            job_id = next((job.job_id for job in reversed(self.jobs.values())
+                           if job.status == status and (function is None or job.function is function)), None)
+        return None if job_id is None else self.status(job_id)
+
+    def shutdown(self):
+        """Cancel the queued jobs and stop the pool and the manager process."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._manager.shutdown()
+            self._pool = self._manager = self._shared = self._progress = None
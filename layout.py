@@ -0,0 +1,55 @@
+import numpy as np
+from config import config
+from dock import Dock
+from assembly_area import AssemblyArea
+
+# Unloading docks run along the y axis, parallel to the aisles
+UNLOADING_DOCK_X = 2
+UNLOADING_DOCK_START_Y = 5
+UNLOADING_DOCK_WIDTH = 5
+
+# Assembly areas and loading docks face each other along the x axis
+ASSEMBLY_AREA_START_X = 32
+ASSEMBLY_AREA_WIDTH = 6
+ASSEMBLY_AREA_Y = -5
+
+LOADING_DOCK_START_X = 32
+LOADING_DOCK_WIDTH = 6
+LOADING_DOCK_Y = -11
+
+
+def unloading_dock_locations(num_docks):
+    """(x, y, z) coordinates of the unloading docks."""
+    return [(UNLOADING_DOCK_X, round(y, 2), 0)
+            for y in np.arange(UNLOADING_DOCK_START_Y, UNLOADING_DOCK_START_Y + UNLOADING_DOCK_WIDTH * num_docks, UNLOADING_DOCK_WIDTH)]
+
+
+def assembly_area_locations(num_areas):
+    """(x, y, z) coordinates of the assembly areas."""
+    return [(round(x, 2), ASSEMBLY_AREA_Y, 0)
+            for x in np.arange(ASSEMBLY_AREA_START_X, ASSEMBLY_AREA_START_X + ASSEMBLY_AREA_WIDTH * num_areas, ASSEMBLY_AREA_WIDTH)]
+
+
+def loading_dock_locations(num_docks):
+    """(x, y, z) coordinates of the loading docks."""
+    return [(round(x, 2), LOADING_DOCK_Y, 0)
+            for x in np.arange(LOADING_DOCK_START_X, LOADING_DOCK_START_X + LOADING_DOCK_WIDTH * num_docks, LOADING_DOCK_WIDTH)]
+
+
+def build_layout(cfg=config):
+    """
+    Create the docks and assembly areas of the warehouse.
+
+    Parameters:
+    - cfg: Configuration dict, defaults to the global config.
+
+    Returns:
+    - (unloading dock list, assembly area list, loading dock list)
+    """
+    dock_list = [Dock(dock_id, location)
+                 for dock_id, location in enumerate(unloading_dock_locations(cfg["num_unloading_docks"]), start=1)]
+    assembly_area_list = [AssemblyArea(area_id, location, cfg["assembly_area_capacity"])
+                          for area_id, location in enumerate(assembly_area_locations(cfg["num_assembly_area"]), start=1)]
+    loading_dock_list = [Dock(dock_id, location)
+                         for dock_id, location in enumerate(loading_dock_locations(cfg["num_loading_docks"]), start=1)]
+    return dock_list, assembly_area_list, loading_dock_list
@@ -0,0 +1,161 @@
+"""
+Per-pallet lifecycle table.
+
+Every inbound pallet gets a row holding its integer ID, truck, type and the
+time of each step it goes through (the truck is -1 for pallets that were in
+storage at the start and for trucks without an integer ID, e.g. network
+transfers):
+
+    arrival -> unload -> putaway_start -> putaway_end -> pick -> load
+
+Pallets that were in storage at the start only get a row when they are
+picked. Steps a pallet has not reached yet are NaN. Dwell times are computed
+afterwards over whole columns with NumPy:
+
+    ledger = PalletLedger()
+    run_simulation(seed=1, quiet=True, ledger=ledger)
+    ledger.durations("putaway_end", "pick")   # storage dwell per pallet
+    ledger.summary(since=main.warmup_period)  # mean and quantiles per stage
+    ledger.save("pallets.npz")
+
+Recording is opt-in (main.py --pallets PATH), runs without a ledger track no pallet.
+"""
+import math
+
+import numpy as np
+
+EVENTS = ("arrival", "unload", "putaway_start", "putaway_end", "pick", "load")
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+
+# Stage name -> (start event, end event)
+STAGES = {
+    "dock_wait": ("unload", "putaway_start"),
+    "putaway": ("putaway_start", "putaway_end"),
+    "time_in_dock": ("unload", "putaway_end"),
+    "storage_dwell": ("putaway_end", "pick"),
+    "pick_to_load": ("pick", "load"),
+    "inbound": ("arrival", "putaway_end"),
+    "end_to_end": ("arrival", "load"),
+}
+
+# Events also stored on the Pallet object itself
+_PALLET_FIELDS = {"arrival": "created_time", "unload": "unloaded_time", "putaway_end": "stored_time"}
+
+CHUNK_SIZE = 16384  # Rows added whenever the table is full
+
+
+class PalletLedger:
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        """
+        Columnar table of pallet lifecycles, growing in chunks.
+
+        Parameters:
+        - chunk_size: Rows preallocated at a time.
+        """
+        self.chunk_size = chunk_size
+        self.clear()
+
+    def clear(self):
+        """Drop all rows before a new run."""
+        self.size = 0
+        self.type_names = []
+        self.type_index = {}
+        self.truck_ids = np.empty(self.chunk_size, dtype=np.int64)
+        self.pallet_types = np.empty(self.chunk_size, dtype=np.int16)
+        self.times = np.empty((len(EVENTS), self.chunk_size), dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = self.size + self.chunk_size
+        self.truck_ids = np.resize(self.truck_ids, capacity)
+        self.pallet_types = np.resize(self.pallet_types, capacity)
+        times = np.empty((len(EVENTS), capacity), dtype=np.float64)
+        times[:, :self.size] = self.times[:, :self.size]
+        self.times = times
+
+    def register(self, pallet, time=None):
+        """
+        Give a pallet its row, stamping its arrival at `time` if given.
+
+        Returns:
+        - The row, which is also the pallet's ID in the table (stored as pallet.row).
+        """
+        if self.size == len(self.truck_ids):
+            self._grow()
+        row = self.size
+        self.size += 1
+        type_index = self.type_index.get(pallet.pallet_type)
+        if type_index is None:
+            type_index = self.type_index[pallet.pallet_type] = len(self.type_names)
+            self.type_names.append(pallet.pallet_type)
+        truck_id = pallet.truck_id
+        self.truck_ids[row] = truck_id if isinstance(truck_id, (int, np.integer)) else -1
+        self.pallet_types[row] = type_index
+        self.times[:, row] = math.nan
+        pallet.row = row
+        if time is not None:
+            self.record(pallet, "arrival", time)
+        return row
+
+    def record(self, pallet, event, time):
+        """Stamp one lifecycle event of a pallet, registering pallets seen for the first time."""
+        if pallet.row is None:
+            self.register(pallet)
+        self.times[EVENT_CODES[event], pallet.row] = time
+        field = _PALLET_FIELDS.get(event)
+        if field is not None:
+            setattr(pallet, field, time)
+
+    def column(self, event):
+        """View of the times of one event, NaN where it has not happened."""
+        return self.times[EVENT_CODES[event], :self.size]
+
+    def durations(self, start, end, since=None):
+        """
+        Time between two events for every pallet that went through both.
+
+        Parameters:
+        - start, end: Event names, see EVENTS.
+        - since: Only pallets whose start event happened after this time (e.g. the warmup).
+
+        Returns:
+        - float array of durations.
+        """
+        begin, finish = self.column(start), self.column(end)
+        done = ~np.isnan(begin) & ~np.isnan(finish)
+        if since is not None:
+            done &= begin > since
+        return finish[done] - begin[done]
+
+    def summary(self, since=None, quantiles=(0.5, 0.95, 0.99)):
+        """
+        Count, mean and quantiles of every stage in STAGES.
+
+        Returns:
+        - Dict of stage -> {"n", "mean", "p50", "p95", "p99"}, None values for stages no pallet completed.
+        """
+        report = {}
+        for stage, (start, end) in STAGES.items():
+            values = self.durations(start, end, since)
+            stats = {"n": len(values), "mean": float(values.mean()) if len(values) else None}
+            for q in quantiles:
+                stats[f"p{round(q * 100):g}"] = float(np.quantile(values, q)) if len(values) else None
+            report[stage] = stats
+        return report
+
+    def to_dict(self):
+        """Dict of column name -> array of the recorded rows."""
+        table = {
+            "pallet_id": np.arange(self.size, dtype=np.int64),
+            "truck_id": self.truck_ids[:self.size],
+            "pallet_type": self.pallet_types[:self.size],
+        }
+        for event in EVENTS:
+            table[event] = self.column(event)
+        return table
+
+    def save(self, path):
+        """Write the table to a compressed .npz file; pallet_type indexes the saved type_names array."""
+        np.savez_compressed(path, type_names=np.array(self.type_names, dtype=str), **self.to_dict())
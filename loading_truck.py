@@ -1,4 +1,6 @@
 class LoadingTruck:
+    __slots__ = ("env", "truck_id", "capacity", "loaded_pallets")
+
     def __init__(self, env, truck_id, capacity):
         self.env = env
         self.truck_id = truck_id
@@ -0,0 +1,379 @@
+"""
+Lockstep vectorized replications of the truck arrival and unloading dock subsystem.
+
+The unloading side of the model is a multi-server queue: trucks arrive on a fixed
+schedule, take the first free dock and hold it while their pallets are unloaded
+and put away. Instead of one simpy environment per replication, N replications
+are advanced together, one truck at a time, with NumPy arrays holding every
+replication's dock release times.
+
+Service times follow truck_arrival: unloading takes t_unload_pallat per pallet,
+then one forklift per pallet takes it to storage and drives back, so the dock is
+released when the farthest pallet of the truck has been stored, or later when
+the last pallet missed the put-away wave (forklift contention is not modelled).
+AdvancedStorage stores first-fit, so the n-th pallet of a type goes to the n-th
+free position of that type's aisles and put-away travel grows as the racks fill.
+Order picking is not modelled either, so with orders running the lockstep dock
+times are an upper bound. python lockstep.py [seed ...] checks the model
+against simpy, see validate_against_simpy.
+"""
+import contextlib
+import os
+import random
+import sys
+from functools import lru_cache
+
+import numpy as np
+import simpy
+
+from config import config
+from arrivals import FixedIntervalSource
+from analytic import T_UNLOAD_PALLET
+from layout import unloading_dock_locations
+from metrics import MetricsRegistry
+from storage import AdvancedStorage
+
+VALIDATION_RTOL = 0.1  # Relative tolerance of validate_against_simpy on mean wait and utilization
+
+
+def arrival_schedule(duration, trucks_per_hour):
+    """Truck arrival times before `duration`, accumulated exactly like the simpy generator."""
+    return np.array([arrival.time for arrival in FixedIntervalSource(60 / trucks_per_hour, until=duration)
+                     if arrival.time < duration])
+
+
+def sample_trucks(rng, replications, num_trucks, cfg=None):
+    """
+    Draw truck capacities and pallet types for every replication at once.
+
+    Returns:
+    - capacities: int array [replication, truck].
+    - pallet_types: int8 array [replication, truck, pallet] of type indices, -1 past the truck capacity.
+    """
+    cfg = config if cfg is None else cfg
+    capacities = rng.integers(cfg["truck_capacity_min"], cfg["truck_capacity_max"] + 1, size=(replications, num_trucks))
+    pallet_types = rng.choice(len(cfg["pallet_types"]), size=(replications, num_trucks, cfg["truck_capacity_max"]),
+                              p=cfg["pallet_probs"]).astype(np.int8)
+    pallet_types[np.arange(cfg["truck_capacity_max"]) >= capacities[..., None]] = -1
+    return capacities, pallet_types
+
+
+@lru_cache(maxsize=8)
+def _free_position_travel(num_aisles, slots_per_aisle, levels_per_slot, pallet_types, speed_xy, speed_z, num_docks,
+                          occupancy):
+    storage = AdvancedStorage(num_aisles=num_aisles, slots_per_aisle=slots_per_aisle, levels_per_slot=levels_per_slot,
+                              pallet_types=list(pallet_types))
+    storage.initial_storage(occupancy)
+    docks = np.array(unloading_dock_locations(num_docks), dtype=float)
+    tables = []
+    for pallet_type in pallet_types:
+        # Free positions in the order assign_storage_location scans them
+        coords = np.array([storage.coordinates[(aisle, slot, level)]
+                           for aisle in storage.aisle_assignment.get(pallet_type, [])
+                           for slot in range(slots_per_aisle)
+                           for level in range(levels_per_slot)
+                           if storage.storage[aisle][slot][level] is None], dtype=float).reshape(-1, 3)
+        if not len(coords):
+            coords = np.zeros((1, 3))
+        xy = np.abs(coords[:, None, 0] - docks[:, 0]) + np.abs(coords[:, None, 1] - docks[:, 1])
+        tables.append(xy / speed_xy + coords[:, None, 2] / speed_z)
+    return tables
+
+
+def putaway_travel(cfg=None, occupancy=None):
+    """
+    One-way forklift travel time from every unloading dock to the free storage positions of each pallet type.
+
+    Parameters:
+    - cfg: Configuration dict, defaults to config.
+    - occupancy: Initial fill of each aisle (see AdvancedStorage.initial_storage), defaults to initial_storage.
+
+    Returns:
+    - List with one float array [position, dock] per pallet type, positions in first-fit order.
+    """
+    cfg = config if cfg is None else cfg
+    return _free_position_travel(
+        int(cfg["storage_aisles"]), int(cfg["storage_slots_per_aisle"]), int(cfg["storage_levels_per_slot"]),
+        tuple(cfg["pallet_types"]), float(cfg["forklift_speed_xy"]), float(cfg["lever_speed_z"]),
+        int(cfg["num_unloading_docks"]), float(cfg["initial_storage"] if occupancy is None else occupancy),
+    )
+
+
+def service_times(capacities, pallet_types, travel):
+    """
+    Dock holding time of every truck at every dock.
+
+    Put-away starts when unloading ends, one forklift per pallet. When the last
+    pallet reaches the dock only after that moment (see unloaded_late), it is left
+    for the first forklift back, so put-away is not fully parallel. Pallets are
+    put away in truck order, each type filling its free positions first-fit; a
+    position past the last free one counts as the last one.
+
+    Parameters:
+    - capacities: int array [replication, truck].
+    - pallet_types: int array [replication, truck, pallet], -1 for empty positions.
+    - travel: One-way travel times per pallet type [position, dock], see putaway_travel.
+
+    Returns:
+    - float array [replication, truck, dock, 2]: dock time when the last pallet is
+      unloaded in time for the put-away, and when it is unloaded late.
+    """
+    one_way = np.zeros(pallet_types.shape + (travel[0].shape[1],))
+    for pallet_type, table in enumerate(travel):
+        present = pallet_types == pallet_type
+        # Position of every pallet among the pallets of its type stored so far
+        per_truck = present.sum(axis=-1)
+        before = np.cumsum(per_truck, axis=-1) - per_truck
+        position = np.minimum(before[..., None] + np.cumsum(present, axis=-1) - 1, len(table) - 1)
+        one_way = np.where(present[..., None], table[position.clip(0)], one_way)
+    unload = capacities[..., None] * T_UNLOAD_PALLET
+    last = (np.arange(pallet_types.shape[-1]) == capacities[..., None] - 1)[..., None]
+    first_wave = (pallet_types >= 0)[..., None] & ~last
+    farthest = np.where(first_wave, one_way, 0.0).max(axis=-2)
+    quickest = np.where(first_wave, one_way, np.inf).min(axis=-2)
+    # A truck of one pallet leaves a late pallet on the dock, no forklift comes back for it
+    last_trip = np.where(np.isfinite(quickest), quickest + np.where(last, one_way, 0.0).sum(axis=-2), 0.0)
+    in_time = unload + 2 * np.maximum(farthest, np.where(last, one_way, 0.0).max(axis=-2))
+    return np.stack((in_time, unload + 2 * np.maximum(farthest, last_trip)), axis=-1)
+
+
+def unloaded_late(starts, capacities):
+    """
+    True where the last pallet reaches the dock after the put-away forklifts are started.
+
+    truck_arrival waits capacity * t_unload_pallat in one timeout while the
+    unloading forklift adds t_unload_pallat once per pallet, so whether the last
+    pallet makes it depends on the rounding of the two sums (on a tie the truck's
+    timeout fires first).
+    """
+    unloaded = np.array(starts, dtype=float)
+    for k in range(int(capacities.max(initial=0))):
+        unloaded = np.where(k < capacities, unloaded + T_UNLOAD_PALLET, unloaded)
+    return unloaded >= starts + capacities * T_UNLOAD_PALLET
+
+
+def advance_docks(arrival_times, service, num_docks, capacities=None):
+    """
+    Advance all replications through the FIFO dock queue in lockstep.
+
+    Each truck takes the lowest numbered idle dock, or waits for the dock that
+    frees up first, matching truck_arrival in main.py.
+
+    Parameters:
+    - arrival_times: float array [truck] or [replication, truck], sorted per replication.
+    - service: float array [replication, truck, dock], or [replication, truck, dock, 2]
+      from service_times, picked per truck with unloaded_late.
+    - num_docks: Number of unloading docks.
+    - capacities: int array [replication, truck], required with the two-case service.
+
+    Returns:
+    - (start times, end times, dock indices) arrays of shape [replication, truck].
+    """
+    replications, num_trucks = service.shape[:2]
+    arrivals = np.broadcast_to(arrival_times, (replications, num_trucks))
+    rows = np.arange(replications)
+    free_at = np.zeros((replications, num_docks))
+    starts = np.empty((replications, num_trucks))
+    ends = np.empty((replications, num_trucks))
+    docks = np.empty((replications, num_trucks), dtype=np.int64)
+    for k in range(num_trucks):
+        arrival = arrivals[:, k]
+        idle = free_at <= arrival[:, None]
+        dock = np.where(idle.any(axis=1), idle.argmax(axis=1), free_at.argmin(axis=1))
+        start = np.maximum(arrival, free_at[rows, dock])
+        duration = service[rows, k, dock]
+        if service.ndim == 4:
+            duration = duration[rows, unloaded_late(start, capacities[:, k]).astype(np.int64)]
+        end = start + duration
+        free_at[rows, dock] = end
+        starts[:, k] = start
+        ends[:, k] = end
+        docks[:, k] = dock
+    return starts, ends, docks
+
+
+def summarize_docks(arrival_times, starts, ends, num_docks, duration, warmup):
+    """
+    Dock KPIs measured the way main.py measures them.
+
+    Waits count for trucks granted a dock after the warmup, utilization counts the
+    full dock time of trucks that left before the end of the run.
+
+    Returns:
+    - Dict with truck_waits [replication, truck] (NaN where not recorded),
+      mean_truck_wait and unloading_dock_utilization (percent) per replication.
+    """
+    waits = starts - arrival_times
+    recorded = (starts > warmup) & (starts < duration)
+    truck_waits = np.where(recorded, waits, np.nan)
+    counts = recorded.sum(axis=1)
+    mean_wait = np.divide(np.where(recorded, waits, 0.0).sum(axis=1), counts,
+                          out=np.full(counts.shape, np.nan), where=counts > 0)
+    busy = np.where(ends < duration, ends - starts, 0.0).sum(axis=1)
+    return {
+        "truck_waits": truck_waits,
+        "mean_truck_wait": mean_wait,
+        "unloading_dock_utilization": busy / (duration * num_docks) * 100,
+    }
+
+
+def simulate_unloading_docks(replications, seed=None, cfg=None, duration=None, warmup=None, occupancy=None):
+    """
+    Run N replications of the dock-and-truck subsystem together.
+
+    Parameters:
+    - replications: Number of independent replications.
+    - seed: Seed for numpy's default_rng.
+    - cfg: Configuration dict, defaults to config.
+    - duration: Run length in minutes, defaults to simulation_duration_minutes.
+    - warmup: Warmup in minutes, defaults to main.warmup_period.
+    - occupancy: Initial fill of each aisle, defaults to initial_storage (see putaway_travel).
+
+    Returns:
+    - Dict of per-replication arrays, see summarize_docks.
+    """
+    from main import warmup_period
+    cfg = config if cfg is None else cfg
+    duration = cfg["simulation_duration_minutes"] if duration is None else duration
+    warmup = warmup_period if warmup is None else warmup
+    arrival_times = arrival_schedule(duration, cfg["unloading_trucks_per_hour"])
+    capacities, pallet_types = sample_trucks(np.random.default_rng(seed), replications, len(arrival_times), cfg)
+    service = service_times(capacities, pallet_types, putaway_travel(cfg, occupancy))
+    starts, ends, _ = advance_docks(arrival_times, service, cfg["num_unloading_docks"], capacities)
+    return summarize_docks(arrival_times, starts, ends, cfg["num_unloading_docks"], duration, warmup)
+
+
+def _legacy_trucks(seed, num_trucks, cfg):
+    """Replay the draws truck_arrival makes from the global RNGs after seeding them with seed."""
+    py_rng = random.Random(seed)
+    np_rng = np.random.RandomState(seed)
+    capacities = np.empty((1, num_trucks), dtype=np.int64)
+    pallet_types = np.full((1, num_trucks, cfg["truck_capacity_max"]), -1, dtype=np.int8)
+    type_index = {pallet_type: i for i, pallet_type in enumerate(cfg["pallet_types"])}
+    for k in range(num_trucks):
+        capacity = py_rng.randint(cfg["truck_capacity_min"], cfg["truck_capacity_max"])
+        drawn = np_rng.choice(cfg["pallet_types"], capacity, p=cfg["pallet_probs"])
+        capacities[0, k] = capacity
+        pallet_types[0, k, :capacity] = [type_index[pallet_type] for pallet_type in drawn]
+    return capacities, pallet_types
+
+
+def _timed_truck_arrival(env, resource_handler, dock_list, truck_id, sojourns):
+    """Run main.truck_arrival and record how long the truck stayed."""
+    import main
+    arrival = env.now
+    yield env.process(main.truck_arrival(env, resource_handler, resource_handler.unloading_docks, dock_list, truck_id))
+    sojourns[truck_id - 1] = env.now - arrival
+
+
+class _WaitRecorder(MetricsRegistry):
+    def __init__(self):
+        """Registry that also keeps the unloading waits in the order they are observed."""
+        super().__init__()
+        self.waits = []
+
+    def observe(self, name, value):
+        super().observe(name, value)
+        if name == "truck_unloading_mean_waiting_time":
+            self.waits.append(value)
+
+
+def validate_against_simpy(seeds, duration=480, forklifts=None, rtol=VALIDATION_RTOL):
+    """
+    Validate the lockstep mode against the simpy truck_arrival process on the same seeds.
+
+    Both sides see identical trucks: the lockstep inputs are drawn from the same
+    streams truck_arrival consumes after seeding random and numpy.random. The
+    simpy run only starts truck arrivals (no orders pick from storage, so the
+    default duration is kept short enough for the racks not to fill up).
+
+    A seed passes when the lockstep mean truck wait and unloading dock
+    utilization are both within `rtol` of the simpy ones.
+
+    Parameters:
+    - seeds: Iterable of integer seeds.
+    - duration: Run length in minutes.
+    - forklifts: Forklift count for the simpy runs, defaults to one per pallet on every dock.
+    - rtol: Relative tolerance on both KPIs.
+
+    Returns:
+    - List of dicts, one per seed, with the KPIs of both sides, their relative errors and "passed".
+    """
+    import main
+    from layout import build_layout
+    from resource_handler import ResourceHandler
+
+    num_docks = config["num_unloading_docks"]
+    forklifts = num_docks * config["truck_capacity_max"] if forklifts is None else forklifts
+    arrival_times = arrival_schedule(duration, config["unloading_trucks_per_hour"])
+    travel = putaway_travel(config)
+    rows = []
+    for seed in seeds:
+        capacities, pallet_types = _legacy_trucks(seed, len(arrival_times), config)
+        starts, ends, _ = advance_docks(arrival_times, service_times(capacities, pallet_types, travel), num_docks,
+                                        capacities)
+        lockstep = summarize_docks(arrival_times, starts, ends, num_docks, duration, main.warmup_period)
+
+        random.seed(seed)
+        np.random.seed(seed)
+        env = simpy.Environment()
+        dock_list, _, _ = build_layout()
+        resource_handler = ResourceHandler(
+            env,
+            num_forklifts=forklifts,
+            num_unloading_docks=num_docks,
+            num_loading_docks=config["num_loading_docks"],
+            num_assembly_areas=config["num_assembly_area"],
+        )
+        sojourns = np.full(len(arrival_times), np.inf)
+
+        def arrivals():
+            for truck_id, arrival_time in enumerate(arrival_times, start=1):
+                yield env.timeout(arrival_time - env.now)
+                env.process(_timed_truck_arrival(env, resource_handler, dock_list, truck_id, sojourns))
+
+        env.process(arrivals())
+        # Keep every wait in grant order, FIFO docks grant trucks in arrival order so wait i belongs to truck i
+        registry = main.metrics
+        main.metrics = recorder = _WaitRecorder()
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                env.run(until=duration)
+        finally:
+            main.metrics = registry
+        simpy_waits = np.array(recorder.waits)
+        granted = len(simpy_waits)
+        recorded = (arrival_times[:granted] + simpy_waits > main.warmup_period)
+
+        row = {
+            "seed": seed,
+            "lockstep_mean_truck_wait": float(lockstep["mean_truck_wait"][0]),
+            "simpy_mean_truck_wait": float(np.mean(simpy_waits[recorded])) if recorded.any() else float("nan"),
+            "lockstep_unloading_dock_utilization": float(lockstep["unloading_dock_utilization"][0]),
+            "simpy_unloading_dock_utilization": resource_handler.get_unloading_dock_utilization(duration),
+        }
+        for kpi in ("mean_truck_wait", "unloading_dock_utilization"):
+            reference = row[f"simpy_{kpi}"]
+            row[f"{kpi}_error"] = abs(row[f"lockstep_{kpi}"] - reference) / abs(reference) if reference else float("nan")
+        # NaN errors (nothing recorded) fail
+        row["passed"] = bool(row["mean_truck_wait_error"] <= rtol and row["unloading_dock_utilization_error"] <= rtol)
+        rows.append(row)
+    return rows
+
+
+def print_validation(rows, rtol=VALIDATION_RTOL):
+    """Print one pass/fail line per seed of validate_against_simpy and return True if every seed passed."""
+    for row in rows:
+        print(f"Seed {row['seed']}: {'PASS' if row['passed'] else 'FAIL'} "
+              f"(mean truck wait {row['lockstep_mean_truck_wait']:.2f} vs {row['simpy_mean_truck_wait']:.2f}, "
+              f"dock utilization {row['lockstep_unloading_dock_utilization']:.2f}% "
+              f"vs {row['simpy_unloading_dock_utilization']:.2f}%, tolerance {rtol:.0%})")
+    passed = all(row["passed"] for row in rows)
+    print(f"Lockstep validation {'passed' if passed else 'failed'} on {len(rows)} seeds.")
+    return passed
+
+
+if __name__ == "__main__":
+    # python lockstep.py [seed ...]
+    validation_seeds = [int(seed) for seed in sys.argv[1:]] or [1, 2, 3, 4, 5]
+    sys.exit(0 if print_validation(validate_against_simpy(validation_seeds)) else 1)
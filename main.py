@@ -1,37 +1,84 @@
+import argparse
+import contextlib
+import csv
+import json
 import simpy
 import random
 from config import config
 from truck import UnloadingTruck
-from dock import Dock
 from resource_handler import ResourceHandler
 from order import Order
-from assembly_area import AssemblyArea
+from layout import build_layout
 import numpy as np 
 from loading_truck import LoadingTruck
+from arrivals import FixedIntervalSource
+from metrics import MetricsRegistry
+from lifecycle import PalletLedger
 
 np.set_printoptions(legacy='1.25')
-truck_unloading_times = []
-truck_loading_times = []
-order_assembling_waiting_times = []
-order_assembling_times = []
-order_loading_mean_waiting_times = []
-mean_pallet_put_times = []
-mean_pallet_pickup_times = []
+metrics = MetricsRegistry()  # KPI accumulators of the current run, reset at the end of the warmup
+pallet_ledger = None  # Optional PalletLedger (see lifecycle.py) recording every pallet of the current run, including the warmup
 t_unload_pallat = 0.1 #minutes
 t_check_inventory = 1 #minutes
 t_order_assembly = 0.15 #minutes
 warmup_period = 120 #minutes
-usage_log = []  # Store usage data
 MONITOR_INTERVAL = 0.1 #minutes
-
-def truck_arrival(env, resource_handler, unloading_docks, dock_list, truck_id):
+RECORD_INTERVAL = 1 #minutes, sampling interval of the optional state time series
+verbose = True  # Print every simulation event
+departure_listeners = []  # Callables (env, truck, order) notified when a loaded truck leaves
+forklift_fleet = None  # ForkliftFleet of the current run, holds the per-forklift telemetry
+tracer = None  # Optional TraceWriter (see eventtrace.py) receiving every event of the current run
+
+# KPI key (as in config.py METRICS) -> (printed label, unit, message when nothing was recorded)
+KPIS = {
+    "unloading_docks_utilization": ("Unloading Dock Utilization", "%", None),
+    "storage_utilization": ("Storage Utilization", "%", None),
+    "loading_docks_utilization": ("Loading Dock Utilization", "%", None),
+    "forklift_utilization": ("Average Forklift Utilization", "%", None),
+    "truck_unloading_mean_time": ("Truck Unloading Mean Time", " minutes", "No truck unloading times recorded."),
+    "truck_unloading_mean_waiting_time": ("Truck Unloading Mean Waiting Time", " minutes", "No truck unloading waiting times recorded."),
+    "truck_loading_mean_time": ("Truck Loading Mean Time", " minutes", "No truck loading times recorded."),
+    "order_loading_mean_waiting_time": ("Order Loading waiting Mean Time", " minutes", "No truck loading times recorded."),
+    "order_assembling_mean_waiting_time": ("Order Assembling Mean Waiting Time", " minutes", "No order assembling waiting times recorded."),
+    "order_assembling_mean_time": ("Order Assembling Mean Time", " minutes", "No order assembling times recorded."),
+    "mean_pallet_time": ("Mean Pallet Put Time", " minutes", "No pallet times recorded."),
+    "mean_pallet_pickup_time": ("Mean Pallet Pickup Time", " minutes", "No pallet pickup times recorded."),
+}
+
+# KPIs reduced from per-entity observations in metrics, recorded under the KPI key
+SAMPLED_KPIS = (
+    "truck_unloading_mean_time",
+    "truck_unloading_mean_waiting_time",
+    "truck_loading_mean_time",
+    "order_loading_mean_waiting_time",
+    "order_assembling_mean_waiting_time",
+    "order_assembling_mean_time",
+    "mean_pallet_time",
+    "mean_pallet_pickup_time",
+)
+
+def log(message):
+    """Print a simulation event unless verbose output is turned off."""
+    if verbose:
+        print(message)
+
+def truck_arrival(env, resource_handler, unloading_docks, dock_list, truck_id, capacity=None, pallet_types=None):
     """Simulate the arrival and unloading process of a truck."""
-    truck = UnloadingTruck(env, truck_id, random.randint(config["truck_capacity_min"], config["truck_capacity_max"]))
-    print(f"[{round(env.now,2)}] Truck {truck_id} arrived with {truck.capacity} pallets.")
+    if capacity is None:
+        capacity = len(pallet_types) if pallet_types is not None else random.randint(config["truck_capacity_min"], config["truck_capacity_max"])
+    truck = UnloadingTruck(env, truck_id, capacity, pallet_types)
+    arrival_time = env.now
+    if pallet_ledger is not None:
+        for pallet in truck.pallets:
+            pallet_ledger.register(pallet, arrival_time)
+    if tracer is not None:
+        tracer.record(env.now, "TRUCK_ARRIVAL", truck=truck_id)
+    log(f"[{round(env.now,2)}] Truck {truck_id} arrived with {truck.capacity} pallets.")
 
     # Request an unloading dock
     with unloading_docks.request() as dock_request:
         yield dock_request
+        metrics.observe("truck_unloading_mean_waiting_time", env.now - arrival_time)
         
         # Find the first available dock
         available_dock = next((dock for dock in dock_list if not dock.is_occupied), None)
@@ -39,7 +86,9 @@ def truck_arrival(env, resource_handler, unloading_docks, dock_list, truck_id):
             raise RuntimeError("No available dock despite dock request being granted.")
 
         available_dock.is_occupied = True  # Mark the dock as occupied
-        print(f"[{round(env.now,2)}] Truck {truck_id} assigned to Dock {available_dock.dock_id}.")
+        log(f"[{round(env.now,2)}] Truck {truck_id} assigned to Dock {available_dock.dock_id}.")
+        if tracer is not None:
+            tracer.record(env.now, "DOCK_GRANT", truck=truck_id, resource=available_dock.dock_id, location=available_dock.location)
         forklift_required = truck.capacity
         # Simulate truck unloading and moving pallets to storage in parallel
         start_unloading_time = env.now
@@ -47,8 +96,7 @@ def truck_arrival(env, resource_handler, unloading_docks, dock_list, truck_id):
         forklift_processes = []
         forklift_processes.append(env.process(handle_unloading_forklift(env, truck, available_dock, resource_handler)))
         yield env.timeout(t_unload_pallat*forklift_required)
-        if env.now > warmup_period:
-            truck_unloading_times.append(truck.capacity*t_unload_pallat)
+        metrics.observe("truck_unloading_mean_time", truck.capacity*t_unload_pallat)
         for _ in range(forklift_required):  # Forklifts for both unloading and storage
             forklift_processes.append(env.process(handle_forklift(env, available_dock, resource_handler)))
 
@@ -57,14 +105,15 @@ def truck_arrival(env, resource_handler, unloading_docks, dock_list, truck_id):
 
         unloading_duration = env.now - start_unloading_time
         resource_handler.unloading_dock_usage_time += unloading_duration
-        if env.now > warmup_period:
-            truck_unloading_times.append(truck.capacity*t_unload_pallat)
-            mean_pallet_put_times.append(unloading_duration - t_unload_pallat*forklift_required)
-        print(f"[{round(env.now,2)}] Truck {truck_id} finished unloading and is leaving.")
+        metrics.observe("truck_unloading_mean_time", truck.capacity*t_unload_pallat)
+        metrics.observe("mean_pallet_time", unloading_duration - t_unload_pallat*forklift_required)
+        log(f"[{round(env.now,2)}] Truck {truck_id} finished unloading and is leaving.")
 
         # Mark the dock as free
         available_dock.is_occupied = False
-        print(f"[{round(env.now,2)}] Dock {available_dock.dock_id} is now free.")
+        log(f"[{round(env.now,2)}] Dock {available_dock.dock_id} is now free.")
+        if tracer is not None:
+            tracer.record(env.now, "TRUCK_DEPARTURE", truck=truck_id, resource=available_dock.dock_id)
         
 def handle_unloading_forklift(env, truck, dock, resource_handler):
     """Handle unloading of pallets using one forklift."""
@@ -75,8 +124,13 @@ def handle_unloading_forklift(env, truck, dock, resource_handler):
             #yield env.process(resource_handler.use_forklift(t_unload_pallat))  # Time to unload a pallet
             yield env.timeout(t_unload_pallat)
             pallet = truck.unload()  # Unload a pallet from the truck
+            if pallet_ledger is not None:
+                pallet_ledger.record(pallet, "unload", env.now)
+            if tracer is not None:
+                tracer.record(env.now, "PALLET_UNLOAD", truck=truck.truck_id, pallet=pallet.row,
+                              resource=forklift_request.unit, location=dock.location)
             dock.store_pallet(pallet)
-            print(f"[{round(env.now,2)}] {pallet.pallet_id} ({pallet.pallet_type}) unloaded at Dock {dock.dock_id}.")
+            log(f"[{round(env.now,2)}] {pallet.name} ({pallet.pallet_type}) unloaded at Dock {dock.dock_id}.")
 
 def handle_forklift(env, dock, resource_handler):
     """Handle forklift tasks for unloading or moving pallets to storage."""
@@ -87,7 +141,11 @@ def handle_forklift(env, dock, resource_handler):
             yield forklift_request
             # Move pallets to storage if dock has pallets
             if dock.has_pallets():
-                pallet = dock.pallet_storage.pop(0)
+                pallet = dock.take_pallet()
+                if pallet_ledger is not None:
+                    pallet_ledger.record(pallet, "putaway_start", env.now)
+                if tracer is not None:
+                    tracer.record(env.now, "PUTAWAY_START", pallet=pallet.row, resource=forklift_request.unit, location=dock.location)
                 # Get target storage location
                 storage, location = resource_handler.storage.assign_storage_location(pallet)
 
@@ -100,52 +158,69 @@ def handle_forklift(env, dock, resource_handler):
                 travel_time_z = z / lever_speed_z
                 
                 t_store_pallat  = (travel_time_x + travel_time_y + travel_time_z)
+                resource_handler.forklifts.travel(forklift_request, x + y, x + y)  # There loaded, back empty
 
                 # Store the pallet
                 try:
-                    print(f"[{round(env.now,2)}] Using Forklift to transport {pallet.pallet_id} ({pallet.pallet_type}) to storage {location} ")
+                    log(f"[{round(env.now,2)}] Using Forklift to transport {pallet.name} ({pallet.pallet_type}) to storage {location} ")
                     #yield env.process(resource_handler.use_forklift(t_store_pallat))
                     yield env.timeout(t_store_pallat)
                     pallet.location = location
                     aisle, slot, level = storage
                     resource_handler.storage.storage[aisle][slot][level] = pallet
-                    print(f"[{round(env.now,2)}] {pallet.pallet_id} ({pallet.pallet_type}) stored at {storage}.")
+                    if pallet_ledger is not None:
+                        pallet_ledger.record(pallet, "putaway_end", env.now)
+                    if tracer is not None:
+                        tracer.record(env.now, "PALLET_STORE", pallet=pallet.row, resource=forklift_request.unit, location=location)
+                    log(f"[{round(env.now,2)}] {pallet.name} ({pallet.pallet_type}) stored at {storage}.")
                     #yield env.process(resource_handler.use_forklift(t_store_pallat))
                     yield env.timeout(t_store_pallat)
                 except ValueError as e:
-                    print(f"[{round(env.now,2)}] Storage full: {e}. Returning pallet to dock.")
-                    dock.pallet_storage.insert(0, pallet)  # Return pallet to dock
+                    log(f"[{round(env.now,2)}] Storage full: {e}. Returning pallet to dock.")
+                    dock.return_pallet(pallet)  # Return pallet to dock
             else:
-                print(f"[{round(env.now,2)}] Forklift is free at Dock {dock.dock_id}")
+                log(f"[{round(env.now,2)}] Forklift is free at Dock {dock.dock_id}")
                 break
 
 
 
-def generate_truck_arrivals(env, resource_handler, unloading_docks, dock_list):
+def generate_truck_arrivals(env, resource_handler, unloading_docks, dock_list, source=None):
     """Generate trucks arriving for unloading."""
+    if source is None:
+        source = FixedIntervalSource(60 / config["unloading_trucks_per_hour"])  # Trucks arrive at regular intervals
     truck_id = 0
-    while True:
-        yield env.timeout(60 / config["unloading_trucks_per_hour"])  # Trucks arrive at regular intervals
+    for arrival in source:
+        if arrival.time > env.now:
+            yield env.timeout(arrival.time - env.now)
         truck_id += 1
-        env.process(truck_arrival(env, resource_handler, unloading_docks, dock_list, truck_id))
+        if arrival.entity_id is not None:
+            truck_id = arrival.entity_id
+        env.process(truck_arrival(env, resource_handler, unloading_docks, dock_list, truck_id, arrival.size, arrival.pallet_types))
 
-def generate_orders(env, resource_handler, assembly_area_list):
+def generate_orders(env, resource_handler, assembly_area_list, source=None):
+    if source is None:
+        source = FixedIntervalSource(60 / config["orders_per_hour"])  # Orders arrive at regular intervals
     order_id = 0
     order_inventory = {}
     for pallet_type in config["pallet_types"]:
         order_inventory[pallet_type]=[]
-    while True:
-        yield env.timeout(60 / config["orders_per_hour"])  # Orders arrive at regular intervals
+    for arrival in source:
+        if arrival.time > env.now:
+            yield env.timeout(arrival.time - env.now)
+        # Orders are always numbered sequentially, order_inventory is indexed by order_id
         order_id += 1
-        total_order_size = random.randint(config["minimum_order_size"], config["maximum_order_size"])
-        full_order = np.random.choice(config["pallet_types"],total_order_size, p=config['pallet_probs']).tolist()
-        pallets_required = {
-        pallet_type: count
-        for pallet_type, count in (
-            (pallet_type, full_order.count(pallet_type))
-            for pallet_type in config["pallet_types"]
-        )
-        }
+        if arrival.items is not None:
+            pallets_required = {pallet_type: arrival.items.get(pallet_type, 0) for pallet_type in config["pallet_types"]}
+        else:
+            total_order_size = arrival.size or random.randint(config["minimum_order_size"], config["maximum_order_size"])
+            full_order = np.random.choice(config["pallet_types"],total_order_size, p=config['pallet_probs']).tolist()
+            pallets_required = {
+            pallet_type: count
+            for pallet_type, count in (
+                (pallet_type, full_order.count(pallet_type))
+                for pallet_type in config["pallet_types"]
+            )
+            }
         order = Order(order_id, pallets_required)
         for pallet_type, required_quantity in order.pallets_required.items():
             if len(order_inventory[pallet_type])>0 and required_quantity > 0:
@@ -159,14 +234,17 @@ def generate_orders(env, resource_handler, assembly_area_list):
                         order_inventory[pallet_type].append(required_quantity)
             else:
                 order_inventory[pallet_type].append(required_quantity)
-        print(f"[{round(env.now,2)}] Generated {order}.")
+        log(f"[{round(env.now,2)}] Generated {order}.")
+        if tracer is not None:
+            tracer.record(env.now, "ORDER_CREATED", order=order_id)
         env.process(assemble_order(env, resource_handler, order, assembly_area_list, order_inventory))
         
 def assemble_order(env, resource_handler, order, assembly_area_list, order_inventory):
     """Simulate the assembly of an order."""
     wait_order_assembly = env.now
     order_id = order.order_id
-    print(f"[{round(env.now,2)}] Starting to process Order {order_id}.")
+    log(f"[{round(env.now,2)}] Starting to process Order {order_id}.")
+    resource_handler.pending_orders += 1
     while True:
         missing_pallets = {}
         for pallet_type, required_quantities in order_inventory.items():
@@ -177,10 +255,10 @@ def assemble_order(env, resource_handler, order, assembly_area_list, order_inven
                 missing_pallets[pallet_type] = required_quantity - available_quantity
 
         if not missing_pallets:
-            print(f"[{round(env.now,2)}] All pallets for Order {order.order_id} are available. Starting assembly.")
+            log(f"[{round(env.now,2)}] All pallets for Order {order.order_id} are available. Starting assembly.")
             order_assembly_start_time =env.now
-            if env.now > warmup_period:
-                order_assembling_waiting_times.append(order_assembly_start_time - wait_order_assembly)
+            resource_handler.pending_orders -= 1
+            metrics.observe("order_assembling_mean_waiting_time", order_assembly_start_time - wait_order_assembly)
             while True:
                 # Find the first available dock
                 with resource_handler.assembly_areas.request() as area_request:
@@ -194,7 +272,9 @@ def assemble_order(env, resource_handler, order, assembly_area_list, order_inven
                     
                     available_assembly_area.is_occupied = True  # Mark the dock as occupied
                     area_id = available_assembly_area.area_id
-                    print(f"[{round(env.now,2)}] Order {order_id} assigned to Assemble Area {area_id}.")
+                    log(f"[{round(env.now,2)}] Order {order_id} assigned to Assemble Area {area_id}.")
+                    if tracer is not None:
+                        tracer.record(env.now, "ASSEMBLY_START", order=order_id, resource=area_id, location=available_assembly_area.location)
                     
                     # Perform assembly
                     yield env.process(perform_assembly(env, resource_handler, order, available_assembly_area))
@@ -206,22 +286,22 @@ def assemble_order(env, resource_handler, order, assembly_area_list, order_inven
                         available_assembly_area.is_occupied = True
                     else:
                         available_assembly_area.is_occupied = False
-                    print(f"[{round(env.now,2)}] Order {order_id} released Assembly Area {area_id}.")
-                    if env.now > warmup_period:
-                        mean_pallet_pickup_times.append(env.now - order_assembly_start_time)
+                    log(f"[{round(env.now,2)}] Order {order_id} released Assembly Area {area_id}.")
+                    metrics.observe("mean_pallet_pickup_time", env.now - order_assembly_start_time)
                     t_total_order_assembly  = t_order_assembly*sum(order.pallets_required.values())
                     yield env.timeout(t_total_order_assembly)
-                    if env.now > warmup_period:
-                        order_assembling_times.append(t_total_order_assembly)
+                    metrics.observe("order_assembling_mean_time", t_total_order_assembly)
                     available_assembly_area.num_orders+=1
+                    if tracer is not None:
+                        tracer.record(env.now, "ORDER_ASSEMBLED", order=order_id, resource=area_id)
                     available_assembly_area.orders.append(order)
                     return
 
                 # If no assembly area is available, wait and retry
-                print(f"[{round(env.now,2)}] Order {order_id} is waiting for an available assembly area.")
+                log(f"[{round(env.now,2)}] Order {order_id} is waiting for an available assembly area.")
                 yield env.timeout(t_check_inventory)  # Check every 1 time unit
         else:
-            print(f"[{round(env.now,2)}] Order {order_id} is waiting for missing pallets: {missing_pallets}.")
+            log(f"[{round(env.now,2)}] Order {order_id} is waiting for missing pallets: {missing_pallets}.")
             yield env.timeout(t_check_inventory)  # Check inventory every 2 minutes
     
 
@@ -240,7 +320,13 @@ def perform_assembly(env, resource_handler, order, assembly_area):
                 pallet_type = next((p for p, qty in pallets_to_handle.items() if qty > 0), None)
                 if pallet_type:
                     pallets_to_handle[pallet_type] -= 1
-                    pallet_location = resource_handler.storage.get_item(pallet_type)
+                    pallet, pallet_location = resource_handler.storage.pick_item(pallet_type)
+                    if pallet_ledger is not None:
+                        pallet_ledger.record(pallet, "pick", env.now)
+                        order.pallets.append(pallet)  # Only kept to stamp the load
+                    if tracer is not None:
+                        tracer.record(env.now, "PALLET_PICK", order=order.order_id, pallet=pallet.row,
+                                      resource=forklift_request.unit, location=pallet_location)
                     s_x, s_y, z = pallet_location  # Source aisle, slot, and level
                     a_x, a_y, _ = assembly_area.location
                     # Calculate travel times
@@ -249,6 +335,8 @@ def perform_assembly(env, resource_handler, order, assembly_area):
                     travel_time_z = z / config["lever_speed_z"]
 
                     t_assemble = (travel_time_x + travel_time_y + travel_time_z) * 2
+                    distance = abs(s_x - a_x) + abs(s_y - a_y)
+                    resource_handler.forklifts.travel(forklift_request, distance, distance)  # There empty, back loaded
                     # Simulate assembly time
                     
                     #assembly_processes.append(env.process(resource_handler.use_forklift(t_assemble)))
@@ -260,24 +348,31 @@ def perform_assembly(env, resource_handler, order, assembly_area):
         yield simpy.AllOf(env, assembly_processes)
     assembly_area.current_storage+=total_pallets_to_handle
         
-    print(f"[{round(env.now,2)}] Assembly for Order {order.order_id} completed.")
+    log(f"[{round(env.now,2)}] Assembly for Order {order.order_id} completed.")
 
 def assemble(env, t_assemble):
     yield env.timeout(t_assemble)
     
-def generate_loading_trucks(env, resource_handler, assembly_area_list, dock_list):
+def generate_loading_trucks(env, resource_handler, assembly_area_list, dock_list, source=None):
     """Generate loading trucks arriving at the facility."""
+    if source is None:
+        source = FixedIntervalSource(60 / config["loading_trucks_per_hour"])  # Trucks arrive at regular intervals
     truck_id = 0
-    while True:
-        yield env.timeout(60 / config["loading_trucks_per_hour"])  # Trucks arrive at regular intervals
+    for arrival in source:
+        if arrival.time > env.now:
+            yield env.timeout(arrival.time - env.now)
         truck_id += 1
+        if arrival.entity_id is not None:
+            truck_id = arrival.entity_id
         env.process(loading_truck_arrival(env, resource_handler, assembly_area_list, dock_list, truck_id))
 
     
 def loading_truck_arrival(env, resource_handler, assembly_area_list, dock_list, truck_id):
     """Simulate the arrival and loading process of a truck."""
     truck = LoadingTruck(env, truck_id, config["truck_capacity_max"])
-    print(f"[{round(env.now, 2)}] Loading Truck {truck_id} arrived.")
+    log(f"[{round(env.now, 2)}] Loading Truck {truck_id} arrived.")
+    if tracer is not None:
+        tracer.record(env.now, "LOADING_TRUCK_ARRIVAL", truck=truck_id)
 
     # Request a loading dock
     with resource_handler.loading_docks.request() as dock_request:
@@ -290,17 +385,18 @@ def loading_truck_arrival(env, resource_handler, assembly_area_list, dock_list,
 
         available_dock.is_occupied = True
         truck_arrival_time =env.now
-        print(f"[{round(env.now, 2)}] Loading Truck {truck_id} assigned to Dock {available_dock.dock_id}.")
+        log(f"[{round(env.now, 2)}] Loading Truck {truck_id} assigned to Dock {available_dock.dock_id}.")
+        if tracer is not None:
+            tracer.record(env.now, "LOADING_DOCK_GRANT", truck=truck_id, resource=available_dock.dock_id, location=available_dock.location)
         assembly_area = assembly_area_list[available_dock.dock_id-1]
         # Wait for order assembly if not ready
         order_ready = assembly_area.num_orders > 0
         while not order_ready:
-            print(f"[{round(env.now, 2)}] Loading Truck {truck_id} is waiting for an assembled order.")
+            log(f"[{round(env.now, 2)}] Loading Truck {truck_id} is waiting for an assembled order.")
             yield env.timeout(t_check_inventory)  # Check every 1 time unit
             order_ready = assembly_area.num_orders > 0
         loading_time_start = env.now
-        if env.now > warmup_period:
-            order_loading_mean_waiting_times.append(loading_time_start - truck_arrival_time)
+        metrics.observe("order_loading_mean_waiting_time", loading_time_start - truck_arrival_time)
         pallets_to_load = None
         # Transfer order from assembly area to the loading dock
         for idx in range(len(assembly_area.orders)):
@@ -321,73 +417,218 @@ def loading_truck_arrival(env, resource_handler, assembly_area_list, dock_list,
         assembly_area.current_storage-=pallets_to_load
         if not assembly_area.check_available_storage(config["maximum_order_size"]):
             assembly_area.is_occupied = False
-        if env.now > warmup_period:
-            truck_loading_times.append(env.now - loading_time_start)
-        print(f"[{round(env.now, 2)}] Loading Truck {truck_id} finished loading and is leaving.")
+        metrics.observe("truck_loading_mean_time", env.now - loading_time_start)
+        log(f"[{round(env.now, 2)}] Loading Truck {truck_id} finished loading and is leaving.")
+        if tracer is not None:
+            tracer.record(env.now, "ORDER_LOADED", truck=truck_id, order=assembly_area.orders[idx].order_id,
+                          resource=available_dock.dock_id)
+        if pallet_ledger is not None:
+            for pallet in assembly_area.orders[idx].pallets:
+                pallet_ledger.record(pallet, "load", env.now)
+        for listener in departure_listeners:
+            listener(env, truck, assembly_area.orders[idx])
         available_dock.is_occupied = False
         assembly_area.orders[idx].shipped = True
         resource_handler.loading_dock_usage_time+=env.now - truck_arrival_time
-        print(f"[{round(env.now, 2)}] Loading Dock {available_dock.dock_id} is now free.")
+        log(f"[{round(env.now, 2)}] Loading Dock {available_dock.dock_id} is now free.")
         
 def handle_loading_forklift(env, truck, dock, pallets_to_load, resource_handler, t_transfer, assembly_area):
     """Handle loading of pallets onto a truck using one forklift."""
     with resource_handler.forklifts.request(priority=1) as forklift_request:
         yield forklift_request
+        # Every pallet is carried from the assembly area to the dock and the forklift returns empty
+        distance = t_transfer * config["forklift_speed_xy"] / 2
+        resource_handler.forklifts.travel(forklift_request, distance, distance)
         # Time to load pallets
         yield env.timeout(t_transfer) 
-        print(f"[{round(env.now, 2)}] Transferred {pallets_to_load} pallets from Assembly Area {assembly_area.area_id} to Dock {dock.dock_id}.")
+        log(f"[{round(env.now, 2)}] Transferred {pallets_to_load} pallets from Assembly Area {assembly_area.area_id} to Dock {dock.dock_id}.")
         load_time = pallets_to_load * t_unload_pallat  # Assuming same time as unloading
-        print(f"[{round(env.now, 2)}] Using Forklift to load {pallets_to_load} pallets onto Truck.")
+        log(f"[{round(env.now, 2)}] Using Forklift to load {pallets_to_load} pallets onto Truck.")
         #yield env.process(resource_handler.use_forklift(load_time))
         yield env.timeout(load_time)
         loaded_pallets = truck.load(pallets_to_load)
-        print(f"[{round(env.now, 2)}] Loaded {loaded_pallets} pallets onto Truck.")
+        log(f"[{round(env.now, 2)}] Loaded {loaded_pallets} pallets onto Truck.")
 
 
 
 def track_forklift_usage(env, resource_handler):
     while True:
         yield env.timeout(MONITOR_INTERVAL)
-        if env.now>warmup_period:
-            used_forklifts = resource_handler.forklifts.count
-            usage_log.append((env.now, used_forklifts))
-        
-
-
-def calculate_average_utilization(total_time, capacity):
-    total_used_time = sum(entry[1] for entry in usage_log) * (usage_log[1][0] - usage_log[0][0])
-    return (total_used_time / (total_time * capacity)) * 100
+        metrics.level("forklifts_in_use", env.now, resource_handler.forklifts.count)
+
+
+def state_columns(pallet_types=None):
+    """Columns sampled by record_state after the time column, for the configured or given pallet types."""
+    pallet_types = config["pallet_types"] if pallet_types is None else pallet_types
+    return [
+        "forklifts_busy",
+        "forklift_queue",
+        "unloading_dock_queue",
+        "dock_pallets",
+        "loading_dock_queue",
+        "pending_orders",
+        "assembly_queue",
+        "assembled_orders",
+        *[f"storage_{pallet_type}" for pallet_type in pallet_types],
+    ]
+
+
+def record_state(env, resource_handler, dock_list, assembly_area_list, recorder, interval=RECORD_INTERVAL, on_change=True):
+    """
+    Sample queue lengths and occupancy into a TimeSeriesRecorder (see timeseries.py).
+
+    Parameters:
+    - dock_list, assembly_area_list: Unloading docks and assembly areas of the run.
+    - recorder: TimeSeriesRecorder created with state_columns().
+    - interval: Minutes between samples.
+    - on_change: Only keep samples that differ from the last recorded row.
+    """
+    storage = resource_handler.storage
+    while True:
+        values = (
+            resource_handler.forklifts.count,
+            len(resource_handler.forklifts.queue),
+            len(resource_handler.unloading_docks.queue),
+            sum(len(dock.pallet_storage) for dock in dock_list),
+            len(resource_handler.loading_docks.queue),
+            resource_handler.pending_orders,
+            len(resource_handler.assembly_areas.queue),
+            sum(area.num_orders for area in assembly_area_list),
+            *[storage.get_available_quantity(pallet_type) for pallet_type in config["pallet_types"]],
+        )
+        last = recorder.last()
+        if not on_change or last is None or np.any(last != values):
+            recorder.append(env.now, values)
+        yield env.timeout(interval)
 
 
+def end_warmup(env, resource_handler=None):
+    """Discard everything recorded during the warmup, once, when it ends, including the forklift telemetry of resource_handler."""
+    yield env.timeout(warmup_period)
+    # Let the other events at the end of the warmup run first, only later observations count
+    while env.peek() == env.now:
+        yield env.timeout(0)
+    metrics.reset(env.now)
+    if resource_handler is not None:
+        resource_handler.forklifts.reset(env.now)
 
 
-def main():
-    """Main function to run the simulation."""
+def calculate_average_utilization(total_time, capacity):
+    usage = metrics.levels.get("forklifts_in_use")
+    if usage is None or usage.area == 0:
+        return 0.0
+    return (usage.area / (total_time * capacity)) * 100
+
+
+def reset_statistics():
+    """Clear the KPI accumulators of a previous run in this process."""
+    metrics.clear()
+    if pallet_ledger is not None:
+        pallet_ledger.clear()
+
+
+def collect_results(resource_handler, simulation_duration):
+    """
+    Reduce the recorded samples to the KPIs printed by main().
+
+    Returns:
+    - Dict of KPI key -> value, None for KPIs without samples.
+    """
+    results = {
+        "unloading_docks_utilization": resource_handler.get_unloading_dock_utilization(simulation_duration),
+        "storage_utilization": resource_handler.get_storage_utilization(),
+        "loading_docks_utilization": resource_handler.get_loading_dock_utilization(simulation_duration),
+        "forklift_utilization": calculate_average_utilization(simulation_duration - warmup_period, resource_handler.forklifts.capacity),
+    }
+    for key in SAMPLED_KPIS:
+        results[key] = metrics.mean(key)
+    return results
+
+
+def collect_quantiles(quantiles=(0.5, 0.95, 0.99)):
+    """
+    Quantiles of the per-entity KPIs of the current run.
+
+    Returns:
+    - Dict of KPI key -> {"p50": ..., "p95": ..., "p99": ...}, see MetricsRegistry.quantiles.
+    """
+    return {key: value for key, value in metrics.quantiles(quantiles).items() if key in SAMPLED_KPIS}
+
+
+def collect_api_results(resource_handler, total_time):
+    """Labelled KPIs of the current run over its first `total_time` minutes, as served by app.py and app-celery.py."""
+    simulation_results = {
+        "Unloading Dock Utilization (%)": resource_handler.get_unloading_dock_utilization(total_time),
+        "Storage Utilization (%)": resource_handler.get_storage_utilization(),
+        "Loading Dock Utilization (%)": resource_handler.get_loading_dock_utilization(total_time),
+        "Average Forklift Utilization (%)": calculate_average_utilization(
+            total_time, resource_handler.forklifts.capacity
+        ),
+        "Truck Unloading Mean Time (mins)": metrics.mean("truck_unloading_mean_time"),
+        "Truck Loading Mean Time (mins)": metrics.mean("truck_loading_mean_time"),
+        "Order Loading Wait Time (mins)": metrics.mean("order_loading_mean_waiting_time"),
+        "Order Assembly Mean Wait Time (mins)": metrics.mean("order_assembling_mean_waiting_time"),
+        "Order Assembly Mean Time (mins)": metrics.mean("order_assembling_mean_time"),
+        "Pallet Put Mean Time (mins)": metrics.mean("mean_pallet_time"),
+        "Pallet Pickup Mean Time (mins)": metrics.mean("mean_pallet_pickup_time")
+    }
+    quantiles = collect_quantiles((0.95,))
+    for label, key in (("Truck Unloading P95 Wait Time (mins)", "truck_unloading_mean_waiting_time"),
+                       ("Order Loading P95 Wait Time (mins)", "order_loading_mean_waiting_time"),
+                       ("Order Assembly P95 Wait Time (mins)", "order_assembling_mean_waiting_time")):
+        simulation_results[label] = quantiles.get(key, {}).get("p95")
+    return simulation_results
+
+
+def collect_pallet_lifecycle(ledger=None, quantiles=(0.5, 0.95, 0.99)):
+    """
+    Dwell times of the pallets of a run whose stage started after the warmup.
+
+    Parameters:
+    - ledger: PalletLedger of the run, pallet_ledger of the current run by default.
+
+    Returns:
+    - Dict of stage -> {"n", "mean", "p50", "p95", "p99"}, see PalletLedger.summary;
+      None when no ledger recorded the run.
+    """
+    ledger = pallet_ledger if ledger is None else ledger
+    return None if ledger is None else ledger.summary(since=warmup_period, quantiles=quantiles)
+
+
+def trace_initial_storage(storage):
+    """Record the pallets in storage at the start of the run, so a replay knows the full storage."""
+    for aisle in storage.storage.values():
+        for slot in aisle:
+            for pallet in slot:
+                if pallet is not None:
+                    pallet_ledger.register(pallet)
+                    tracer.record(0, "INITIAL_STORE", pallet=pallet.row, location=pallet.location)
+
+
+def build_simulation(truck_source=None, order_source=None, loading_truck_source=None, recorder=None, ledger=None):
+    """
+    Create the environment, resources and generator processes of one warehouse.
+
+    Parameters:
+    - truck_source, order_source, loading_truck_source: Optional arrival sources
+      (see arrivals.py) replacing the fixed-interval arrivals from config.
+    - recorder: Optional TimeSeriesRecorder filled by record_state.
+    - ledger: Optional PalletLedger recording every pallet, cleared first and
+      installed as pallet_ledger. Without it no pallet is tracked.
+
+    Returns:
+    - (env, resource_handler, unloading dock list), ready to run.
+    """
+    global forklift_fleet, pallet_ledger
+    pallet_ledger = ledger
+    if ledger is not None:
+        ledger.clear()
     # Initialize simulation environment
     env = simpy.Environment()
-    
-    unloading_dock_start_y = 5
-    width_unloading_dock = 5
-    unloading_dock_end_y = unloading_dock_start_y + width_unloading_dock*config["num_unloading_docks"] + config["num_unloading_docks"]-1
-    unloading_dock_x = 2  # The x-coordinate for unloading docks (parallel to aisles)
-    
-    assembly_area_start_x = 32
-    width_assembly_area = 6
-    assembly_area_end_x = assembly_area_start_x + width_assembly_area*config["num_assembly_area"] 
-    assembly_area_y = -5
-    
-    loading_dock_start_x = 32
-    width_loading_dock = 6
-    loading_dock_end_x = loading_dock_start_x + width_loading_dock*config["num_loading_docks"]
-    loading_dock_y = -11
 
+    # Create unloading docks, assembly areas and loading docks
+    dock_list, assembly_area_list, loading_dock_list = build_layout()
 
-    # Create unloading docks
-    dock_list = [Dock(dock_id,(unloading_dock_x, round(y,2), 0)) for dock_id, y in zip(range(1,config["num_unloading_docks"]+1), np.arange(unloading_dock_start_y, unloading_dock_end_y, width_unloading_dock))]
-    assembly_area_list = [AssemblyArea(assembly_area_id, (round(x,2),assembly_area_y, 0), config["assembly_area_capacity"]) for assembly_area_id, x in zip(range(1,config["num_assembly_area"]+1), np.arange(assembly_area_start_x, assembly_area_end_x, width_assembly_area))]
-    loading_dock_list = [Dock(loading_dock_id, (round(x,2),loading_dock_y, 0)) for loading_dock_id, x in zip(range(1,config["num_loading_docks"]+1), np.arange(loading_dock_start_x, loading_dock_end_x, width_loading_dock))]
-    
-    
     # Initialize ResourceHandler
     resource_handler = ResourceHandler(
         env,
@@ -396,59 +637,247 @@ def main():
         num_loading_docks = config["num_loading_docks"],
         num_assembly_areas = config["num_assembly_area"]
     )
+    forklift_fleet = resource_handler.forklifts
     # Start truck arrival process
-    env.process(generate_truck_arrivals(env, resource_handler, resource_handler.unloading_docks, dock_list))
-    env.process(generate_orders(env, resource_handler, assembly_area_list))
-    env.process(generate_loading_trucks(env, resource_handler, assembly_area_list, loading_dock_list))
+    env.process(generate_truck_arrivals(env, resource_handler, resource_handler.unloading_docks, dock_list, truck_source))
+    env.process(generate_orders(env, resource_handler, assembly_area_list, order_source))
+    env.process(generate_loading_trucks(env, resource_handler, assembly_area_list, loading_dock_list, loading_truck_source))
     env.process(track_forklift_usage(env, resource_handler))
-    # Run the simulation
-    simulation_duration = config["simulation_duration_minutes"]
-    env.run(until=simulation_duration)
-
-    # Print utilization metrics
+    env.process(end_warmup(env, resource_handler))
+    if recorder is not None:
+        env.process(record_state(env, resource_handler, dock_list, assembly_area_list, recorder))
+    return env, resource_handler, dock_list
+
+
+def run_simulation(overrides=None, seed=None, quiet=False, truck_source=None, order_source=None, loading_truck_source=None,
+                   recorder=None, profiler=None, memory=False, trace_writer=None, ledger=None):
+    """
+    Run one replication of the simulation.
+
+    Parameters:
+    - overrides: Optional dict of config keys to change for this run only.
+    - seed: Seed for random and numpy.random, None reseeds both from OS entropy.
+    - quiet: Suppress the per-event output.
+    - truck_source, order_source, loading_truck_source: Optional arrival sources
+      (see arrivals.py) replacing the fixed-interval arrivals from config.
+    - recorder: Optional TimeSeriesRecorder (see timeseries.py) receiving the
+      state time series of the run, created with state_columns().
+    - profiler: Optional Profiler (see profiling.py) timing the run's events and storage calls.
+    - memory: Trace memory per phase and add the report (see memory.py) under "memory".
+    - trace_writer: Optional TraceWriter (see eventtrace.py) receiving every event of the run.
+    - ledger: Optional PalletLedger (see lifecycle.py) receiving the lifecycle of every pallet
+      of the run. A trace always records one, its rows are the traced pallet IDs.
+
+    Returns:
+    - Dict of KPI key -> value, see collect_results, plus "memory" if requested.
+    """
+    global verbose, tracer, pallet_ledger
+    overrides = overrides or {}
+    for key in overrides:
+        if key not in config:
+            raise KeyError(f"Unknown config key: {key}")
+    previous_config = {key: config[key] for key in overrides}
+    previous_verbose = verbose
+    previous_tracer = tracer
+    previous_ledger = pallet_ledger
+    config.update(overrides)
+    verbose = not quiet
+    tracer = trace_writer
+    if ledger is None and trace_writer is not None:
+        ledger = PalletLedger()
+    pallet_ledger = ledger
+    try:
+        # Reseed both generators every run, a pool worker must not carry the state of its
+        # previous run (or of the forked parent) into an unseeded one
+        random.seed(seed)
+        np.random.seed(seed)
+        report = None
+        if memory:
+            from memory import MemoryReport
+            report = MemoryReport()
+            report.phase("setup")
+        reset_statistics()
+        env, resource_handler, _ = build_simulation(truck_source, order_source, loading_truck_source, recorder, ledger)
+        if tracer is not None:
+            trace_initial_storage(resource_handler.storage)
+        # Run the simulation
+        simulation_duration = config["simulation_duration_minutes"]
+        with profiler.attach(env) if profiler is not None else contextlib.nullcontext():
+            if report is not None:
+                if 0 < warmup_period < simulation_duration:
+                    report.phase("warmup")
+                    env.run(until=warmup_period)
+                report.phase("steady_state")
+            env.run(until=simulation_duration)
+        if report is None:
+            return collect_results(resource_handler, simulation_duration)
+        report.phase("reporting")
+        results = collect_results(resource_handler, simulation_duration)
+        results["memory"] = report.finish()
+        return results
+    finally:
+        config.update(previous_config)
+        verbose = previous_verbose
+        tracer = previous_tracer
+        pallet_ledger = previous_ledger
+
+
+def print_results(results):
+    """Print KPIs in the format of the original simulation report."""
     print("\n=== Simulation Results ===")
-    total_time = simulation_duration
-    print(f"Unloading Dock Utilization: {resource_handler.get_unloading_dock_utilization(total_time):.2f}%")
-    print(f"Storage Utilization: {resource_handler.get_storage_utilization():.2f}%")
-    print(f"Loading Dock Utilization: {resource_handler.get_loading_dock_utilization(total_time):.2f}%")
-    # In main function
-    average_utilization = calculate_average_utilization(simulation_duration - warmup_period, resource_handler.forklifts.capacity)
-    print(f"Average Forklift Utilization: {average_utilization:.2f}%")
-        # Calculate and print other metrics
-    if truck_unloading_times:
-        print(f"Truck Unloading Mean Time: {np.mean(truck_unloading_times):.2f} minutes")
-    else:
-        print("No truck unloading times recorded.")
-
-    if truck_loading_times:
-        print(f"Truck Loading Mean Time: {np.mean(truck_loading_times):.2f} minutes")
-    else:
-        print("No truck loading times recorded.")
-    
-    if order_loading_mean_waiting_times:
-        print(f"Order Loading waiting Mean Time: {np.mean(order_loading_mean_waiting_times):.2f} minutes")
-    else:
-        print("No truck loading times recorded.")
-        
-    if order_assembling_waiting_times:
-        print(f"Order Assembling Mean Waiting Time: {np.mean(order_assembling_waiting_times):.2f} minutes")
-    else:
-        print("No order assembling waiting times recorded.")
-
-    if order_assembling_times:
-        print(f"Order Assembling Mean Time: {np.mean(order_assembling_times):.2f} minutes")
+    for key, (label, unit, missing) in KPIS.items():
+        value = results.get(key)
+        if value is None and missing is not None:
+            print(missing)
+        else:
+            print(f"{label}: {value:.2f}{unit}")
+
+
+def main(truck_source=None, order_source=None, loading_truck_source=None):
+    """Main function to run the simulation.
+
+    Parameters:
+    - truck_source, order_source, loading_truck_source: Optional arrival sources
+      (see arrivals.py) replacing the fixed-interval arrivals from config.
+    """
+    results = run_simulation(truck_source=truck_source, order_source=order_source, loading_truck_source=loading_truck_source)
+    print_results(results)
+
+def parse_overrides(config_path=None, assignments=()):
+    """
+    Collect config overrides from a JSON file and KEY=VALUE assignments.
+
+    Values of assignments are parsed as JSON when possible (numbers, lists),
+    otherwise kept as strings. Assignments win over the file.
+    """
+    overrides = {}
+    if config_path:
+        with open(config_path) as f:
+            overrides.update(json.load(f))
+    for assignment in assignments:
+        key, separator, value = assignment.partition("=")
+        if not separator:
+            raise ValueError(f"Expected KEY=VALUE, got '{assignment}'.")
+        try:
+            overrides[key.strip()] = json.loads(value)
+        except ValueError:
+            overrides[key.strip()] = value
+    unknown = [key for key in overrides if key not in config]
+    if unknown:
+        raise KeyError(f"Unknown config keys: {', '.join(unknown)}")
+    return overrides
+
+
+def write_results(path, seeds, runs, summary=None, output_format=None):
+    """
+    Write per-run KPIs to a JSON, CSV or NPZ file.
+
+    Parameters:
+    - path: Output file; the format follows its extension unless output_format is given.
+    - seeds: Seed of every run (None for an unseeded run).
+    - runs: List of KPI dicts, one per run.
+    - summary: Optional replication summary (see runner.run_replications), stored in JSON output.
+    - output_format: "json", "csv" or "npz".
+    """
+    output_format = output_format or path.rsplit(".", 1)[-1].lower()
+    if output_format == "json":
+        document = {"seeds": seeds, "runs": runs}
+        if summary is not None:
+            document.update({key: summary[key] for key in ("overrides", "confidence", "kpis", "quantiles")})
+        with open(path, "w") as f:
+            json.dump(document, f, indent=2)
+    elif output_format == "csv":
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["replication", "seed", *KPIS])
+            for replication, (seed, results) in enumerate(zip(seeds, runs)):
+                writer.writerow([replication, "" if seed is None else seed,
+                                 *["" if results.get(key) is None else results[key] for key in KPIS]])
+    elif output_format == "npz":
+        arrays = {key: np.array([np.nan if results.get(key) is None else results[key] for results in runs])
+                  for key in KPIS}
+        np.savez(path, seed=np.array([-1 if seed is None else seed for seed in seeds]), **arrays)
     else:
-        print("No order assembling times recorded.")
-        
-    if mean_pallet_put_times:
-        print(f"Mean Pallet Put Time: {np.mean(mean_pallet_put_times):.2f} minutes")
+        raise ValueError(f"Unsupported output format: {output_format}. Use json, csv or npz.")
+
+
+def cli(argv=None):
+    """Command-line entry point, see python main.py --help."""
+    parser = argparse.ArgumentParser(description="Run the warehouse simulation.")
+    parser.add_argument("--config", metavar="PATH", help="JSON file of config overrides")
+    parser.add_argument("--set", metavar="KEY=VALUE", action="append", default=[], dest="assignments",
+                        help="Override one config key, may be repeated")
+    parser.add_argument("--seed", type=int, help="Seed of the run, or base seed of the replications")
+    parser.add_argument("--replications", type=int, default=1, help="Number of independent replications")
+    parser.add_argument("--workers", type=int, help="Worker processes for replications (default: all cores)")
+    parser.add_argument("--quiet", action="store_true", help="Do not print simulation events")
+    parser.add_argument("--output", metavar="PATH", help="Write results to a .json, .csv or .npz file")
+    parser.add_argument("--format", choices=["json", "csv", "npz"], help="Output format if not given by the extension")
+    parser.add_argument("--timeseries", metavar="PATH",
+                        help="Record queue lengths and occupancy of a single run to a .npz or .npy file")
+    parser.add_argument("--pallets", metavar="PATH", help="Write the pallet lifecycle table of a single run to a .npz file")
+    parser.add_argument("--fleet", action="store_true", help="Print per-forklift telemetry of a single run")
+    parser.add_argument("--memory", action="store_true", help="Print a memory report of a single run")
+    parser.add_argument("--trace", metavar="PATH", help="Write a binary event trace of a single run, see eventtrace.py")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="Profile a single run, print the summary and write folded stacks for a flame graph")
+    args = parser.parse_args(argv)
+    try:
+        overrides = parse_overrides(args.config, args.assignments)
+    except KeyError as e:
+        parser.error(e.args[0])
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if args.replications < 1:
+        parser.error("--replications must be at least 1.")
+    if (args.timeseries or args.pallets or args.fleet or args.profile or args.memory or args.trace) and args.replications > 1:
+        parser.error("--timeseries, --pallets, --fleet, --profile, --memory and --trace record a single run, use --replications 1.")
+
+    summary = None
+    if args.replications == 1:
+        recorder = None
+        if args.timeseries:
+            from timeseries import TimeSeriesRecorder
+            recorder = TimeSeriesRecorder(state_columns(overrides.get("pallet_types")))
+        profiler = None
+        if args.profile:
+            from profiling import Profiler
+            profiler = Profiler()
+        ledger = PalletLedger() if args.pallets else None
+        trace_writer = None
+        if args.trace:
+            from eventtrace import TraceWriter
+            trace_writer = TraceWriter(args.trace)
+        try:
+            results = run_simulation(overrides=overrides, seed=args.seed, quiet=args.quiet, recorder=recorder,
+                                     profiler=profiler, memory=args.memory, trace_writer=trace_writer, ledger=ledger)
+        finally:
+            if trace_writer is not None:
+                trace_writer.close()
+        report = results.pop("memory", None)
+        print_results(results)
+        if recorder is not None:
+            recorder.save(args.timeseries)
+        if ledger is not None:
+            ledger.save(args.pallets)
+        if args.fleet:
+            from forklift import print_fleet
+            print_fleet(forklift_fleet.summary())
+        if profiler is not None:
+            profiler.print_summary()
+            profiler.write_folded(args.profile)
+        if report is not None:
+            from memory import print_memory
+            print_memory(report)
+        seeds, runs = [args.seed], [results]
     else:
-        print("No pallet times recorded.")
+        from runner import run_replications, print_summary
+        summary = run_replications(overrides, args.replications, args.workers, base_seed=args.seed or 0)
+        print_summary(summary)
+        seeds, runs = summary["seeds"], summary["runs"]
+    if args.output:
+        write_results(args.output, seeds, runs, summary, args.format)
 
-    if mean_pallet_pickup_times:
-        print(f"Mean Pallet Pickup Time: {np.mean(mean_pallet_pickup_times):.2f} minutes")
-    else:
-        print("No pallet pickup times recorded.")
 
 if __name__ == "__main__":
-    main()
+    cli()
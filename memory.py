@@ -0,0 +1,118 @@
+"""
+Opt-in memory report of one simulation run.
+
+A MemoryReport traces allocations with tracemalloc while the run goes
+through its phases (setup, warmup, steady state, reporting). At the end of
+every phase it records the traced memory, the peak reached during the phase
+and the live object counts per entity class. At the end of the run it adds
+the top allocation sites of the memory still held:
+
+    results = run_simulation(seed=1, quiet=True, memory=True)
+    print_memory(results["memory"])
+
+Object counts that keep growing from one run to the next in the same worker
+point at a leak; peaks and the process's maximum RSS size the worker pool.
+"""
+import gc
+import linecache
+import sys
+import tracemalloc
+
+import simpy
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Model classes counted by name, simpy events are counted per event class
+ENTITY_CLASSES = ("Pallet", "Order", "UnloadingTruck", "LoadingTruck", "Dock", "AssemblyArea", "Forklift")
+
+
+def count_objects():
+    """Live objects per entity class and per simpy event class (Process, Timeout, Request, ...)."""
+    counts = dict.fromkeys(ENTITY_CLASSES, 0)
+    for obj in gc.get_objects():
+        cls = type(obj)
+        name = cls.__name__
+        if name in counts and cls.__module__ != "builtins":
+            counts[name] += 1
+        elif isinstance(obj, simpy.events.Event):
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+class MemoryReport:
+    def __init__(self, top=10):
+        """
+        Parameters:
+        - top: Number of allocation sites in the final summary.
+        """
+        self.top = top
+        self.phases = {}
+        self._current = None
+        self._started_tracing = False
+
+    def phase(self, name):
+        """End the current phase (if any) and start the phase `name`."""
+        if self._current is None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._end_phase()
+        self._current = name
+        tracemalloc.reset_peak()
+
+    def _end_phase(self):
+        if self._current is None:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self.phases[self._current] = {
+            "current_kb": current / 1024,
+            "peak_kb": peak / 1024,
+            "objects": count_objects(),
+        }
+
+    def finish(self):
+        """
+        End the last phase and stop tracing.
+
+        Returns:
+        - Dict with "phases" (name -> {"current_kb", "peak_kb", "objects"}),
+          "top_allocations" (list of {"site", "size_kb", "count"}) and
+          "max_rss_kb" of the process so far.
+        """
+        self._end_phase()
+        self._current = None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        top = [
+            {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "size_kb": stat.size / 1024, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:self.top]
+        ]
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+        if max_rss is not None and sys.platform == "darwin":
+            max_rss /= 1024  # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+        return {
+            "phases": self.phases,
+            "top_allocations": top,
+            "max_rss_kb": max_rss,
+        }
+
+
+def print_memory(report):
+    """Print a memory report returned by MemoryReport.finish."""
+    rss = "unknown" if report["max_rss_kb"] is None else f"{report['max_rss_kb'] / 1024:.1f} MB"
+    print(f"\n=== Memory Report (max RSS {rss}) ===")
+    for name, phase in report["phases"].items():
+        objects = ", ".join(f"{cls} {count}" for cls, count in phase["objects"].items() if count)
+        print(f"{name}: {phase['current_kb']:.0f} KB traced, peak {phase['peak_kb']:.0f} KB ({objects})")
+    print("Top allocation sites:")
+    for site in report["top_allocations"]:
+        print(f"  {site['site']}: {site['size_kb']:.1f} KB in {site['count']} blocks")
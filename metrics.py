@@ -0,0 +1,275 @@
+"""
+Online KPI accumulators.
+
+Every accumulator keeps constant memory however many observations it sees, can
+be reset (at the end of the warmup) and can be merged with the accumulator of
+another replication:
+
+- RunningStats: count, mean and variance (Welford).
+- QuantileSketch: relative-error quantiles (p50/p95/p99) from logarithmic buckets.
+- Distribution: RunningStats and QuantileSketch of the same observations.
+- TimeWeighted: time average of a piecewise-constant level, such as busy forklifts.
+
+A MetricsRegistry holds the named accumulators of one simulation run.
+"""
+import math
+
+
+class RunningStats:
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self):
+        """Count, mean and variance of a stream of values (Welford's algorithm)."""
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def merge(self, other):
+        """Combine another RunningStats into this one (Chan et al.)."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+
+class QuantileSketch:
+    __slots__ = ("relative_accuracy", "gamma", "log_gamma", "max_buckets", "buckets", "zeros", "count")
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        """
+        Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+        Positive values fall into logarithmically sized buckets, so any quantile
+        is returned within relative_accuracy of a value at that rank. Values at
+        or below zero (waits of entities served immediately) are counted apart.
+        Memory is bounded by max_buckets; beyond it the lowest buckets collapse,
+        which only affects the accuracy of the smallest values.
+
+        Parameters:
+        - relative_accuracy: Relative error of the returned quantiles.
+        - max_buckets: Maximum number of buckets kept.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.reset()
+
+    def reset(self):
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        indices = sorted(self.buckets)
+        excess = len(indices) - self.max_buckets
+        target = indices[excess]
+        self.buckets[target] += sum(self.buckets.pop(index) for index in indices[:excess])
+
+    def merge(self, other):
+        """Combine another sketch with the same relative_accuracy into this one."""
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same relative accuracy can be merged.")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q):
+        """Value at quantile q in [0, 1], NaN if the sketch is empty."""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in the relative sense
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class Distribution:
+    __slots__ = ("stats", "sketch")
+
+    def __init__(self, relative_accuracy=0.01):
+        """Moments and quantiles of one KPI's observations."""
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value):
+        self.stats.add(value)
+        self.sketch.add(value)
+
+    def reset(self, now=None):
+        self.stats.reset()
+        self.sketch.reset()
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    @property
+    def mean(self):
+        return self.stats.mean if self.stats.count else None
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+
+class TimeWeighted:
+    __slots__ = ("start", "last_time", "value", "area")
+
+    def __init__(self, now=0.0, value=0.0):
+        """
+        Time average of a level that changes at discrete times.
+
+        Parameters:
+        - now: Time the accumulation starts.
+        - value: Level at that time.
+        """
+        self.start = now
+        self.last_time = now
+        self.value = value
+        self.area = 0.0
+
+    def update(self, now, value):
+        """Record that the level changes to `value` at time `now`."""
+        self.area += self.value * (now - self.last_time)
+        self.last_time = now
+        self.value = value
+
+    def reset(self, now=None):
+        """Forget the accumulated area, keeping the current level."""
+        now = self.last_time if now is None else now
+        self.start = now
+        self.last_time = now
+        self.area = 0.0
+
+    def merge(self, other):
+        """Pool another replication's time (the merged mean weights replications by their length)."""
+        self.area += other.area
+        self.start -= other.last_time - other.start
+
+    def mean(self, now=None):
+        """Time-weighted mean from the start (or last reset) until `now`, defaults to the last update."""
+        now = self.last_time if now is None else now
+        elapsed = now - self.start
+        if elapsed <= 0:
+            return math.nan
+        return (self.area + self.value * (now - self.last_time)) / elapsed
+
+
+class MetricsRegistry:
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Named accumulators of one simulation run.
+
+        Parameters:
+        - relative_accuracy: Relative error of the quantile sketches.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.distributions = {}
+        self.levels = {}
+
+    def observe(self, name, value):
+        """Add one observation to the distribution `name`, created on first use."""
+        distribution = self.distributions.get(name)
+        if distribution is None:
+            distribution = self.distributions[name] = Distribution(self.relative_accuracy)
+        distribution.add(value)
+
+    def level(self, name, now, value):
+        """Record that the time-weighted level `name` changes to `value` at `now`."""
+        level = self.levels.get(name)
+        if level is None:
+            self.levels[name] = TimeWeighted(now, value)
+        else:
+            level.update(now, value)
+
+    def reset(self, now):
+        """Discard everything observed before `now`, e.g. at the end of the warmup."""
+        for distribution in self.distributions.values():
+            distribution.reset()
+        for level in self.levels.values():
+            level.update(now, level.value)
+            level.reset(now)
+
+    def clear(self):
+        """Drop all accumulators before a new run."""
+        self.distributions.clear()
+        self.levels.clear()
+
+    def merge(self, other):
+        """Combine the accumulators of another run (e.g. a parallel replication) into this registry."""
+        for name, distribution in other.distributions.items():
+            if name in self.distributions:
+                self.distributions[name].merge(distribution)
+            else:
+                self.distributions[name] = Distribution(self.relative_accuracy)
+                self.distributions[name].merge(distribution)
+        for name, level in other.levels.items():
+            if name in self.levels:
+                self.levels[name].merge(level)
+            else:
+                merged = self.levels[name] = TimeWeighted(level.start, level.value)
+                merged.area, merged.last_time = level.area, level.last_time
+
+    def mean(self, name):
+        """Mean of a distribution, None without observations."""
+        distribution = self.distributions.get(name)
+        return distribution.mean if distribution is not None else None
+
+    def quantiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """
+        Returns:
+        - Dict of distribution name -> {"p50": ..., "p95": ..., "p99": ...} for distributions with observations.
+        """
+        return {
+            name: {f"p{round(q * 100):g}": distribution.quantile(q) for q in quantiles}
+            for name, distribution in self.distributions.items() if distribution.count
+        }
@@ -0,0 +1,217 @@
+"""
+Multi-warehouse network simulation with one process per site.
+
+Every site is a full warehouse model running in its own process. Loaded
+trucks leaving one site travel to another site, where they arrive as inbound
+trucks with the pallets of the order they carry. Sites exchange these
+transfers as timestamped messages and are kept in step conservatively: all
+sites advance in windows as long as the shortest travel time between sites
+(the lookahead), so a truck leaving during a window can only arrive after the
+window ends and no site ever receives a message from its past.
+
+    sites = {"north": {"forklifts": 40}, "south": {"unloading_trucks_per_hour": 2}}
+    routes = {"north": {"south": (45, 0.5)}, "south": {"north": (45, 0.2)}}
+    results = run_network(sites, routes, duration=1440)
+    print_network_results(results)
+"""
+import random
+import time
+import traceback
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+from config import config
+from runner import replication_seeds
+
+
+class SiteError(RuntimeError):
+    """A site process failed; the message carries the worker's traceback."""
+
+
+def _transfer_arrival(env, resource_handler, dock_list, truck_id, arrival_time, pallet_types):
+    """Hold an inbound transfer until it reaches the site, then unload it like any truck."""
+    import main
+    yield env.timeout(max(arrival_time - env.now, 0))
+    yield env.process(main.truck_arrival(env, resource_handler, resource_handler.unloading_docks, dock_list,
+                                         truck_id, None, pallet_types))
+
+
+def _site_worker(connection, name, site_config, seed, routes):
+    """
+    Process entry point running one site window by window.
+
+    Commands received on the connection:
+    - ("advance", (until, messages)): schedule the inbound transfers, run up to
+      `until` and reply with the list of outbound transfers.
+    - ("finish", None): reply with the site's KPIs and stop.
+
+    Every reply is ("ok", payload), or ("error", traceback) after which the site stops.
+    """
+    try:
+        _run_site(connection, site_config, seed, routes)
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def _run_site(connection, site_config, seed, routes):
+    import main
+    config.update(site_config)
+    main.verbose = False
+    random.seed(seed)
+    np.random.seed(seed)
+    main.reset_statistics()
+    rng = np.random.default_rng(seed)
+    destinations = list(routes)
+    cumulative = np.cumsum([fraction for _, fraction in routes.values()])
+    outbound = []
+    counts = {"transfers_out": 0, "transfers_in": 0}
+
+    def ship(env, truck, order):
+        choice = int(np.searchsorted(cumulative, rng.random(), side="right"))
+        if choice >= len(destinations):
+            return  # Delivered to a customer outside the network
+        pallet_types = [pallet_type for pallet_type, quantity in order.pallets_required.items()
+                        for _ in range(quantity)][:truck.loaded_pallets]
+        if pallet_types:
+            travel_time, _ = routes[destinations[choice]]
+            outbound.append((destinations[choice], env.now + travel_time, truck.truck_id, pallet_types))
+            counts["transfers_out"] += 1
+
+    main.departure_listeners.append(ship)
+    # Sites fed only by the network have no external truck or order arrivals
+    truck_source = [] if config["unloading_trucks_per_hour"] <= 0 else None
+    order_source = [] if config["orders_per_hour"] <= 0 else None
+    env, resource_handler, dock_list = main.build_simulation(truck_source, order_source)
+    while True:
+        command, payload = connection.recv()
+        if command == "advance":
+            until, messages = payload
+            for arrival_time, origin, truck_id, pallet_types in messages:
+                env.process(_transfer_arrival(env, resource_handler, dock_list, f"{origin}-{truck_id}",
+                                              arrival_time, pallet_types))
+            counts["transfers_in"] += len(messages)
+            env.run(until=until)
+            connection.send(("ok", outbound[:]))
+            outbound.clear()
+        elif command == "finish":
+            results = main.collect_results(resource_handler, config["simulation_duration_minutes"])
+            connection.send(("ok", {**results, **counts}))
+            return
+
+
+def _receive(connection, name):
+    """Payload of the next reply of a site, raising SiteError if the site failed."""
+    try:
+        status, payload = connection.recv()
+    except EOFError:
+        raise SiteError(f"Site '{name}' exited without replying.") from None
+    if status == "error":
+        raise SiteError(f"Site '{name}' failed:\n{payload}")
+    return payload
+
+
+def run_network(sites, routes, duration=None, base_seed=0, lookahead=None, progress=False):
+    """
+    Run a network of warehouses, one process per site.
+
+    Parameters:
+    - sites: Dict of site name -> dict of config overrides for that site.
+    - routes: Dict of origin site -> {destination site: (travel time in minutes,
+      fraction of loaded trucks sent there)}. Trucks not routed to a site leave the network.
+    - duration: Simulated minutes, defaults to simulation_duration_minutes.
+    - base_seed: Seed the per-site seeds are derived from.
+    - lookahead: Synchronization window, at most the shortest travel time (the default).
+    - progress: Print a line per window.
+
+    Returns:
+    - Dict with "sites" (site name -> KPI dict plus transfers_in and transfers_out),
+      "windows", "lookahead", "in_flight" (transfers still travelling at the end)
+      and "wall_time" seconds.
+
+    Raises:
+    - SiteError: A site failed, with the traceback of its process.
+    """
+    names = list(sites)
+    duration = config["simulation_duration_minutes"] if duration is None else duration
+    travel_times = []
+    for origin, targets in routes.items():
+        if origin not in sites:
+            raise KeyError(f"Unknown site in routes: {origin}")
+        if sum(fraction for _, fraction in targets.values()) > 1 + 1e-9:
+            raise ValueError(f"Route fractions of site '{origin}' add up to more than 1.")
+        for destination, (travel_time, _) in targets.items():
+            if destination not in sites:
+                raise KeyError(f"Unknown site in routes: {destination}")
+            if travel_time <= 0:
+                raise ValueError(f"Travel time from '{origin}' to '{destination}' must be positive.")
+            travel_times.append(travel_time)
+    shortest = min(travel_times, default=duration)
+    lookahead = shortest if lookahead is None else lookahead
+    if lookahead <= 0 or lookahead > shortest:
+        raise ValueError(f"Lookahead must be positive and at most the shortest travel time ({shortest}).")
+
+    start = time.perf_counter()
+    seeds = replication_seeds(base_seed, len(names))
+    connections = {}
+    processes = []
+    for name, seed in zip(names, seeds):
+        parent, child = Pipe()
+        site_config = {**config, **sites[name], "simulation_duration_minutes": duration}
+        process = Process(target=_site_worker, args=(child, name, site_config, seed, routes.get(name, {})), daemon=True)
+        process.start()
+        connections[name] = parent
+        processes.append(process)
+
+    inbox = {name: [] for name in names}
+    now = 0
+    windows = 0
+    try:
+        while now < duration:
+            until = min(now + lookahead, duration)
+            # All sites run the window in parallel, transfers are exchanged at its end
+            for name in names:
+                connections[name].send(("advance", (until, inbox[name])))
+                inbox[name] = []
+            for name in names:
+                for destination, arrival_time, truck_id, pallet_types in _receive(connections[name], name):
+                    inbox[destination].append((arrival_time, name, truck_id, pallet_types))
+            now = until
+            windows += 1
+            if progress:
+                print(f"[{round(now, 2)}] window {windows}: {sum(map(len, inbox.values()))} transfers in flight")
+        results = {}
+        for name in names:
+            connections[name].send(("finish", None))
+        for name in names:
+            results[name] = _receive(connections[name], name)
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    return {
+        "sites": results,
+        "windows": windows,
+        "lookahead": lookahead,
+        "in_flight": sum(map(len, inbox.values())),
+        "wall_time": time.perf_counter() - start,
+    }
+
+
+def print_network_results(results):
+    """Print the KPIs of every site in the format of main.py."""
+    from main import KPIS
+    print(f"\n=== Network Results ({len(results['sites'])} sites, {results['windows']} windows of "
+          f"{results['lookahead']} minutes, {results['wall_time']:.1f}s) ===")
+    for name, site in results["sites"].items():
+        print(f"\n--- {name}: {site['transfers_in']} transfers in, {site['transfers_out']} out ---")
+        for key, (label, unit, missing) in KPIS.items():
+            value = site.get(key)
+            if value is None:
+                print(missing or f"No {label.lower()} recorded.")
+            else:
+                print(f"{label}: {value:.2f}{unit}")
+    print(f"\nTransfers still on the road: {results['in_flight']}")
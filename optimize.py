@@ -0,0 +1,186 @@
+"""
+Simulation-optimization of resource counts.
+
+Finds the cheapest configuration of integer resource keys (forklifts, docks,
+assembly areas) whose KPIs stay below given targets:
+
+    result = minimize_resources(
+        {"order_assembling_mean_waiting_time": 10, "order_loading_mean_waiting_time": 15},
+        {"forklifts": (20, 44), "num_loading_docks": (3, 7)},
+    )
+    print_recommendation(result)
+
+Candidates go through successive rounds in which every
+surviving candidate is replicated on the parallel runner, the replication count
+doubles from round to round and candidates are dropped as soon as they are
+decided:
+- infeasible: some target lies below its confidence interval,
+- dominated: a cheaper candidate already meets every target, or (with
+  monotone=True) a candidate with at least as many of every resource was
+  shown to be infeasible.
+All candidates share the replication seeds (common random numbers), so the
+comparison between them is not blurred by different input draws.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import config
+from analytic import prescreen
+from runner import KpiStatistics, replication_seeds, run_replication, t_quantile
+from sweep import build_design
+
+
+def _decide(statistics, targets, quantile):
+    """
+    Classify one candidate against upper-bound targets.
+
+    Returns:
+    - "feasible" if every target is above its confidence interval, "infeasible"
+      if some target is below its interval, otherwise "undecided".
+    """
+    undecided = False
+    for key, target in targets.items():
+        n = statistics.count(key)
+        if n < 2:
+            undecided = True
+            continue
+        mean = statistics.mean(key)
+        half_width = quantile * statistics.std(key) / math.sqrt(n)
+        if mean - half_width > target:
+            return "infeasible"
+        if mean + half_width > target:
+            undecided = True
+    return "undecided" if undecided else "feasible"
+
+
+def minimize_resources(targets, ranges, costs=None, overrides=None, initial_replications=4, max_replications=64,
+                       workers=None, base_seed=0, confidence=0.95, monotone=True, screen=False, progress=True):
+    """
+    Search the cheapest resource configuration meeting KPI targets.
+
+    Parameters:
+    - targets: Dict of KPI key -> upper bound on its mean.
+    - ranges: Dict of integer config key -> (low, high) or list of levels.
+    - costs: Dict of config key -> cost per unit, 1 for keys not given.
+    - overrides: Config keys fixed for the whole search.
+    - initial_replications: Replications per candidate in the first round.
+    - max_replications: Replications per candidate after which undecided candidates are given up.
+    - workers: Number of worker processes, defaults to all cores.
+    - base_seed: Seed the replication seeds are derived from.
+    - confidence: Joint confidence level of each candidate's decision. It is split
+      over the targets (Bonferroni), so a candidate is reported feasible only if
+      all targets hold at that level together.
+    - monotone: Assume KPIs do not get worse when resources are added, so an
+      infeasible candidate also rules out every candidate with fewer resources.
+    - screen: Drop candidates the analytic pre-screen finds overloaded in steady
+      state before simulating. Off by default, because runs of a finite horizon
+      can meet the targets while the backlog still grows (the default config does).
+    - progress: Print one line per round.
+
+    Returns:
+    - Dict with "recommended" (overrides of the cheapest feasible candidate, or None),
+      "cost", "kpis" (summary of the recommended candidate, see KpiStatistics.summary),
+      "unresolved" (cheaper candidates still undecided when the budget ran out),
+      "candidates" (list of dicts with params, cost, status and replications)
+      and "simulated_replications".
+    """
+    from main import KPIS
+    for key in targets:
+        if key not in KPIS:
+            raise KeyError(f"Unknown KPI: {key}")
+    for key in ranges:
+        if not isinstance(config.get(key), int):
+            raise ValueError(f"Only integer config keys can be optimized, got '{key}'.")
+    costs = costs or {}
+    base = {**config, **(overrides or {})}
+    keys = list(ranges)
+    points = build_design(ranges, "factorial")
+    candidates = [{"params": params, "cost": sum(costs.get(key, 1) * params[key] for key in keys),
+                   "status": "undecided", "replications": 0, "statistics": KpiStatistics()}
+                  for params in points]
+    candidates.sort(key=lambda candidate: candidate["cost"])
+
+    if screen:
+        screened = prescreen({key: np.array([c["params"][key] for c in candidates]) for key in keys}, base)
+        for candidate, feasible in zip(candidates, screened["feasible"]):
+            if not feasible:
+                candidate["status"] = "screened"
+
+    seeds = replication_seeds(base_seed, max_replications)
+    levels = np.array([[c["params"][key] for key in keys] for c in candidates])
+    simulated = 0
+    replications = initial_replications
+    round_number = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while True:
+            best = next((c for c in candidates if c["status"] == "feasible"), None)
+            for candidate in candidates:
+                if candidate["status"] == "undecided" and best is not None and candidate["cost"] >= best["cost"]:
+                    candidate["status"] = "dominated"
+            active = [c for c in candidates if c["status"] == "undecided"]
+            if not active or active[0]["replications"] >= max_replications:
+                break
+            round_number += 1
+            replications = min(max(replications, active[0]["replications"] * 2), max_replications)
+            futures = {}
+            for candidate in active:
+                run_config = {**base, **candidate["params"]}
+                for seed in seeds[candidate["replications"]:replications]:
+                    futures[pool.submit(run_replication, run_config, seed)] = candidate
+            for future in as_completed(futures):
+                futures[future]["statistics"].add(future.result())
+            simulated += len(futures)
+
+            for candidate in active:
+                candidate["replications"] = replications
+                n = min((stats.count for stats in candidate["statistics"].stats.values()), default=2)
+                quantile = t_quantile(1 - (1 - confidence) / (2 * len(targets)), max(n, 2) - 1)
+                candidate["status"] = _decide(candidate["statistics"], targets, quantile)
+            if monotone:
+                # Fewer resources than an infeasible candidate cannot do better
+                for candidate, level in zip(candidates, levels):
+                    if candidate["status"] != "infeasible":
+                        continue
+                    below = (levels <= level).all(axis=1)
+                    for other, is_below in zip(candidates, below):
+                        if is_below and other["status"] == "undecided":
+                            other["status"] = "dominated"
+            if progress:
+                counts = {status: sum(c["status"] == status for c in candidates)
+                          for status in ("undecided", "feasible", "infeasible", "dominated", "screened")}
+                print(f"Round {round_number}: {len(active)} candidates x {replications} replications, "
+                      + ", ".join(f"{count} {status}" for status, count in counts.items()))
+
+    best = next((c for c in candidates if c["status"] == "feasible"), None)
+    unresolved = [c["params"] for c in candidates
+                  if c["status"] == "undecided" and (best is None or c["cost"] < best["cost"])]
+    return {
+        "targets": targets,
+        "recommended": None if best is None else best["params"],
+        "cost": None if best is None else best["cost"],
+        "kpis": None if best is None else best["statistics"].summary(confidence),
+        "confidence": confidence,
+        "unresolved": unresolved,
+        "candidates": [{key: c[key] for key in ("params", "cost", "status", "replications")} for c in candidates],
+        "simulated_replications": simulated,
+    }
+
+
+def print_recommendation(result):
+    """Print the recommended configuration and its KPIs against the targets."""
+    from main import KPIS
+    level = round(result["confidence"] * 100)
+    print(f"\n=== Resource Optimization ({result['simulated_replications']} replications simulated) ===")
+    if result["recommended"] is None:
+        print("No candidate was shown to meet every target.")
+    else:
+        print(f"Recommended: {result['recommended']} (cost {result['cost']})")
+        for key, target in result["targets"].items():
+            stats = result["kpis"][key]
+            print(f"{KPIS[key][0]}: {stats['mean']:.2f}{KPIS[key][1]} "
+                  f"(CI [{stats['ci_low']:.2f}, {stats['ci_high']:.2f}], n={stats['n']}, target <= {target})")
+    if result["unresolved"]:
+        print(f"Undecided cheaper candidates (raise max_replications to resolve): {result['unresolved']}")
@@ -1,5 +1,10 @@
 import random
+from collections import deque
+
+
 class Order:
+    __slots__ = ("order_id", "pallets_required", "assembled", "shipped", "pallets", "_remaining_pallets")
+
     def __init__(self, order_id, pallets_required):
         """
         Initialize an order.
@@ -12,7 +17,15 @@ class Order:
         self.pallets_required = pallets_required  # Dict with pallet types and quantities
         self.assembled = False
         self.shipped = False
-        self.remaining_pallets = self._initialize_pallet_queue()
+        self.pallets = []  # Pallets picked from storage for this order, only kept while a PalletLedger records the run
+        self._remaining_pallets = None  # Built on first use, most orders never need it
+
+    @property
+    def remaining_pallets(self):
+        """Queue of pallet types still to process, created on first access."""
+        if self._remaining_pallets is None:
+            self._remaining_pallets = self._initialize_pallet_queue()
+        return self._remaining_pallets
 
     def _initialize_pallet_queue(self):
         """Create a queue of pallets based on the required quantities."""
@@ -20,7 +33,7 @@ class Order:
         for pallet_type, quantity in self.pallets_required.items():
             queue.extend([pallet_type] * quantity)
         random.shuffle(queue)  # Randomize the order of pallets
-        return queue
+        return deque(queue)
 
     def get_next_pallet(self):
         """
@@ -33,7 +46,7 @@ class Order:
         """
         if not self.remaining_pallets:
             raise ValueError(f"No pallets left to process for Order {self.order_id}.")
-        return self.remaining_pallets.pop(0)
+        return self.remaining_pallets.popleft()
 
     def is_complete(self):
         """
@@ -42,12 +55,18 @@ class Order:
         Returns:
         - True if all pallets have been processed, False otherwise.
         """
-        return len(self.remaining_pallets) == 0
+        if self._remaining_pallets is None:
+            return not any(self.pallets_required.values())
+        return len(self._remaining_pallets) == 0
 
     def __str__(self):
         """
         String representation of the order.
         """
+        if self._remaining_pallets is None:
+            remaining = sum(self.pallets_required.values())
+        else:
+            remaining = len(self._remaining_pallets)
         return (f"Order {self.order_id} "
-                f"(Remaining Pallets: {len(self.remaining_pallets)}, "
+                f"(Remaining Pallets: {remaining}, "
                 f"Pallets Required: {self.pallets_required})")
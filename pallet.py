@@ -1,17 +1,38 @@
 class Pallet:
-    def __init__(self, pallet_id, pallet_type="Regular"):
+    __slots__ = (
+        "pallet_id",
+        "pallet_type",
+        "truck_id",
+        "location",
+        "created_time",
+        "unloaded_time",
+        "stored_time",
+        "row",
+    )
+
+    def __init__(self, pallet_id, pallet_type="Regular", truck_id=None):
         """Initialize a pallet.
         
         Parameters:
-        - pallet_id: A unique identifier for the pallet.
+        - pallet_id: An integer identifier for the pallet (its position on the truck for inbound pallets).
         - pallet_type: The type of the pallet (e.g., Regular, Fragile, Heavy). Default is "Regular".
+        - truck_id: The truck the pallet arrived on, or None for pallets already in storage.
         """
         self.pallet_id = pallet_id
         self.pallet_type = pallet_type
+        self.truck_id = truck_id
         self.location = None
         self.created_time = None  # Time when the pallet is created
         self.unloaded_time = None  # Time when the pallet is unloaded at the dock
         self.stored_time = None  # Time when the pallet is stored in the main storage
+        self.row = None  # Row in the pallet lifecycle table (see lifecycle.py), once recorded
+
+    @property
+    def name(self):
+        """Human readable name, only rendered when it is printed."""
+        if self.truck_id is None:
+            return f"Existing-Pallet-{self.pallet_id}"
+        return f"Truck-{self.truck_id}-Pallet-{self.pallet_id}"
 
     def record_creation_time(self, time):
         """Record the creation time of the pallet."""
@@ -31,11 +52,10 @@ class Pallet:
         Returns:
         - float: Time spent in the dock or None if not applicable.
         """
-        if self.unloaded_time and self.stored_time:
+        if self.unloaded_time is not None and self.stored_time is not None:
             return self.stored_time - self.unloaded_time
         return None
 
     def __str__(self):
         """String representation of the pallet."""
-        return f"Pallet {self.pallet_id} ({self.pallet_type})"
-
+        return f"Pallet {self.name} ({self.pallet_type})"
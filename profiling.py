@@ -0,0 +1,177 @@
+"""
+Built-in profiling of simulation runs.
+
+A Profiler attached to an environment counts the simpy events and the
+wall-clock time spent processing them per process type (the generator
+function resumed by the event, e.g. assemble_order or handle_forklift), and
+the calls and time of every AdvancedStorage method. It also tracks the peak
+size of the event queue and the events per second:
+
+    profiler = Profiler()
+    run_simulation(seed=1, quiet=True, profiler=profiler)
+    profiler.print_summary()
+    profiler.write_folded("run.folded")   # flamegraph.pl run.folded > run.svg
+
+Events that resume no process are reported by event class, e.g. <Timeout>.
+Storage calls are nested under the process that made them in the folded
+output, so a flame graph shows how much of handle_forklift is storage scans.
+"""
+import time
+
+import simpy
+
+from storage import AdvancedStorage
+
+# AdvancedStorage methods timed while a profiler is attached
+STORAGE_METHODS = (
+    "assign_storage_location",
+    "retrieve_pallet",
+    "get_available_quantity",
+    "get_item",
+    "pick_item",
+    "get_storage_utilization",
+)
+
+
+def _event_label(event):
+    """Name of the process type an event resumes, or its class for events no process waits on."""
+    for callback in event.callbacks or ():
+        process = getattr(callback, "__self__", None)
+        if isinstance(process, simpy.Process):
+            return process.name
+    return f"<{type(event).__name__}>"
+
+
+class Profiler:
+    def __init__(self):
+        """Accumulates event and storage statistics over every run it is attached to."""
+        self.events = {}  # Process type -> [events, seconds]
+        self.methods = {}  # Storage method -> [calls, seconds]
+        self.folded = {}  # Semicolon-joined stack -> self time in seconds
+        self.total_events = 0
+        self.peak_queue = 0
+        self.wall_time = 0.0
+        self._frames = []  # [name, seconds spent in nested frames] of the frames in progress
+        self._env = None
+        self._originals = {}
+
+    def attach(self, env):
+        """
+        Profile `env` and the storage methods while inside the returned context manager:
+
+            with profiler.attach(env):
+                env.run(until=duration)
+        """
+        self._env = env
+        return self
+
+    def __enter__(self):
+        env = self._env
+        step = env.step
+
+        def profiled_step():
+            queue = env._queue
+            label = _event_label(queue[0][3]) if queue else "<empty>"
+            self._enter(label)
+            start = time.perf_counter()
+            try:
+                step()
+            finally:
+                elapsed = self._exit(start)
+                stats = self.events.get(label)
+                if stats is None:
+                    stats = self.events[label] = [0, 0.0]
+                stats[0] += 1
+                stats[1] += elapsed
+                self.total_events += 1
+                if len(queue) > self.peak_queue:
+                    self.peak_queue = len(queue)
+
+        # The instance attribute shadows Environment.step for env.run
+        env.step = profiled_step
+        for name in STORAGE_METHODS:
+            self._originals[name] = getattr(AdvancedStorage, name)
+            setattr(AdvancedStorage, name, self._wrap(name, self._originals[name]))
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time += time.perf_counter() - self._started
+        for name, method in self._originals.items():
+            setattr(AdvancedStorage, name, method)
+        self._originals = {}
+        del self._env.step
+        self._env = None
+        return False
+
+    def _enter(self, name):
+        self._frames.append([name, 0.0])
+
+    def _exit(self, start):
+        elapsed = time.perf_counter() - start
+        stack = ";".join(frame[0] for frame in self._frames)
+        name, nested = self._frames.pop()
+        self.folded[stack] = self.folded.get(stack, 0.0) + elapsed - nested
+        if self._frames:
+            self._frames[-1][1] += elapsed
+        return elapsed
+
+    def _wrap(self, name, method):
+        label = f"AdvancedStorage.{name}"
+
+        def profiled(*args, **kwargs):
+            self._enter(label)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = self._exit(start)
+                stats = self.methods.get(name)
+                if stats is None:
+                    stats = self.methods[name] = [0, 0.0]
+                stats[0] += 1
+                stats[1] += elapsed
+
+        return profiled
+
+    def summary(self):
+        """
+        Returns:
+        - Dict with "events" (total), "wall_time" seconds, "events_per_second",
+          "peak_queue", "processes" (type -> {"events", "seconds", "share"}) and
+          "storage" (method -> {"calls", "seconds", "share"}), shares relative to
+          the wall time, sorted by decreasing time.
+        """
+        wall = self.wall_time or float("nan")
+        return {
+            "events": self.total_events,
+            "wall_time": self.wall_time,
+            "events_per_second": self.total_events / wall,
+            "peak_queue": self.peak_queue,
+            "processes": {name: {"events": count, "seconds": seconds, "share": seconds / wall}
+                          for name, (count, seconds) in sorted(self.events.items(), key=lambda item: -item[1][1])},
+            "storage": {name: {"calls": count, "seconds": seconds, "share": seconds / wall}
+                        for name, (count, seconds) in sorted(self.methods.items(), key=lambda item: -item[1][1])},
+        }
+
+    def print_summary(self):
+        """Print the summary as two tables, process types then storage methods."""
+        summary = self.summary()
+        print(f"\n=== Profile ({summary['events']} events in {summary['wall_time']:.2f}s, "
+              f"{summary['events_per_second']:.0f} events/s, peak queue {summary['peak_queue']}) ===")
+        print(f"{'Process type':<32}{'Events':>10}{'Time (s)':>12}{'Share':>8}{'us/event':>10}")
+        for name, stats in summary["processes"].items():
+            print(f"{name:<32}{stats['events']:>10}{stats['seconds']:>12.3f}{stats['share']:>8.1%}"
+                  f"{stats['seconds'] / stats['events'] * 1e6:>10.1f}")
+        print(f"\n{'Storage method':<32}{'Calls':>10}{'Time (s)':>12}{'Share':>8}{'us/call':>10}")
+        for name, stats in summary["storage"].items():
+            print(f"{name:<32}{stats['calls']:>10}{stats['seconds']:>12.3f}{stats['share']:>8.1%}"
+                  f"{stats['seconds'] / stats['calls'] * 1e6:>10.1f}")
+
+    def write_folded(self, path):
+        """Write self times in microseconds as folded stacks, the input format of flamegraph.pl and speedscope."""
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.folded.items()):
+                microseconds = round(seconds * 1e6)
+                if microseconds > 0:
+                    f.write(f"{stack} {microseconds}\n")
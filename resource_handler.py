@@ -1,6 +1,7 @@
 import simpy
 from config import config
 from storage import AdvancedStorage  # Use the AdvancedStorage class
+from forklift import ForkliftFleet
 
 class ResourceHandler:
     def __init__(self, env, num_forklifts, num_unloading_docks, num_loading_docks, num_assembly_areas):
@@ -15,7 +16,7 @@ class ResourceHandler:
         """
         self.env = env
         
-        self.forklifts = simpy.PriorityResource(env, capacity=num_forklifts)
+        self.forklifts = ForkliftFleet(env, num_forklifts, config["forklift_speed_xy"], config["lever_speed_z"])
         self.unloading_docks = simpy.Resource(env, capacity=num_unloading_docks)
         self.loading_docks = simpy.Resource(env, capacity=num_loading_docks)
         self.assembly_areas = simpy.Resource(env, capacity=num_assembly_areas)
@@ -33,6 +34,7 @@ class ResourceHandler:
         self.forklift_usage_time = 0
         self.unloading_dock_usage_time = 0
         self.loading_dock_usage_time = 0
+        self.pending_orders = 0  # Orders waiting for their pallets before assembly
 
     def use_forklift(self, duration):
         """Simulate the usage of a forklift and track its utilization."""
@@ -79,10 +81,10 @@ class ResourceHandler:
                 pallet_type=pallet.pallet_type,
                 pallet_id=pallet.pallet_id,
             )
-            print(f"Stored pallet {pallet.pallet_id} ({pallet.pallet_type}) at {location}.")
+            print(f"Stored pallet {pallet.name} ({pallet.pallet_type}) at {location}.")
             return location
         except ValueError as e:
-            print(f"Failed to store pallet {pallet.pallet_id}: {e}")
+            print(f"Failed to store pallet {pallet.name}: {e}")
             return None
 
     def retrieve_item(self, pallet_id):
@@ -0,0 +1,155 @@
+"""
+Content-addressed cache of simulation results.
+
+Results are stored in SQLite under the SHA-256 of the canonical JSON of the
+run's config, its seed and the model version (a hash of the simulation
+sources, so editing the model invalidates every entry). The least recently
+used entries are evicted beyond a number of entries or a total size:
+
+    cache = ResultCache()
+    key = cache_key(run_config, seed=seed)
+    results = cache.get(key)
+    if results is None:
+        results = simulate(run_config, seed)
+        cache.put(key, results)
+
+Only seeded runs are cached: an unseeded run is a new sample every time,
+so the servers neither cache nor share it.
+"""
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+RESULT_CACHE_DB = "results_cache.db"  # Next to configurations.db
+MAX_ENTRIES = 10000
+MAX_BYTES = 256 * 2 ** 20
+
+# Sources whose changes can change simulation results, including the servers' run drivers and
+# the labelled API results (main.collect_api_results)
+MODEL_FILES = (
+    "main.py", "config.py", "layout.py", "resource_handler.py", "storage.py", "forklift.py", "dock.py",
+    "assembly_area.py", "truck.py", "loading_truck.py", "order.py", "pallet.py", "type.py", "metrics.py",
+    "arrivals.py", "lifecycle.py", "jobs.py", "app.py", "app-celery.py",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def model_version():
+    """Short hash of the MODEL_FILES sources, computed once per process."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in MODEL_FILES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            digest.update(name.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _canonical(value):
+    """Equal configs in one representation: sorted keys, integral floats as ints, tuples as lists."""
+    if isinstance(value, dict):
+        return {str(key): _canonical(value[key]) for key in sorted(value, key=str)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if hasattr(value, "item"):  # NumPy scalars
+        return _canonical(value.item())
+    return value
+
+
+def cache_key(run_config, seed=None, version=None):
+    """
+    Content address of one run.
+
+    Parameters:
+    - run_config: Full configuration of the run.
+    - seed: Seed of the run. Unseeded runs are not reproducible and should not be cached.
+    - version: Model version, model_version() by default.
+
+    Returns:
+    - 64-character hex SHA-256 digest.
+    """
+    document = {"config": _canonical(run_config), "seed": _canonical(seed), "model": version or model_version()}
+    encoded = json.dumps(document, sort_keys=True, separators=(",", ":"), allow_nan=True)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, db_path=RESULT_CACHE_DB, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        """
+        SQLite store of JSON-serializable results by cache key, safe to share between threads.
+
+        Parameters:
+        - db_path: SQLite file, created if needed.
+        - max_entries, max_bytes: Limits beyond which the least recently used entries are evicted.
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._connection.commit()
+
+    def get(self, key):
+        """Cached value of `key`, None on a miss. A hit makes the entry the most recently used."""
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                                     (time.time(), key))
+            self._connection.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store `value` under `key`, replacing an older entry, then evict beyond the limits."""
+        encoded = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created, last_used, hits) VALUES (?, ?, ?, ?, ?, 0)",
+                (key, encoded, len(encoded), now, now))
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        # Keep the most recently used entries within both limits
+        self._connection.execute(
+            "DELETE FROM results WHERE key IN ("
+            "SELECT key FROM (SELECT key, ROW_NUMBER() OVER (ORDER BY last_used DESC) AS position, "
+            "SUM(size) OVER (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING) AS total FROM results) "
+            "WHERE position > ? OR total > ?)", (self.max_entries, self.max_bytes))
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+
+    def stats(self):
+        """Dict with the number of "entries", their total "bytes" and the "hits" they served."""
+        with self._lock:
+            entries, size, hits = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM results").fetchone()
+        return {"entries": entries, "bytes": size, "hits": hits}
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM results")
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,291 @@
+"""
+Parallel replication runner.
+
+Runs independent replications of the simulation across a process pool, each with
+its own seed, and reports mean, standard deviation and a confidence interval for
+every KPI printed by main.py:
+
+    summary = run_replications({"forklifts": 38}, replications=50)
+    print_summary(summary)
+
+run_until_precision() instead keeps launching replications until every target KPI
+reaches a relative confidence interval half-width, or a replication budget is spent.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from statistics import NormalDist
+
+import numpy as np
+
+from config import config
+from metrics import MetricsRegistry, RunningStats
+
+
+def t_quantile(p, df):
+    """
+    Quantile of Student's t distribution.
+
+    Uses the Cornish-Fisher expansion around the normal quantile, accurate to
+    about 1e-3 for df >= 3, which is plenty for confidence intervals.
+    """
+    if df < 1:
+        return math.inf
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+
+
+class KpiStatistics:
+    def __init__(self):
+        """
+        Running mean and variance of per-replication KPI values, one RunningStats per KPI.
+
+        Only the count, mean and sum of squared deviations are kept per KPI, so
+        any number of replications fits in constant memory and partial results
+        from several runners can be merged.
+        """
+        self.stats = {}  # KPI key -> RunningStats
+
+    def add(self, results):
+        """Add the KPI dict of one replication. KPIs with value None are skipped."""
+        for key, value in results.items():
+            if value is not None:
+                self.stats.setdefault(key, RunningStats()).add(value)
+
+    def merge(self, other):
+        """Combine the statistics of another KpiStatistics into this one."""
+        for key, stats in other.stats.items():
+            self.stats.setdefault(key, RunningStats()).merge(stats)
+
+    def count(self, key):
+        stats = self.stats.get(key)
+        return 0 if stats is None else stats.count
+
+    def mean(self, key):
+        stats = self.stats.get(key)
+        return math.nan if stats is None else stats.mean
+
+    def std(self, key):
+        stats = self.stats.get(key)
+        return math.nan if stats is None else stats.std
+
+    def half_width(self, key, confidence=0.95):
+        """Half-width of the t confidence interval on the mean."""
+        n = self.count(key)
+        if n < 2:
+            return math.inf
+        return t_quantile(0.5 + confidence / 2, n - 1) * self.std(key) / math.sqrt(n)
+
+    def summary(self, confidence=0.95):
+        """
+        Returns:
+        - Dict of KPI key -> {n, mean, std, half_width, ci_low, ci_high}.
+        """
+        report = {}
+        for key, stats in self.stats.items():
+            half_width = self.half_width(key, confidence)
+            report[key] = {
+                "n": stats.count,
+                "mean": stats.mean,
+                "std": stats.std,
+                "half_width": half_width,
+                "ci_low": stats.mean - half_width,
+                "ci_high": stats.mean + half_width,
+            }
+        return report
+
+
+def replication_seeds(base_seed, replications, offset=0):
+    """Independent 32-bit seeds for replications offset .. offset + replications - 1."""
+    children = np.random.SeedSequence(base_seed).spawn(offset + replications)[offset:]
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def run_replication(run_config, seed):
+    """
+    Worker entry point: run one quiet replication.
+
+    Parameters:
+    - run_config: Full configuration dict for the run (workers do not share the parent's config).
+    - seed: Seed for this replication.
+
+    Returns:
+    - Dict of KPI key -> value for this replication.
+    """
+    from main import run_simulation
+    return run_simulation(overrides=run_config, seed=seed, quiet=True)
+
+
+def run_replication_metrics(run_config, seed):
+    """
+    Worker entry point like run_replication, also returning the run's metrics.
+
+    Returns:
+    - Tuple (KPI dict, MetricsRegistry of the run after the warmup).
+    """
+    import main
+    return main.run_simulation(overrides=run_config, seed=seed, quiet=True), main.metrics
+
+
+def run_replications(overrides=None, replications=10, workers=None, base_seed=0, confidence=0.95, executor=None):
+    """
+    Run independent replications of one configuration in parallel.
+
+    Parameters:
+    - overrides: Dict of config keys that differ from config.
+    - replications: Number of replications.
+    - workers: Number of worker processes, defaults to all cores.
+    - base_seed: Seed the per-replication seeds are derived from.
+    - confidence: Confidence level of the reported intervals.
+    - executor: Optional existing executor to submit to instead of creating a pool.
+
+    Returns:
+    - Dict with the configuration, seeds, per-KPI summary (see KpiStatistics.summary),
+      "runs", the KPI dicts of the replications in seed order, and "quantiles",
+      KPI key -> {"p50", "p95", "p99"} of the per-entity values pooled over all replications.
+    """
+    from main import SAMPLED_KPIS
+    run_config = {**config, **(overrides or {})}
+    seeds = replication_seeds(base_seed, replications)
+    statistics = KpiStatistics()
+    pooled = MetricsRegistry()
+    runs = [None] * replications
+    pool = executor or ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+    try:
+        futures = {pool.submit(run_replication_metrics, run_config, seed): i for i, seed in enumerate(seeds)}
+        for future in as_completed(futures):
+            results, metrics = future.result()
+            runs[futures[future]] = results
+            statistics.add(results)
+            pooled.merge(metrics)
+    finally:
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
+    return {
+        "overrides": overrides or {},
+        "replications": replications,
+        "seeds": seeds,
+        "confidence": confidence,
+        "kpis": statistics.summary(confidence),
+        "runs": runs,
+        "quantiles": {key: value for key, value in pooled.quantiles().items() if key in SAMPLED_KPIS},
+    }
+
+
+def precision_met(statistics, targets, confidence=0.95):
+    """
+    Check relative precision targets.
+
+    Parameters:
+    - statistics: KpiStatistics of the replications so far.
+    - targets: Dict of KPI key -> relative half-width, e.g. 0.02 for +-2% of the mean.
+
+    Returns:
+    - Dict of KPI key -> bool.
+    """
+    met = {}
+    for key, target in targets.items():
+        if statistics.count(key) < 2:
+            met[key] = False
+            continue
+        met[key] = statistics.half_width(key, confidence) <= target * abs(statistics.mean(key))
+    return met
+
+
+def run_until_precision(targets, overrides=None, min_replications=5, max_replications=200, workers=None,
+                        base_seed=0, confidence=0.95):
+    """
+    Replicate until every target KPI reaches its relative precision.
+
+    Replications run in parallel, one per worker, on the seeds of
+    replication_seeds(base_seed, max_replications). The stopping rule only sees
+    the longest run of finished replications from the first seed on, so the
+    result does not depend on which worker happened to finish first. As soon as
+    all targets hold on that prefix (after min_replications) the remaining runs
+    are cancelled, otherwise new runs are launched until max_replications have
+    been started.
+
+    Parameters:
+    - targets: Dict of KPI key -> relative CI half-width, e.g.
+      {"order_assembling_mean_waiting_time": 0.02}.
+    - overrides: Dict of config keys that differ from config.
+    - min_replications: Replications to finish before testing the targets.
+    - max_replications: Budget cap on the number of replications.
+    - workers: Number of worker processes, defaults to all cores.
+    - base_seed: Seed the per-replication seeds are derived from.
+    - confidence: Confidence level of the intervals.
+
+    Returns:
+    - Summary dict as run_replications, plus "met" (KPI key -> bool) and
+      "stopped" ("precision" or "budget").
+    """
+    from main import KPIS
+    for key in targets:
+        if key not in KPIS:
+            raise KeyError(f"Unknown KPI: {key}")
+    run_config = {**config, **(overrides or {})}
+    workers = workers or os.cpu_count()
+    statistics = KpiStatistics()
+    seeds = replication_seeds(base_seed, max_replications)
+    launched = 0
+    finished = {}  # Replication index -> KPI dict, finished past the prefix
+    finished_seeds = []
+    met = {key: False for key in targets}
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {}
+        while True:
+            # Keep every worker busy while the budget lasts
+            while len(pending) < workers and launched < max_replications:
+                pending[pool.submit(run_replication, run_config, seeds[launched])] = launched
+                launched += 1
+            if not pending:
+                break
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                finished[pending.pop(future)] = future.result()
+            prefix = len(finished_seeds)
+            while len(finished_seeds) in finished:
+                statistics.add(finished.pop(len(finished_seeds)))
+                finished_seeds.append(seeds[len(finished_seeds)])
+            if len(finished_seeds) > prefix and len(finished_seeds) >= min_replications:
+                met = precision_met(statistics, targets, confidence)
+                if all(met.values()):
+                    break
+    finally:
+        # Wait for the running replications so no worker outlives the call
+        pool.shutdown(wait=True, cancel_futures=True)
+    return {
+        "overrides": overrides or {},
+        "replications": len(finished_seeds),
+        "seeds": finished_seeds,
+        "confidence": confidence,
+        "kpis": statistics.summary(confidence),
+        "met": met,
+        "stopped": "precision" if all(met.values()) else "budget",
+    }
+
+
+def print_summary(summary):
+    """Print a runner summary, one line per KPI printed by main.py."""
+    from main import KPIS
+    level = round(summary["confidence"] * 100)
+    print(f"\n=== {summary['replications']} Replications ({level}% CI) ===")
+    for key, (label, unit, missing) in KPIS.items():
+        stats = summary["kpis"].get(key)
+        if stats is None:
+            print(missing or f"No {label.lower()} recorded.")
+            continue
+        print(f"{label}: {stats['mean']:.2f}{unit} "
+              f"(std {stats['std']:.2f}, CI [{stats['ci_low']:.2f}, {stats['ci_high']:.2f}], n={stats['n']})")
+        percentiles = summary.get("quantiles", {}).get(key)
+        if percentiles:
+            print("    " + ", ".join(f"{name} {value:.2f}{unit}" for name, value in percentiles.items()))
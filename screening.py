@@ -0,0 +1,180 @@
+"""
+Morris elementary-effects screening of config parameters.
+
+Finds out which config keys move which KPIs with r x (k + 1) runs for k keys:
+every trajectory starts at a random point of a grid over the parameter ranges
+and changes one key at a time, so each step measures the effect of one key.
+The mean absolute effect (mu*) ranks the keys' influence on each KPI printed by
+main.py, the spread of the effects (sigma) flags interactions and non-linearity:
+
+    result = morris_screening(trajectories=10)
+    print_screening(result)
+    fixed = inert_parameters(result)
+
+Runs execute in parallel and all points of a trajectory share one seed, with
+trucks and orders drawn from per-entity streams (see compare.py), so a step's
+effect is not drowned by a different draw of the inputs.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import config
+from compare import run_stream_replication
+from runner import replication_seeds
+
+# Screening ranges of the tunable keys. Paired keys get disjoint ranges so every
+# point stays valid (min <= max sizes, no more loading docks than assembly areas).
+# The rack layout and pallet types are structural and not screened.
+DEFAULT_RANGES = {
+    "forklifts": (30, 44),
+    "unloading_trucks_per_hour": (4, 8),
+    "loading_trucks_per_hour": (3, 5),
+    "orders_per_hour": (6, 10),
+    "truck_capacity_min": (15, 20),
+    "truck_capacity_max": (20, 25),
+    "minimum_order_size": (3, 6),
+    "maximum_order_size": (10, 14),
+    "initial_storage": (0.1, 0.3),
+    "num_unloading_docks": (3, 7),
+    "num_assembly_area": (7, 9),
+    "num_loading_docks": (5, 7),
+    "storage_slots_per_aisle": (30, 46),
+    "storage_levels_per_slot": (4, 6),
+    "forklift_speed_xy": (2.5, 3.5),
+    "lever_speed_z": (4, 6),
+}
+
+
+def morris_trajectories(dimensions, trajectories, levels=4, seed=None):
+    """
+    Morris trajectories on a grid of `levels` levels in the unit cube.
+
+    Returns:
+    - points: float array [trajectory, dimensions + 1, dimensions].
+    - order: int array [trajectory, dimensions], the dimension changed at each step.
+    """
+    rng = np.random.default_rng(seed)
+    delta = levels / (2 * (levels - 1))
+    # Start levels from which a step of delta stays in the cube
+    starts = np.arange(levels) / (levels - 1)
+    starts = starts[starts + delta <= 1 + 1e-12]
+    points = np.empty((trajectories, dimensions + 1, dimensions))
+    order = np.empty((trajectories, dimensions), dtype=np.int64)
+    for t in range(trajectories):
+        low = rng.choice(starts, dimensions)
+        upward = rng.random(dimensions) < 0.5
+        x = np.where(upward, low, low + delta)
+        order[t] = rng.permutation(dimensions)
+        points[t, 0] = x
+        for step, dim in enumerate(order[t], start=1):
+            x = x.copy()
+            x[dim] += delta if upward[dim] else -delta
+            points[t, step] = x
+    return points, order
+
+
+def _to_value(key, spec, unit):
+    low, high = spec
+    if isinstance(config.get(key), int):
+        return int(round(low + unit * (high - low)))
+    return float(low + unit * (high - low))
+
+
+def morris_screening(ranges=None, trajectories=10, levels=4, overrides=None, workers=None, base_seed=0):
+    """
+    Rank config keys by their influence on every KPI.
+
+    Parameters:
+    - ranges: Dict of config key -> (low, high), defaults to DEFAULT_RANGES.
+    - trajectories: Number of trajectories r; the screening runs r x (k + 1) simulations.
+    - levels: Number of grid levels per key.
+    - overrides: Config keys fixed for the whole screening.
+    - workers: Number of worker processes, defaults to all cores.
+    - base_seed: Seed for the trajectories and the replication seeds.
+
+    Returns:
+    - Dict with "keys", "runs" and "kpis": KPI key -> list of
+      {"key", "mu", "mu_star", "sigma", "effects"} sorted by decreasing mu_star.
+      Effects are per unit range of the key, i.e. the KPI change when the key
+      moves across its whole range.
+    """
+    from main import KPIS
+    ranges = DEFAULT_RANGES if ranges is None else ranges
+    for key in ranges:
+        if key not in config:
+            raise KeyError(f"Unknown config key: {key}")
+    keys = list(ranges)
+    base = {**config, **(overrides or {})}
+    points, order = morris_trajectories(len(keys), trajectories, levels, base_seed)
+    values = [[{key: _to_value(key, ranges[key], unit) for key, unit in zip(keys, point)} for point in trajectory]
+              for trajectory in points]
+    seeds = replication_seeds(base_seed, trajectories)
+
+    outputs = np.full((trajectories, len(keys) + 1, len(KPIS)), np.nan)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(run_stream_replication, {**base, **params}, seeds[t]): (t, step)
+                   for t, trajectory in enumerate(values) for step, params in enumerate(trajectory)}
+        for future in as_completed(futures):
+            t, step = futures[future]
+            results, _ = future.result()
+            outputs[t, step] = [math.nan if results.get(key) is None else results[key] for key in KPIS]
+
+    # Elementary effect of the key changed at each step, per unit of its range
+    effects = np.full((len(keys), trajectories, len(KPIS)), np.nan)
+    for t in range(trajectories):
+        for step, dim in enumerate(order[t], start=1):
+            key = keys[dim]
+            low, high = ranges[key]
+            moved = (values[t][step][key] - values[t][step - 1][key]) / (high - low)
+            if moved != 0:
+                effects[dim, t] = (outputs[t, step] - outputs[t, step - 1]) / moved
+
+    report = {}
+    for k, kpi in enumerate(KPIS):
+        rows = []
+        for dim, key in enumerate(keys):
+            e = effects[dim, :, k]
+            e = e[~np.isnan(e)]
+            rows.append({
+                "key": key,
+                "mu": float(e.mean()) if len(e) else math.nan,
+                "mu_star": float(np.abs(e).mean()) if len(e) else math.nan,
+                "sigma": float(e.std(ddof=1)) if len(e) > 1 else math.nan,
+                "effects": len(e),
+            })
+        rows.sort(key=lambda row: -np.nan_to_num(row["mu_star"], nan=-1.0))
+        report[kpi] = rows
+    return {"keys": keys, "ranges": ranges, "runs": trajectories * (len(keys) + 1), "kpis": report}
+
+
+def inert_parameters(result, threshold=0.05):
+    """
+    Keys whose mu* stays below `threshold` x the largest mu* for every KPI.
+
+    These can be fixed at their config value and left out of sweeps.
+    """
+    inert = set(result["keys"])
+    for rows in result["kpis"].values():
+        largest = max((row["mu_star"] for row in rows if not math.isnan(row["mu_star"])), default=0.0)
+        for row in rows:
+            if not math.isnan(row["mu_star"]) and row["mu_star"] > threshold * largest:
+                inert.discard(row["key"])
+    return [key for key in result["keys"] if key in inert]
+
+
+def print_screening(result, top=5):
+    """Print the `top` most influential keys for every KPI printed by main.py."""
+    from main import KPIS
+    print(f"\n=== Morris Screening ({len(result['keys'])} parameters, {result['runs']} runs) ===")
+    for kpi, (label, unit, _) in KPIS.items():
+        rows = [row for row in result["kpis"][kpi] if not math.isnan(row["mu_star"])]
+        if not rows:
+            print(f"{label}: no effects recorded.")
+            continue
+        ranking = ", ".join(f"{row['key']} (mu* {row['mu_star']:.2f}, sigma {row['sigma']:.2f})" for row in rows[:top])
+        print(f"{label}: {ranking}")
+    inert = inert_parameters(result)
+    print(f"Inert parameters: {', '.join(inert) if inert else 'none'}")
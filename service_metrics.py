@@ -0,0 +1,180 @@
+"""
+Operational metrics of the API servers, in the Prometheus text format.
+
+A ServiceMetrics counts the simulation jobs per state, times every run
+(wall seconds and simulated minutes per wall second), tracks how busy the
+worker pool is and how often a result was served from a cache instead of
+a simulation. Both app.py and app-celery.py serve it as GET /metrics:
+
+    service_metrics = ServiceMetrics(workers=1)
+    with service_metrics.job(simulated_minutes=1440):
+        env.run(until=1440)
+    service_metrics.render()   # body of the /metrics response
+
+Counters only grow for the lifetime of the process, Prometheus computes
+rates from them (e.g. rate(simulation_simulated_minutes_total[5m]) /
+rate(simulation_wall_seconds_sum[5m]) is the fleet's simulation speed).
+"""
+import bisect
+import contextlib
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram upper bounds, wall seconds of one simulation run
+WALL_TIME_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Histogram upper bounds, simulated minutes per wall second of one run
+SPEED_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        """Cumulative-bucket histogram as exposed by Prometheus (buckets are inclusive upper bounds)."""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f"{name}_sum {_number(self.sum)}"
+        yield f"{name}_count {self.count}"
+
+
+def _number(value):
+    if value is None or value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class ServiceMetrics:
+    def __init__(self, workers=1):
+        """
+        Parameters:
+        - workers: Number of simulations the server can run at the same time.
+        """
+        self.workers = workers
+        self.queued = 0
+        self.running = 0
+        self.finished = {"completed": 0, "failed": 0, "cancelled": 0}
+        self.cache = {"hit": 0, "miss": 0}
+        self.simulated_minutes = 0.0
+        self.wall_time = Histogram(WALL_TIME_BUCKETS)
+        self.speed = Histogram(SPEED_BUCKETS)
+        self._lock = threading.Lock()
+
+    def job_queued(self):
+        with self._lock:
+            self.queued += 1
+
+    def job_started(self, queued=True):
+        """A job starts running, `queued` if it was counted by job_queued before."""
+        with self._lock:
+            if queued:
+                self.queued = max(self.queued - 1, 0)
+            self.running += 1
+
+    def job_finished(self, simulated_minutes=None, wall_time=None, outcome="completed", state="running"):
+        """
+        A job ends.
+
+        Parameters:
+        - simulated_minutes, wall_time: Length of the run, timed only when both are given.
+        - outcome: "completed", "failed" or "cancelled".
+        - state: Count the job leaves, "running", "queued" (cancelled before it started) or None.
+        """
+        with self._lock:
+            if state == "running":
+                self.running = max(self.running - 1, 0)
+            elif state == "queued":
+                self.queued = max(self.queued - 1, 0)
+            self.finished[outcome] += 1
+            if outcome != "completed" or simulated_minutes is None or wall_time is None:
+                return
+            self.simulated_minutes += simulated_minutes
+            self.wall_time.observe(wall_time)
+            if wall_time > 0:
+                self.speed.observe(simulated_minutes / wall_time)
+
+    @contextlib.contextmanager
+    def job(self, simulated_minutes, queued=False):
+        """Count and time the run inside the block as one job, failed if the block raises."""
+        self.job_started(queued)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.job_finished(outcome="failed")
+            raise
+        self.job_finished(simulated_minutes, time.perf_counter() - start)
+
+    def cache_lookup(self, hit):
+        """Count one request answered from a cache (`hit`) or by running a simulation."""
+        with self._lock:
+            self.cache["hit" if hit else "miss"] += 1
+
+    def render(self, workers=None, busy=None):
+        """
+        Metrics in the Prometheus text exposition format.
+
+        Parameters:
+        - workers, busy: Size and busy workers of the pool when known better than
+          this process does (e.g. from the Celery workers), default to
+          self.workers and the running jobs.
+
+        Returns:
+        - str, the body of a /metrics response (media type CONTENT_TYPE).
+        """
+        with self._lock:
+            workers = self.workers if workers is None else workers
+            busy = self.running if busy is None else busy
+            lookups = self.cache["hit"] + self.cache["miss"]
+            lines = [
+                "# HELP simulation_jobs Simulation jobs currently queued or running.",
+                "# TYPE simulation_jobs gauge",
+                f'simulation_jobs{{state="queued"}} {self.queued}',
+                f'simulation_jobs{{state="running"}} {self.running}',
+                "# HELP simulation_jobs_finished_total Simulation jobs finished, by outcome.",
+                "# TYPE simulation_jobs_finished_total counter",
+            ]
+            lines += [f'simulation_jobs_finished_total{{status="{status}"}} {count}'
+                      for status, count in self.finished.items()]
+            lines += [
+                "# HELP simulation_wall_seconds Wall-clock time of one simulation run.",
+                "# TYPE simulation_wall_seconds histogram",
+                *self.wall_time.lines("simulation_wall_seconds"),
+                "# HELP simulation_speed_minutes_per_second Simulated minutes per wall-clock second of one run.",
+                "# TYPE simulation_speed_minutes_per_second histogram",
+                *self.speed.lines("simulation_speed_minutes_per_second"),
+                "# HELP simulation_simulated_minutes_total Simulated minutes of the completed runs.",
+                "# TYPE simulation_simulated_minutes_total counter",
+                f"simulation_simulated_minutes_total {_number(self.simulated_minutes)}",
+                "# HELP simulation_workers Simulations that can run at the same time.",
+                "# TYPE simulation_workers gauge",
+                f"simulation_workers {_number(workers)}",
+                "# HELP simulation_workers_busy Workers currently running a simulation.",
+                "# TYPE simulation_workers_busy gauge",
+                f"simulation_workers_busy {_number(busy)}",
+                "# HELP simulation_worker_saturation Busy share of the worker pool.",
+                "# TYPE simulation_worker_saturation gauge",
+                f"simulation_worker_saturation {_number(busy / workers if workers else None)}",
+                "# HELP simulation_cache_requests_total Results served from a cache (hit) or simulated (miss).",
+                "# TYPE simulation_cache_requests_total counter",
+            ]
+            lines += [f'simulation_cache_requests_total{{result="{result}"}} {count}'
+                      for result, count in self.cache.items()]
+            lines += [
+                "# HELP simulation_cache_hit_ratio Share of cache lookups that were hits.",
+                "# TYPE simulation_cache_hit_ratio gauge",
+                f"simulation_cache_hit_ratio {_number(self.cache['hit'] / lookups if lookups else None)}",
+            ]
+        return "\n".join(lines) + "\n"
@@ -232,6 +232,7 @@ class AdvancedStorage:
 
     def initial_storage(self, initial):
         num_pallet_per_aisle= initial*self.total_capacity/self.num_aisles
+        pallet_id = 0
         # Get the aisles assigned for the pallet type
         for pallet_type in self.pallet_types:
             # Search for the first available space in the assigned aisles
@@ -241,7 +242,8 @@ class AdvancedStorage:
                 for slot in range(self.slots_per_aisle):
                     for level in range(self.levels_per_slot):
                         if count<=num_pallet_per_aisle:  # Check if the location is free
-                            pallet = Pallet(f"Existing-Pallet", pallet_type)
+                            pallet = Pallet(pallet_id, pallet_type)
+                            pallet_id += 1
                             pallet.location = self.coordinates[(aisle, slot, level)]
                             self.storage[aisle][slot][level] = pallet  # Store pallet
                             count+=1
@@ -334,15 +336,24 @@ class AdvancedStorage:
         return total_quantity
 
     def get_item(self, pallet_type, strategy="FIFO"):
+        """
+        Retrieve a pallet from storage, see pick_item.
+
+        Returns:
+        - Coordinates of the location the pallet was taken from.
+        """
+        return self.pick_item(pallet_type, strategy)[1]
+
+    def pick_item(self, pallet_type, strategy="FIFO"):
         """
         Retrieve a pallet from storage based on the specified strategy (FIFO or LIFO).
 
         Parameters:
-        - pallet_id: The unique identifier of the pallet to retrieve.
+        - pallet_type: The type of pallet to retrieve.
         - strategy: The strategy for picking the item. Options are 'FIFO' or 'LIFO'.
 
         Returns:
-        - A tuple containing the location (aisle, slot, level) and the pallet ID.
+        - A tuple containing the pallet and the coordinates of its location.
 
         Raises:
         - ValueError if the pallet is not found or the strategy is invalid.
@@ -360,20 +371,22 @@ class AdvancedStorage:
                     for level in range(self.levels_per_slot):
                         if self.storage[aisle][slot][level] != None:
                             # Remove the pallet
+                            pallet = self.storage[aisle][slot][level]
                             self.storage[aisle][slot][level] = None
                             # Update pallet space
                             self.pallet_space[pallet_type].append((aisle, slot, level))
-                            return self.coordinates[aisle, slot, level]
+                            return pallet, self.coordinates[aisle, slot, level]
 
                 elif strategy == "LIFO":
                     # Search from the top level downwards
                     for level in range(self.levels_per_slot - 1, -1, -1):
                         if self.storage[aisle][slot][level] != None :
                             # Remove the pallet
+                            pallet = self.storage[aisle][slot][level]
                             self.storage[aisle][slot][level] = None
                             # Update pallet space
                             self.pallet_space[pallet_type].append((aisle, slot, level))
-                            return self.coordinates[aisle, slot, level]
+                            return pallet, self.coordinates[aisle, slot, level]
         # Raise an error if the pallet is not found
         raise ValueError(f"Pallet not found in storage.")
     def get_storage_utilization(self):
@@ -1,3 +1,6 @@
+import json
+
+import pandas as pd
 import streamlit as st
 import requests
 
@@ -30,6 +33,17 @@ def post_data(endpoint, json_data=None, params=None):
         st.error(f"Error sending data to {endpoint}: {e}")
         return None
 
+# Yield (event, data) pairs from a Server-Sent Events endpoint until the server closes it
+def stream_events(endpoint, params=None):
+    with requests.get(f"{BASE_URL}/{endpoint}", params=params, stream=True, timeout=(5, None)) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):])
+
 # Streamlit layout for Logistics Simulation Dashboard
 st.title("Logistics Simulation Dashboard")
 
@@ -101,6 +115,18 @@ elif tabs == "All Configurations":
     else:
         st.info("No configurations available to run a simulation.")
 
+    if st.button("Predict KPIs"):
+        if selected_config:
+            # Answered by the surrogate model, a simulation only starts when it is unsure
+            response = post_data("predict/", params={"config_id": selected_config})
+            if response:
+                st.success(response["status"])
+                if response.get("prediction"):
+                    st.table([{"KPI": key, "Predicted": round(stats["mean"], 2), "Uncertainty (std)": round(stats["std"], 2)}
+                              for key, stats in response["prediction"].items()])
+                if response.get("task_id"):
+                    st.write(f"Task ID: {response['task_id']}")
+
 elif tabs == "Simulation Results":
     st.header("Simulation Results")
     
@@ -117,3 +143,40 @@ elif tabs == "Simulation Results":
                     st.info("Simulation still in progress. Please check back later.")
                 elif results.get("status") == "Simulation failed.":
                     st.error(f"Error: {results.get('error')}")
+
+    # Live convergence of the running KPI estimates, one point per simulated time slice
+    if st.button("Watch Progress"):
+        if not task_id_input.strip():
+            st.warning("Please provide a valid Task ID.")
+        else:
+            progress_bar = st.progress(0.0)
+            progress_text = st.empty()
+            chart = st.empty()
+            history = []
+            try:
+                for event, data in stream_events("simulation-events/", params={"task_id": task_id_input}):
+                    if event == "progress":
+                        progress_bar.progress(min(data["progress"], 1.0))
+                        progress_text.write(f"Simulated {data['simulated_minutes']:.0f} minutes")
+                        estimates = {key: value for key, value in (data.get("kpis") or {}).items()
+                                     if key.endswith("(mins)") and value is not None}
+                        history.append({"Simulated Minutes": data["simulated_minutes"], **estimates})
+                        chart.line_chart(pd.DataFrame(history).set_index("Simulated Minutes"))
+                    elif event == "done":
+                        if data["status"] == "completed":
+                            progress_bar.progress(1.0)
+                            st.success("Simulation completed.")
+                            st.json(data["results"])
+                        else:
+                            st.error(f"Simulation {data['status']}: {data.get('error')}")
+            except requests.exceptions.RequestException as e:
+                st.error(f"Error streaming progress: {e}")
+
+    # Ends the run at its next time slice, its results cover the simulated time so far
+    if st.button("Stop Simulation"):
+        if not task_id_input.strip():
+            st.warning("Please provide a valid Task ID.")
+        else:
+            response = post_data("stop-simulation/", params={"task_id": task_id_input})
+            if response:
+                st.success(response["status"])
@@ -0,0 +1,243 @@
+"""
+Surrogate model of the simulation trained on stored sweep results.
+
+Every finished run in the sweep database (see sweep.py) is a labeled
+configuration -> KPIs example. A Gaussian process per KPI, fitted in NumPy,
+turns them into a metamodel that predicts KPIs for a new configuration in
+milliseconds together with its uncertainty:
+
+    model = Surrogate.from_sweeps()
+    model.predict({"forklifts": 38, "num_unloading_docks": 5})
+    result = predict_or_simulate(model, {"forklifts": 38}, tolerance=0.05)
+
+predict_or_simulate answers from the model and only falls back to a real
+simulation when the prediction is too uncertain.
+"""
+import json
+import math
+import time
+
+import numpy as np
+
+from config import config
+from sweep import SWEEP_DB, open_results
+
+# Candidate hyperparameters, chosen per KPI by marginal likelihood
+LENGTH_SCALES = (0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 1.5, 2.5)
+NOISE_RATIOS = (1e-4, 1e-3, 1e-2, 0.05, 0.1, 0.3)
+
+
+def _rbf(a, b, length_scale):
+    distance = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1)
+    return np.exp(-0.5 * distance / length_scale ** 2)
+
+
+class Surrogate:
+    def __init__(self, keys, samples, targets, counts):
+        """
+        Gaussian-process surrogate, one model per KPI.
+
+        Runs of the same configuration are pooled into one observation with
+        noise variance reduced by the number of runs, so the fit grows with the
+        number of distinct configurations, not of runs.
+
+        Parameters:
+        - keys: Config keys used as inputs.
+        - samples: float array [configuration, key].
+        - targets: Dict of KPI key -> float array [configuration] of mean KPI values (NaN if not recorded).
+        - counts: Dict of KPI key -> int array [configuration] of runs behind each mean.
+        """
+        self.keys = list(keys)
+        self.samples = np.asarray(samples, dtype=float).reshape(-1, len(self.keys))
+        self.targets = targets
+        self.counts = counts
+        self.models = {}
+        self.fit()
+
+    @classmethod
+    def from_sweeps(cls, db_path=SWEEP_DB, sweeps=None, keys=None):
+        """
+        Build a surrogate from the sweep_results table.
+
+        Parameters:
+        - db_path: SQLite file holding the results table.
+        - sweeps: Optional list of sweep names to train on, all sweeps by default.
+        - keys: Config keys used as inputs, defaults to every numeric key varied in the stored runs.
+        """
+        from main import KPIS
+        connection = open_results(db_path)
+        kpi_keys = list(KPIS)
+        query = f"SELECT params, {', '.join(kpi_keys)} FROM sweep_results"
+        arguments = ()
+        if sweeps:
+            query += f" WHERE sweep IN ({', '.join('?' * len(sweeps))})"
+            arguments = tuple(sweeps)
+        rows = connection.execute(query, arguments).fetchall()
+        connection.close()
+        if not rows:
+            raise ValueError(f"No stored runs to train on in {db_path}.")
+
+        params = [json.loads(row[0]) for row in rows]
+        if keys is None:
+            keys = sorted({key for p in params for key, value in p.items()
+                           if isinstance(value, (int, float)) and isinstance(config.get(key), (int, float))})
+        # Pool the runs of every distinct configuration
+        groups = {}
+        for p, row in zip(params, rows):
+            point = tuple(float(p.get(key, config[key])) for key in keys)
+            groups.setdefault(point, []).append(row[1:])
+        samples = np.array(list(groups), dtype=float).reshape(len(groups), len(keys))
+        targets, counts = {}, {}
+        for i, key in enumerate(kpi_keys):
+            values = [[run[i] for run in runs if run[i] is not None] for runs in groups.values()]
+            targets[key] = np.array([np.mean(v) if v else math.nan for v in values])
+            counts[key] = np.array([len(v) for v in values])
+        return cls(keys, samples, targets, counts)
+
+    def _scale(self, samples):
+        return (samples - self.low) / self.span
+
+    def fit(self):
+        """(Re)fit every KPI model, choosing hyperparameters by log marginal likelihood."""
+        self.low = self.samples.min(axis=0) if len(self.samples) else np.zeros(len(self.keys))
+        span = (self.samples.max(axis=0) - self.low) if len(self.samples) else np.ones(len(self.keys))
+        self.span = np.where(span > 0, span, 1.0)
+        x = self._scale(self.samples)
+        self.models = {}
+        for key, values in self.targets.items():
+            valid = ~np.isnan(values) & (self.counts[key] > 0)
+            if valid.sum() < 2:
+                continue
+            xv, yv = x[valid], values[valid]
+            mean, std = yv.mean(), yv.std()
+            std = std if std > 0 else 1.0
+            y = (yv - mean) / std
+            weights = 1.0 / self.counts[key][valid]
+            best = None
+            for length_scale in LENGTH_SCALES:
+                kernel = _rbf(xv, xv, length_scale)
+                for noise in NOISE_RATIOS:
+                    try:
+                        factor = np.linalg.cholesky(kernel + np.diag(noise * weights + 1e-9))
+                    except np.linalg.LinAlgError:
+                        continue
+                    alpha = np.linalg.solve(factor.T, np.linalg.solve(factor, y))
+                    likelihood = -0.5 * y @ alpha - np.log(np.diag(factor)).sum()
+                    if best is None or likelihood > best[0]:
+                        best = (likelihood, length_scale, noise, factor, alpha)
+            if best is None:
+                continue
+            _, length_scale, noise, factor, alpha = best
+            self.models[key] = {
+                "x": xv, "mean": mean, "std": std, "length_scale": length_scale,
+                "noise": noise, "factor": factor, "alpha": alpha,
+            }
+
+    def predict(self, params, kpis=None):
+        """
+        Predict the expected KPIs of one or more configurations.
+
+        Parameters:
+        - params: Dict of config key -> value, or list of such dicts. Input keys
+          that are not given take their config value; keys that are not model
+          inputs are ignored.
+        - kpis: Optional list of KPI keys, all fitted KPIs by default.
+
+        Returns:
+        - Dict of KPI key -> {"mean", "std"} (floats for one dict, arrays for a list),
+          where std is the model's uncertainty about the expected value.
+        """
+        single = isinstance(params, dict)
+        rows = [params] if single else list(params)
+        unknown = {key for p in rows for key in p if key not in config}
+        if unknown:
+            raise KeyError(f"Unknown config keys: {sorted(unknown)}")
+        x = self._scale(np.array([[float(p.get(key, config[key])) for key in self.keys] for p in rows],
+                                 dtype=float).reshape(len(rows), len(self.keys)))
+        report = {}
+        for key in (kpis or self.models):
+            model = self.models.get(key)
+            if model is None:
+                continue
+            cross = _rbf(x, model["x"], model["length_scale"])
+            mean = cross @ model["alpha"]
+            v = np.linalg.solve(model["factor"], cross.T)
+            variance = np.clip(1.0 - (v ** 2).sum(axis=0), 0.0, None)
+            mean = model["mean"] + model["std"] * mean
+            std = model["std"] * np.sqrt(variance)
+            report[key] = {"mean": float(mean[0]), "std": float(std[0])} if single else {"mean": mean, "std": std}
+        return report
+
+    def add(self, params, results, refit=True):
+        """
+        Add the KPIs of one finished run and refit.
+
+        Parameters:
+        - params: Dict of config overrides of the run.
+        - results: Dict of KPI key -> value as returned by run_simulation.
+        """
+        point = np.array([float(params.get(key, config[key])) for key in self.keys])
+        match = np.flatnonzero((self.samples == point).all(axis=1)) if len(self.samples) else []
+        if len(match):
+            i = match[0]
+        else:
+            self.samples = np.vstack([self.samples, point])
+            i = len(self.samples) - 1
+            for key in self.targets:
+                self.targets[key] = np.append(self.targets[key], math.nan)
+                self.counts[key] = np.append(self.counts[key], 0)
+        for key, value in results.items():
+            if key not in self.targets or value is None:
+                continue
+            n = self.counts[key][i]
+            previous = self.targets[key][i] if n else 0.0
+            self.targets[key][i] = (previous * n + value) / (n + 1)
+            self.counts[key][i] = n + 1
+        if refit:
+            self.fit()
+
+
+def is_confident(prediction, tolerance=0.05, absolute=0.5):
+    """
+    Whether every predicted KPI is known well enough.
+
+    A KPI passes when its standard deviation is at most tolerance x |mean| or at
+    most `absolute` (in the KPI's unit), so KPIs near zero do not force a run.
+    """
+    return all(stats["std"] <= max(tolerance * abs(stats["mean"]), absolute) for stats in prediction.values())
+
+
+def predict_or_simulate(model, params, tolerance=0.05, absolute=0.5, seed=None, learn=True):
+    """
+    Answer from the surrogate, simulating only when the prediction is uncertain.
+
+    Parameters:
+    - model: A fitted Surrogate.
+    - params: Dict of config overrides.
+    - tolerance, absolute: Confidence thresholds, see is_confident.
+    - seed: Seed for the fallback simulation.
+    - learn: Add a fallback simulation to the model.
+
+    Returns:
+    - Dict with "source" ("surrogate" or "simulation"), "kpis" (KPI key -> value),
+      "prediction" (the surrogate's mean and std per KPI) and "elapsed" seconds.
+    """
+    from main import run_simulation
+    start = time.perf_counter()
+    prediction = model.predict(params)
+    if prediction and is_confident(prediction, tolerance, absolute):
+        return {
+            "source": "surrogate",
+            "kpis": {key: stats["mean"] for key, stats in prediction.items()},
+            "prediction": prediction,
+            "elapsed": time.perf_counter() - start,
+        }
+    results = run_simulation(overrides=params, seed=seed, quiet=True)
+    if learn:
+        model.add(params, results)
+    return {
+        "source": "simulation",
+        "kpis": results,
+        "prediction": prediction,
+        "elapsed": time.perf_counter() - start,
+    }
@@ -0,0 +1,278 @@
+"""
+Design-of-experiments sweeps over config keys.
+
+A sweep varies several config keys together, runs every design point for a
+number of replications on a process pool and writes one row per run into a
+SQLite table. Finished runs are committed as they arrive, so an interrupted
+sweep picks up where it stopped when it is started again with the same name:
+
+    run_sweep("docks-vs-forklifts", {"forklifts": (30, 44), "num_unloading_docks": [4, 5, 6]},
+              design="lhs", samples=200, replications=5)
+"""
+import json
+import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import product
+
+import numpy as np
+
+from config import config
+from runner import replication_seeds, run_replication
+
+SWEEP_DB = "sweeps.db"
+
+# Primitive polynomials (degree, coefficients) and initial direction numbers for
+# Sobol dimensions 2..21, from Joe and Kuo's new-joe-kuo-6.21201 table.
+SOBOL_PARAMETERS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+SOBOL_BITS = 30
+
+
+def _levels(key, spec):
+    """All levels of a parameter for full-factorial designs."""
+    if isinstance(spec, (list, np.ndarray)):
+        return list(spec)
+    low, high = spec
+    if isinstance(config.get(key), int):
+        return list(range(int(low), int(high) + 1))
+    raise ValueError(f"Full-factorial designs need explicit levels for non-integer key '{key}'.")
+
+
+def _scale(key, spec, unit):
+    """Map points of the unit interval onto a parameter's range or levels."""
+    if isinstance(spec, (list, np.ndarray)):
+        index = np.minimum((unit * len(spec)).astype(int), len(spec) - 1)
+        return [spec[i] for i in index]
+    low, high = spec
+    if isinstance(config.get(key), int):
+        # Equal-width bins per integer so the end points are as likely as interior values
+        return (np.floor(low + unit * (high - low + 1)).clip(low, high)).astype(int).tolist()
+    return (low + unit * (high - low)).tolist()
+
+
+def latin_hypercube(dimensions, samples, seed=None):
+    """Latin hypercube sample of the unit cube, shape [samples, dimensions]."""
+    rng = np.random.default_rng(seed)
+    strata = np.stack([rng.permutation(samples) for _ in range(dimensions)], axis=1)
+    return (strata + rng.random((samples, dimensions))) / samples
+
+
+def sobol(dimensions, samples, skip=1):
+    """
+    Sobol low-discrepancy sequence in the unit cube, shape [samples, dimensions].
+
+    Parameters:
+    - dimensions: Number of dimensions, at most len(SOBOL_PARAMETERS) + 1.
+    - samples: Number of points.
+    - skip: Number of initial points to drop (the first point is the origin).
+    """
+    if dimensions > len(SOBOL_PARAMETERS) + 1:
+        raise ValueError(f"Sobol designs support at most {len(SOBOL_PARAMETERS) + 1} dimensions.")
+    directions = np.zeros((dimensions, SOBOL_BITS), dtype=np.uint64)
+    directions[0] = [1 << (SOBOL_BITS - 1 - bit) for bit in range(SOBOL_BITS)]
+    for dim in range(1, dimensions):
+        degree, coefficients, initial = SOBOL_PARAMETERS[dim - 1]
+        v = [m << (SOBOL_BITS - 1 - bit) for bit, m in enumerate(initial)]
+        for bit in range(degree, SOBOL_BITS):
+            value = v[bit - degree] ^ (v[bit - degree] >> degree)
+            for k in range(1, degree):
+                if (coefficients >> (degree - 1 - k)) & 1:
+                    value ^= v[bit - k]
+            v.append(value)
+        directions[dim] = v[:SOBOL_BITS]
+    points = np.zeros((samples, dimensions))
+    state = np.zeros(dimensions, dtype=np.uint64)
+    for index in range(samples + skip):
+        if index >= skip:
+            points[index - skip] = state / float(1 << SOBOL_BITS)
+        # Gray code: flip the direction number of the lowest zero bit of index
+        lowest_zero = (~index & (index + 1)).bit_length() - 1
+        state ^= directions[:, lowest_zero]
+    return points
+
+
+def build_design(ranges, design="factorial", samples=None, seed=0):
+    """
+    Generate design points.
+
+    Parameters:
+    - ranges: Dict of config key -> list of levels or (low, high). Integer config
+      keys take integer values, float keys are sampled continuously.
+    - design: "factorial", "lhs" or "sobol".
+    - samples: Number of points for "lhs" and "sobol".
+    - seed: Seed for "lhs".
+
+    Returns:
+    - List of dicts of config overrides, one per design point.
+    """
+    keys = list(ranges)
+    if design == "factorial":
+        return [dict(zip(keys, values)) for values in product(*[_levels(key, ranges[key]) for key in keys])]
+    if samples is None:
+        raise ValueError(f"The {design} design needs a number of samples.")
+    if design == "lhs":
+        unit = latin_hypercube(len(keys), samples, seed)
+    elif design == "sobol":
+        unit = sobol(len(keys), samples)
+    else:
+        raise ValueError(f"Unsupported design: {design}. Use 'factorial', 'lhs' or 'sobol'.")
+    columns = [_scale(key, ranges[key], unit[:, i]) for i, key in enumerate(keys)]
+    return [dict(zip(keys, values)) for values in zip(*columns)]
+
+
+def _kpi_keys():
+    from main import KPIS
+    return list(KPIS)
+
+
+def open_results(db_path=SWEEP_DB):
+    """Open the sweep database, creating the results table if needed."""
+    connection = sqlite3.connect(db_path)
+    kpi_columns = "".join(f", {key} REAL" for key in _kpi_keys())
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS sweep_results ("
+        "sweep TEXT NOT NULL, point INTEGER NOT NULL, replication INTEGER NOT NULL, "
+        "seed INTEGER NOT NULL, params TEXT NOT NULL, wall_time REAL"
+        f"{kpi_columns}, PRIMARY KEY (sweep, point, replication))"
+    )
+    # Databases created before a KPI was added get the missing column
+    existing = {row[1] for row in connection.execute("PRAGMA table_info(sweep_results)")}
+    for key in _kpi_keys():
+        if key not in existing:
+            connection.execute(f"ALTER TABLE sweep_results ADD COLUMN {key} REAL")
+    connection.commit()
+    return connection
+
+
+def _timed_replication(run_config, seed):
+    start = time.perf_counter()
+    results = run_replication(run_config, seed)
+    return results, time.perf_counter() - start
+
+
+def run_sweep(name, ranges, design="factorial", samples=None, replications=1, workers=None,
+              base_seed=0, overrides=None, db_path=SWEEP_DB, progress=True):
+    """
+    Run (or resume) a sweep and store one row per run in the sweep_results table.
+
+    Parameters:
+    - name: Sweep name; rerunning the same name skips runs already in the table.
+    - ranges, design, samples: See build_design.
+    - replications: Replications per design point. Replication r uses the same seed
+      at every point (common random numbers across the design).
+    - workers: Number of worker processes, defaults to all cores.
+    - base_seed: Seed for the replication seeds and the LHS design.
+    - overrides: Config keys fixed for the whole sweep.
+    - db_path: SQLite file holding the results table.
+    - progress: Print a progress line as runs finish.
+
+    Returns:
+    - Number of runs executed by this call.
+    """
+    points = build_design(ranges, design, samples, base_seed)
+    seeds = replication_seeds(base_seed, replications)
+    kpi_keys = _kpi_keys()
+    connection = open_results(db_path)
+    done = {}
+    for point, replication, params in connection.execute(
+            "SELECT point, replication, params FROM sweep_results WHERE sweep = ?", (name,)):
+        done[(point, replication)] = params
+    tasks = []
+    for point, params in enumerate(points):
+        params_json = json.dumps(params, sort_keys=True)
+        for replication, seed in enumerate(seeds):
+            stored = done.get((point, replication))
+            if stored is None:
+                tasks.append((point, replication, seed, params, params_json))
+            elif stored != params_json:
+                raise ValueError(f"Sweep '{name}' already holds a different design at point {point}. "
+                                 "Use a new sweep name or the original arguments.")
+    total = len(points) * replications
+    finished = total - len(tasks)
+    if progress:
+        print(f"Sweep '{name}': {len(points)} points x {replications} replications, {finished} already done.")
+
+    insert = (f"INSERT INTO sweep_results (sweep, point, replication, seed, params, wall_time, "
+              f"{', '.join(kpi_keys)}) VALUES ({', '.join('?' * (6 + len(kpi_keys)))})")
+    workers = workers or os.cpu_count()
+    executed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        queue = iter(tasks)
+        try:
+            while True:
+                # Keep a bounded number of runs in flight so an interrupt loses little work
+                for task in queue:
+                    point, replication, seed, params, _ = task
+                    pending[pool.submit(_timed_replication, {**config, **(overrides or {}), **params}, seed)] = task
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    point, replication, seed, params, params_json = pending.pop(future)
+                    results, wall_time = future.result()
+                    connection.execute(insert, (name, point, replication, seed, params_json, wall_time,
+                                                *[results.get(key) for key in kpi_keys]))
+                    connection.commit()
+                    executed += 1
+                    if progress:
+                        print(f"[{finished + executed}/{total}] point {point} replication {replication} done in {wall_time:.1f}s")
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            connection.close()
+    return executed
+
+
+def load_sweep(name, db_path=SWEEP_DB):
+    """
+    Read a sweep back as columns.
+
+    Returns:
+    - Dict with point, replication, seed (int arrays), one float array per swept
+      config key and one float array per KPI (NaN where the KPI was not recorded).
+    """
+    connection = open_results(db_path)
+    kpi_keys = _kpi_keys()
+    rows = connection.execute(
+        f"SELECT point, replication, seed, params, {', '.join(kpi_keys)} FROM sweep_results "
+        "WHERE sweep = ? ORDER BY point, replication", (name,)).fetchall()
+    connection.close()
+    columns = {
+        "point": np.array([row[0] for row in rows], dtype=np.int64),
+        "replication": np.array([row[1] for row in rows], dtype=np.int64),
+        "seed": np.array([row[2] for row in rows], dtype=np.int64),
+    }
+    params = [json.loads(row[3]) for row in rows]
+    for key in (params[0] if params else {}):
+        columns[key] = np.array([p[key] for p in params], dtype=float)
+    for i, key in enumerate(kpi_keys):
+        columns[key] = np.array([math.nan if row[4 + i] is None else row[4 + i] for row in rows], dtype=float)
+    return columns
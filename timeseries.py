@@ -0,0 +1,110 @@
+"""
+Columnar time-series recording of the warehouse state.
+
+A TimeSeriesRecorder keeps one preallocated NumPy buffer per column (time
+first) and grows them a chunk at a time, so recording a million rows costs a
+handful of reallocations instead of a million Python tuples:
+
+    recorder = TimeSeriesRecorder(state_columns())
+    run_simulation(seed=1, quiet=True, recorder=recorder)
+    recorder.save("run.npz")                     # compressed archive
+    recorder.save("run.npy")                     # structured array, loadable memory-mapped
+    series = load_series("run.npy")              # column name -> array
+    series["unloading_dock_queue"].max()
+
+main.record_state samples the state at a fixed interval and, by default, only
+keeps the rows where something changed.
+"""
+import numpy as np
+
+CHUNK_SIZE = 65536  # Rows added to the buffers whenever they are full
+
+
+class TimeSeriesRecorder:
+    def __init__(self, columns, chunk_size=CHUNK_SIZE, dtype=np.float64):
+        """
+        Append-only table of numeric columns sharing a time column.
+
+        Parameters:
+        - columns: Names of the value columns; "time" is added as the first column.
+        - chunk_size: Rows preallocated at a time.
+        - dtype: NumPy dtype of every column.
+        """
+        self.columns = ["time", *columns]
+        self.chunk_size = chunk_size
+        # One row per column, so every column is a contiguous slice
+        self.buffer = np.empty((len(self.columns), chunk_size), dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, time, values):
+        """
+        Add one row.
+
+        Parameters:
+        - time: Simulation time of the row.
+        - values: Sequence of values in the order of the value columns.
+        """
+        if self.size == self.buffer.shape[1]:
+            grown = np.empty((self.buffer.shape[0], self.size + self.chunk_size), dtype=self.buffer.dtype)
+            grown[:, :self.size] = self.buffer
+            self.buffer = grown
+        self.buffer[0, self.size] = time
+        self.buffer[1:, self.size] = values
+        self.size += 1
+
+    def last(self):
+        """Values of the last row (without its time), None if nothing was recorded."""
+        return self.buffer[1:, self.size - 1] if self.size else None
+
+    def column(self, name):
+        """View of the recorded values of one column."""
+        return self.buffer[self.columns.index(name), :self.size]
+
+    def to_dict(self):
+        """Dict of column name -> array view of the recorded rows."""
+        return {name: self.buffer[i, :self.size] for i, name in enumerate(self.columns)}
+
+    def clear(self):
+        self.size = 0
+
+    def save(self, path):
+        """
+        Write the recorded rows to a file.
+
+        Parameters:
+        - path: A .npz path writes a compressed archive with one array per column;
+          a .npy path writes a structured array with one field per column, which
+          load_series can open memory-mapped without reading it into memory.
+        """
+        if path.endswith(".npy"):
+            table = np.lib.format.open_memmap(path, mode="w+", shape=(self.size,),
+                                              dtype=[(name, self.buffer.dtype) for name in self.columns])
+            for i, name in enumerate(self.columns):
+                table[name] = self.buffer[i, :self.size]
+            table.flush()
+            del table
+        elif path.endswith(".npz"):
+            np.savez_compressed(path, **self.to_dict())
+        else:
+            raise ValueError(f"Unsupported time-series file: {path}. Use .npz or .npy.")
+
+
+def load_series(path, mmap=True):
+    """
+    Read a file written by TimeSeriesRecorder.save.
+
+    Parameters:
+    - path: .npz or .npy file.
+    - mmap: Memory-map a .npy file instead of reading it.
+
+    Returns:
+    - Dict of column name -> array.
+    """
+    if path.endswith(".npy"):
+        table = np.load(path, mmap_mode="r" if mmap else None)
+        return {name: table[name] for name in table.dtype.names}
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
@@ -1,23 +1,28 @@
+from collections import deque
 from pallet import Pallet
 from config import config
 from numpy.random import choice
- 
 
- 
 
 class UnloadingTruck:
-    def __init__(self, env, truck_id, capacity):
+    __slots__ = ("env", "truck_id", "capacity", "pallets")
+
+    def __init__(self, env, truck_id, capacity, pallet_types=None):
         """Initialize an unloading truck.
         
         Parameters:
         - env: The simulation environment.
         - truck_id: A unique identifier for the truck.
         - capacity: Number of pallets the truck can carry.
+        - pallet_types: Optional list of the pallet types on board, sampled from pallet_probs if None.
         """
         self.env = env
         self.truck_id = truck_id
         self.capacity = capacity
-        self.pallets = [Pallet(f"Truck-{truck_id}-Pallet-{i}",choice(config["pallet_types"], 1, p=config['pallet_probs'])[0]) for i in range(capacity)]
+        if pallet_types is None:
+            # Draw all pallet types in one call instead of one sampler call per pallet
+            pallet_types = choice(config["pallet_types"], capacity, p=config['pallet_probs']).tolist()
+        self.pallets = deque(Pallet(i, pallet_type, truck_id) for i, pallet_type in enumerate(pallet_types))
     
     def unload(self):
         """Simulate unloading a pallet from the truck.
@@ -26,7 +31,7 @@ class UnloadingTruck:
         - Pallet: The pallet being unloaded.
         """
         if self.pallets:
-            return self.pallets.pop(0)
+            return self.pallets.popleft()
         else:
             raise ValueError(f"Truck {self.truck_id} is empty and has no pallets to unload.")
 